@@ -0,0 +1,476 @@
+import json
+import os
+import shutil
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import repeat
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+from sqlalchemy import delete, func
+from sqlalchemy.orm import Session
+
+from . import models
+from .core.config import settings
+
+# Une série archivée = data/archive/<type>/zone_<id>/<AAAA-MM>/ : une colonne par fichier .npy
+# (timestamp en microsecondes epoch, triée par (timestamp, id)) et meta.json pour les textes
+ARRAY_COLUMNS = {
+    "timestamp": np.int64,
+    "value": np.float64,
+    "id": np.int64,
+    "source_id": np.int64,
+    "user_id": np.int64,
+}
+META_FILE = "meta.json"
+MONTH_FORMAT = "%Y-%m"
+# Valeur stockée pour une clé étrangère NULL (les colonnes .npy sont entières)
+NULL_ID = -1
+# Ordre des colonnes des tuples renvoyés par iter_rows (identique à crud.EXPORT_COLUMNS)
+ROW_COLUMNS = ("id", "type", "value", "unit", "timestamp", "additional_data", "zone_id", "source_id", "user_id")
+DELETE_CHUNK_SIZE = 500
+
+
+def to_epoch_us(ts: datetime) -> int:
+    return int(np.datetime64(ts, "us").astype(np.int64))
+
+
+def month_start(ts: datetime) -> datetime:
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(month: datetime) -> datetime:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def month_path(indicator_type: str, zone_id: int, month: datetime) -> str:
+    return os.path.join(
+        settings.ARCHIVE_DIR, quote(indicator_type, safe=""), f"zone_{zone_id}", month.strftime(MONTH_FORMAT)
+    )
+
+
+def _nullable(value: int):
+    return None if value == NULL_ID else value
+
+
+class MonthArchive:
+    """Un mois archivé d'une série (type, zone) : colonnes mappées en mémoire à la première lecture"""
+
+    def __init__(self, indicator_type: str, zone_id: int, month: datetime, path: str):
+        self.type = indicator_type
+        self.zone_id = zone_id
+        self.month = month
+        self.path = path
+        self._columns = {}
+        self._meta = None
+
+    def column(self, name: str) -> np.ndarray:
+        array = self._columns.get(name)
+        if array is None:
+            array = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+            self._columns[name] = array
+        return array
+
+    @property
+    def meta(self) -> dict:
+        if self._meta is None:
+            with open(os.path.join(self.path, META_FILE), encoding="utf-8") as f:
+                self._meta = json.load(f)
+        return self._meta
+
+    def unit(self, index: int) -> Optional[str]:
+        return self.meta["units"].get(str(index), self.meta["unit"])
+
+    def additional_data(self, index: int) -> Optional[str]:
+        return self.meta["additional_data"].get(str(index))
+
+    def bounds(self, lower: Optional[datetime], upper: Optional[datetime], upper_inclusive: bool = True):
+        """Plage [lo, hi) des lignes dont le timestamp est dans [lower, upper] (recherche dichotomique)"""
+        timestamps = self.column("timestamp")
+        lo = 0 if lower is None else int(np.searchsorted(timestamps, to_epoch_us(lower), "left"))
+        hi = len(timestamps) if upper is None else int(
+            np.searchsorted(timestamps, to_epoch_us(upper), "right" if upper_inclusive else "left")
+        )
+        return lo, max(lo, hi)
+
+    def indicator(self, index: int) -> models.Indicator:
+        """Ligne archivée sous forme d'Indicator (objet transitoire, hors session)"""
+        return models.Indicator(
+            id=int(self.column("id")[index]),
+            type=self.type,
+            value=float(self.column("value")[index]),
+            unit=self.unit(index),
+            timestamp=self.column("timestamp")[index].astype("datetime64[us]").item(),
+            additional_data=self.additional_data(index),
+            zone_id=self.zone_id,
+            source_id=_nullable(int(self.column("source_id")[index])),
+            user_id=_nullable(int(self.column("user_id")[index])),
+        )
+
+    def rows(self, lo: int, hi: int) -> List[tuple]:
+        """Lignes [lo, hi) sous forme de tuples ROW_COLUMNS"""
+        timestamps = self.column("timestamp")[lo:hi].astype("datetime64[us]").tolist()
+        ids = self.column("id")[lo:hi].tolist()
+        values = self.column("value")[lo:hi].tolist()
+        source_ids = self.column("source_id")[lo:hi].tolist()
+        user_ids = self.column("user_id")[lo:hi].tolist()
+        return [
+            (
+                ids[i], self.type, values[i], self.unit(lo + i), timestamps[i], self.additional_data(lo + i),
+                self.zone_id, _nullable(source_ids[i]), _nullable(user_ids[i]),
+            )
+            for i in range(hi - lo)
+        ]
+
+
+def available() -> bool:
+    """Vrai si au moins un mois a été archivé (dossier d'archive présent)"""
+    return os.path.isdir(settings.ARCHIVE_DIR)
+
+
+def month_archives(
+        types: Optional[List[str]] = None,
+        zone_ids: Optional[List[int]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+) -> List[MonthArchive]:
+    """
+    Mois archivés des séries demandées qui recoupent [start, end].
+    Seuls les dossiers des types et zones demandés sont parcourus.
+    """
+    root = settings.ARCHIVE_DIR
+    if not available():
+        return []
+
+    archives = []
+    for type_name in sorted(os.listdir(root)):
+        indicator_type = unquote(type_name)
+        if types and indicator_type not in types:
+            continue
+        type_dir = os.path.join(root, type_name)
+        for zone_name in sorted(os.listdir(type_dir)):
+            if not zone_name.startswith("zone_"):
+                continue
+            zone_id = int(zone_name[len("zone_"):])
+            if zone_ids and zone_id not in zone_ids:
+                continue
+            zone_dir = os.path.join(type_dir, zone_name)
+            for month_name in sorted(os.listdir(zone_dir)):
+                try:
+                    month = datetime.strptime(month_name, MONTH_FORMAT)
+                except ValueError:
+                    # Dossiers temporaires d'une écriture en cours
+                    continue
+                if (end is not None and month > end) or (start is not None and next_month(month) <= start):
+                    continue
+                archives.append(MonthArchive(indicator_type, zone_id, month, os.path.join(zone_dir, month_name)))
+    return archives
+
+
+# Lecture
+def read_latest(
+        type: Optional[str] = None,
+        zone_id: Optional[int] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        cursor: Optional[Tuple[datetime, int]] = None,
+        limit: int = 100
+) -> List[models.Indicator]:
+    """
+    Les `limit` indicateurs archivés les plus récents (ordre (timestamp, id) décroissant),
+    strictement avant le curseur s'il est fourni. Les mois sont lus du plus récent au plus
+    ancien et la lecture s'arrête dès que les mois parcourus suffisent à remplir la page.
+    """
+    if limit <= 0:
+        return []
+    upper = end_date
+    if cursor:
+        upper = cursor[0] if end_date is None else min(end_date, cursor[0])
+
+    by_month = defaultdict(list)
+    for archive in month_archives([type] if type else None, [zone_id] if zone_id else None, start_date, upper):
+        by_month[archive.month].append(archive)
+
+    candidates = []
+    for month in sorted(by_month, reverse=True):
+        for archive in by_month[month]:
+            lo, hi = archive.bounds(start_date, upper)
+            if cursor and hi > lo:
+                # Lignes au timestamp du curseur : seulement celles d'id inférieur
+                first_equal = max(lo, int(np.searchsorted(archive.column("timestamp"), to_epoch_us(cursor[0]), "left")))
+                if first_equal < hi:
+                    hi = first_equal + int(np.searchsorted(archive.column("id")[first_equal:hi], cursor[1], "left"))
+            lo = max(lo, hi - limit)
+            candidates.extend(zip(
+                archive.column("timestamp")[lo:hi].tolist(),
+                archive.column("id")[lo:hi].tolist(),
+                repeat(archive),
+                range(lo, hi),
+            ))
+        if len(candidates) >= limit:
+            break
+
+    candidates.sort(key=lambda candidate: (candidate[0], candidate[1]), reverse=True)
+    return [archive.indicator(index) for _, _, archive, index in candidates[:limit]]
+
+
+def iter_rows(
+        type: Optional[str] = None,
+        zone_id: Optional[int] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+) -> Iterator[tuple]:
+    """Lignes archivées (tuples ROW_COLUMNS) par ordre (timestamp, id) croissant, un mois à la fois"""
+    by_month = defaultdict(list)
+    for archive in month_archives([type] if type else None, [zone_id] if zone_id else None, start_date, end_date):
+        by_month[archive.month].append(archive)
+
+    for month in sorted(by_month):
+        rows = []
+        for archive in by_month[month]:
+            rows.extend(archive.rows(*archive.bounds(start_date, end_date)))
+        rows.sort(key=lambda row: (row[4], row[0]))
+        yield from rows
+
+
+def load_series(
+        type: str,
+        zone_ids: Optional[List[int]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """Colonnes (timestamps datetime64, valeurs) archivées par zone, triées par date"""
+    pieces = defaultdict(list)
+    for archive in month_archives([type], zone_ids, start_date, end_date):
+        lo, hi = archive.bounds(start_date, end_date)
+        if hi > lo:
+            pieces[archive.zone_id].append((archive.column("timestamp")[lo:hi], archive.column("value")[lo:hi]))
+
+    series = {}
+    for zone_id, zone_pieces in pieces.items():
+        # Les mois sont disjoints et parcourus dans l'ordre : la concaténation reste triée
+        series[zone_id] = (
+            np.concatenate([timestamps for timestamps, _ in zone_pieces]).astype("datetime64[us]"),
+            np.concatenate([values for _, values in zone_pieces]),
+        )
+    return series
+
+
+def archived_keys(keys: Iterable[tuple]) -> Set[tuple]:
+    """
+    Clés naturelles (zone_id, source_id, type, timestamp) déjà présentes dans l'archive.
+    Seuls les mois concernés sont lus, par recherche dichotomique sur le timestamp.
+    """
+    if not available():
+        return set()
+    by_month = defaultdict(list)
+    for key in keys:
+        zone_id, _, indicator_type, timestamp = key
+        by_month[(indicator_type, zone_id, month_start(timestamp))].append(key)
+
+    found = set()
+    for (indicator_type, zone_id, month), month_keys in by_month.items():
+        path = month_path(indicator_type, zone_id, month)
+        if not os.path.isdir(path):
+            continue
+        archive = MonthArchive(indicator_type, zone_id, month, path)
+        timestamps = archive.column("timestamp")
+        source_ids = archive.column("source_id")
+        for key in month_keys:
+            epoch = to_epoch_us(key[3])
+            lo, hi = np.searchsorted(timestamps, epoch, "left"), np.searchsorted(timestamps, epoch, "right")
+            source_id = NULL_ID if key[1] is None else key[1]
+            if (source_ids[lo:hi] == source_id).any():
+                found.add(key)
+    return found
+
+
+def aggregate(
+        types: Optional[List[str]] = None,
+        zone_ids: Optional[List[int]] = None,
+        lower: Optional[datetime] = None,
+        upper: Optional[datetime] = None,
+        upper_inclusive: bool = True
+) -> Dict[Tuple[int, str], tuple]:
+    """
+    Agrégats (count, sum, min, max, sum_sq, first_timestamp, last_timestamp) des lignes archivées
+    par (zone_id, type) sur [lower, upper] ; seuls les mois concernés des séries demandées sont lus.
+    """
+    totals = {}
+    for archive in month_archives(types, zone_ids, lower, upper):
+        lo, hi = archive.bounds(lower, upper, upper_inclusive)
+        if hi <= lo:
+            continue
+        values = archive.column("value")[lo:hi]
+        timestamps = archive.column("timestamp")
+        part = (
+            hi - lo, float(values.sum()), float(values.min()), float(values.max()), float(np.dot(values, values)),
+            timestamps[lo].astype("datetime64[us]").item(), timestamps[hi - 1].astype("datetime64[us]").item(),
+        )
+        key = (archive.zone_id, archive.type)
+        previous = totals.get(key)
+        totals[key] = part if previous is None else (
+            previous[0] + part[0], previous[1] + part[1], min(previous[2], part[2]), max(previous[3], part[3]),
+            previous[4] + part[4], min(previous[5], part[5]), max(previous[6], part[6]),
+        )
+    return totals
+
+
+def bucket_aggregates(step: timedelta) -> Iterator[tuple]:
+    """
+    Agrégats de toutes les lignes archivées par seau de durée `step` (heure ou jour) :
+    (type, zone_id, bucket_start, count, sum, min, max, sum_sq, first_timestamp, last_timestamp).
+    Utilisé pour reconstruire les tables de rollups.
+    """
+    step_us = int(step.total_seconds() * 1_000_000)
+    for archive in month_archives():
+        timestamps = np.asarray(archive.column("timestamp"))
+        values = np.asarray(archive.column("value"))
+        # Les timestamps sont triés : chaque seau est une plage contiguë
+        buckets = timestamps // step_us * step_us
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        ends = np.append(starts[1:], len(buckets))
+        columns = (
+            buckets[starts].astype("datetime64[us]").tolist(),
+            (ends - starts).tolist(),
+            np.add.reduceat(values, starts).tolist(),
+            np.minimum.reduceat(values, starts).tolist(),
+            np.maximum.reduceat(values, starts).tolist(),
+            np.add.reduceat(values * values, starts).tolist(),
+            timestamps[starts].astype("datetime64[us]").tolist(),
+            timestamps[ends - 1].astype("datetime64[us]").tolist(),
+        )
+        for bucket in zip(*columns):
+            yield (archive.type, archive.zone_id) + bucket
+
+
+# Écriture
+def _stage_month(path: str, indicator_type: str, zone_id: int, month: datetime, rows) -> str:
+    """
+    Écrit dans un dossier temporaire le mois archivé : lignes déjà archivées + nouvelles lignes,
+    triées par (timestamp, id). Retourne le chemin du dossier temporaire.
+    """
+    columns = {name: [] for name in ARRAY_COLUMNS}
+    units, extras = [], []
+    if os.path.isdir(path):
+        existing = MonthArchive(indicator_type, zone_id, month, path)
+        for name in ARRAY_COLUMNS:
+            columns[name].append(np.array(existing.column(name)))
+        count = len(existing.column("id"))
+        units.extend(existing.unit(i) for i in range(count))
+        extras.extend(existing.additional_data(i) for i in range(count))
+
+    columns["timestamp"].append(np.array([row.timestamp for row in rows], dtype="datetime64[us]").astype(np.int64))
+    columns["value"].append(np.array([row.value for row in rows], dtype=np.float64))
+    columns["id"].append(np.array([row.id for row in rows], dtype=np.int64))
+    columns["source_id"].append(np.array([NULL_ID if row.source_id is None else row.source_id for row in rows], dtype=np.int64))
+    columns["user_id"].append(np.array([NULL_ID if row.user_id is None else row.user_id for row in rows], dtype=np.int64))
+    units.extend(row.unit for row in rows)
+    extras.extend(row.additional_data for row in rows)
+
+    arrays = {name: np.concatenate(parts).astype(ARRAY_COLUMNS[name]) for name, parts in columns.items()}
+    order = np.lexsort((arrays["id"], arrays["timestamp"]))
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), array[order])
+
+    # Unité la plus fréquente en valeur par défaut, exceptions et données additionnelles par ligne
+    units = [units[i] for i in order]
+    extras = [extras[i] for i in order]
+    default_unit = max(set(units), key=units.count)
+    meta = {
+        "unit": default_unit,
+        "units": {str(i): unit for i, unit in enumerate(units) if unit != default_unit},
+        "additional_data": {str(i): extra for i, extra in enumerate(extras) if extra is not None},
+    }
+    with open(os.path.join(tmp_path, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    return tmp_path
+
+
+def _publish(tmp_path: str, path: str) -> Optional[str]:
+    """Remplace le mois archivé par sa nouvelle version ; retourne l'ancienne version mise de côté"""
+    backup = None
+    if os.path.isdir(path):
+        backup = f"{path}.old-{os.getpid()}"
+        shutil.rmtree(backup, ignore_errors=True)
+        os.rename(path, backup)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        if backup:
+            os.rename(backup, path)
+        raise
+    return backup
+
+
+def _restore(path: str, backup: Optional[str]):
+    shutil.rmtree(path, ignore_errors=True)
+    if backup:
+        os.rename(backup, path)
+
+
+def archive_closed_months(db: Session, before: Optional[datetime] = None):
+    """
+    Déplace les indicateurs des mois clos (antérieurs au mois de `before`, par défaut le mois
+    en cours) de la table indicators vers l'archive colonnaire, une série (type, zone, mois)
+    à la fois : fichiers écrits, lignes supprimées puis commit ; les fichiers sont restaurés
+    si le commit échoue. Les agrégats (rollups) ne changent pas : les lignes sont déplacées.
+    """
+    cutoff = month_start(before or datetime.utcnow())
+    indicator = models.Indicator
+    month_column = func.strftime("%Y-%m", indicator.timestamp)
+    archivable = (
+        indicator.timestamp < cutoff,
+        indicator.type.isnot(None),
+        indicator.zone_id.isnot(None),
+        indicator.value.isnot(None),
+    )
+    groups = db.query(indicator.type, indicator.zone_id, month_column).filter(*archivable).distinct().all()
+
+    stats = {"series_months": 0, "rows": 0}
+    for indicator_type, zone_id, month_name in sorted(groups):
+        month = datetime.strptime(month_name, MONTH_FORMAT)
+        rows = db.query(
+            indicator.id, indicator.timestamp, indicator.value, indicator.unit,
+            indicator.additional_data, indicator.source_id, indicator.user_id
+        ).filter(
+            *archivable,
+            indicator.type == indicator_type,
+            indicator.zone_id == zone_id,
+            indicator.timestamp >= month,
+            indicator.timestamp < next_month(month),
+        ).order_by(indicator.timestamp, indicator.id).all()
+        if not rows:
+            continue
+
+        path = month_path(indicator_type, zone_id, month)
+        tmp_path = _stage_month(path, indicator_type, zone_id, month, rows)
+        published = False
+        try:
+            ids = [row.id for row in rows]
+            for offset in range(0, len(ids), DELETE_CHUNK_SIZE):
+                db.execute(
+                    delete(indicator).where(indicator.id.in_(ids[offset:offset + DELETE_CHUNK_SIZE])),
+                    execution_options={"synchronize_session": False}
+                )
+            backup = _publish(tmp_path, path)
+            published = True
+            db.commit()
+        except Exception:
+            db.rollback()
+            if published:
+                _restore(path, backup)
+            else:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        if backup:
+            shutil.rmtree(backup, ignore_errors=True)
+
+        stats["series_months"] += 1
+        stats["rows"] += len(rows)
+    return stats
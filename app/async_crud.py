@@ -0,0 +1,93 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import archive, crud, models
+
+
+# Versions asynchrones (AsyncSession) des lectures de crud utilisées par les routes async
+
+# Users
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).filter(models.User.email == email))
+    return result.scalars().first()
+
+
+# Zones
+async def get_zones(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.execute(select(models.Zone).offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+# Sources
+async def get_sources(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.execute(select(models.Source).offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+# Indicators
+async def get_indicators(
+        db: AsyncSession,
+        skip: int = 0,
+        limit: int = 100,
+        type: str = None,
+        zone_id: int = None,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        cursor: Optional[Tuple[datetime, int]] = None
+):
+    """Équivalent asynchrone de crud.get_indicators (mêmes filtres, même pagination par curseur, archive comprise)"""
+    stmt = crud.filter_indicators(select(models.Indicator), type, zone_id, start_date, end_date)
+
+    if cursor:
+        stmt = stmt.filter(
+            tuple_(models.Indicator.timestamp, models.Indicator.id) < tuple_(*cursor)
+        )
+
+    stmt = stmt.order_by(models.Indicator.timestamp.desc(), models.Indicator.id.desc())
+    # Lecture des fichiers de l'archive hors de la boucle d'événements
+    archived = await run_in_threadpool(
+        crud.read_archived_indicators, type, zone_id, start_date, end_date, cursor, skip + limit
+    ) if archive.available() else []
+    if not archived:
+        if skip:
+            stmt = stmt.offset(skip)
+        result = await db.execute(stmt.limit(limit))
+        return result.scalars().all()
+    result = await db.execute(stmt.limit(skip + limit))
+    return crud.merge_latest(result.scalars().all(), archived, skip, limit)
+
+
+# Statistiques : la logique des agrégats (rollups) reste synchrone et s'exécute via run_sync
+async def get_air_quality_by_zone(
+        db: AsyncSession,
+        start_date: datetime,
+        end_date: datetime,
+        zone_id: Optional[int] = None
+):
+    return await db.run_sync(crud.get_air_quality_by_zone, start_date, end_date, zone_id)
+
+
+async def get_summary_stats(
+        db: AsyncSession,
+        types: Optional[List[str]] = None,
+        zone_ids: Optional[List[int]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        by_zone: bool = False
+):
+    return await db.run_sync(
+        crud.get_summary_stats,
+        types=types,
+        zone_ids=zone_ids,
+        start_date=start_date,
+        end_date=end_date,
+        by_zone=by_zone
+    )
+
+
+async def get_air_quality_stats(db: AsyncSession):
+    return await db.run_sync(crud.get_air_quality_stats)
@@ -1,24 +1,88 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from . import models, schemas
-from .database import get_db
+from .cache import TTLCache
+from .database import get_async_read_db, get_db, get_read_db
+from .core import security as password_security
 from .core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = password_security.pwd_context
 security = HTTPBearer()
 
+# Pool de processus pour bcrypt (créé à la première utilisation) et nombre de calculs en attente
+_hashing_pool = None
+_hashing_pending = 0
+_hashing_lock = threading.Lock()
+
+# Utilisateurs résolus par sujet du token (email), pour éviter une requête par appel authentifié
+user_cache = TTLCache(settings.USER_CACHE_MAX_ENTRIES, settings.USER_CACHE_TTL_SECONDS)
+
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_security.verify_password(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_security.get_password_hash(password)
+
+
+def _get_hashing_pool():
+    global _hashing_pool
+    with _hashing_lock:
+        if _hashing_pool is None:
+            _hashing_pool = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _hashing_pool
+
+
+async def _run_in_hashing_pool(func, *args):
+    """Exécute un calcul bcrypt hors de la boucle ; 503 immédiat si la file d'attente est pleine"""
+    global _hashing_pending
+    with _hashing_lock:
+        if _hashing_pending >= settings.PASSWORD_HASH_MAX_PENDING:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Service d'authentification surchargé, réessayez dans un instant",
+                headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+            )
+        _hashing_pending += 1
+
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_hashing_pool(), func, *args)
+    finally:
+        with _hashing_lock:
+            _hashing_pending -= 1
+
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_in_hashing_pool(password_security.verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password):
+    return await _run_in_hashing_pool(password_security.get_password_hash, password)
+
+
+def shutdown_hashing_pool():
+    """Arrête le pool de hachage (à l'arrêt de l'application)"""
+    global _hashing_pool
+    with _hashing_lock:
+        pool, _hashing_pool = _hashing_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
 
 
 def authenticate_user(db: Session, email: str, password: str):
@@ -28,6 +92,23 @@ def authenticate_user(db: Session, email: str, password: str):
     return user
 
 
+async def authenticate_user_async(db: Session, email: str, password: str):
+    """Version asynchrone de authenticate_user : bcrypt tourne dans le pool de processus"""
+    def load_user():
+        user = db.query(models.User).filter(models.User.email == email).first()
+        # Utilisateur détaché puis fin de la transaction : la connexion est rendue au pool
+        # pendant la vérification bcrypt (ses attributs restent chargés)
+        if user is not None:
+            db.expunge(user)
+        db.rollback()
+        return user
+
+    user = await run_in_threadpool(load_user)
+    if not user or not await verify_password_async(password, user.hashed_password):
+        return False
+    return user
+
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -36,9 +117,9 @@ def create_access_token(data: dict):
     return {"access_token": encoded_jwt, "token_type": "bearer"}
 
 
-def get_current_user(
+async def get_current_user(
         credentials: HTTPAuthorizationCredentials = Depends(security),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_read_db)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -57,19 +138,30 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user is None:
-        raise credentials_exception
-    return user
+    async def load_user():
+        result = await db.execute(select(models.User).filter(models.User.email == email))
+        db_user = result.scalars().first()
+        if db_user is None:
+            raise credentials_exception
+        return schemas.User.model_validate(db_user)
+
+    # Instantané (id, email, rôle, is_active...) mis en cache, invalidé par crud.update_user / delete_user
+    return await user_cache.get_or_compute_async(email, load_user)
+
+
+def invalidate_cached_user(email: str):
+    """Retire un utilisateur du cache d'authentification après modification ou suppression"""
+    if email:
+        user_cache.discard(email)
 
 
-def get_current_active_user(current_user: models.User = Depends(get_current_user)):
+async def get_current_active_user(current_user: models.User = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
 
-def get_current_admin_user(current_user: models.User = Depends(get_current_active_user)):
+async def get_current_admin_user(current_user: models.User = Depends(get_current_active_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return current_user
\ No newline at end of file
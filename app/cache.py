@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .core.config import settings
+
+# Clé de Session.info où sont accumulées les séries (type, zone) écrites avant le commit
+WRITTEN_SERIES_KEY = "written_series"
+
+
+class TTLCache:
+    """
+    Cache LRU borné avec expiration, utilisable depuis plusieurs threads.
+    Chaque entrée peut déclarer les types et zones dont elle dépend (None = tous)
+    afin d'être invalidée seulement quand ces séries sont modifiées.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Incrémenté à chaque invalidation : un résultat calculé pendant une écriture n'est pas conservé
+        self.generation = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, object]:
+        """Retourne (trouvé, valeur) ; une entrée expirée compte comme un échec"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key: Hashable, value, types: Optional[Iterable[str]] = None,
+            zone_ids: Optional[Iterable[int]] = None, generation: Optional[int] = None):
+        types = frozenset(types) if types else None
+        zone_ids = frozenset(zone_ids) if zone_ids else None
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value, types, zone_ids)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, series: Iterable[Tuple[str, int]]):
+        """Supprime les entrées qui dépendent d'au moins une des séries (type, zone) écrites"""
+        series = set(series)
+        if not series:
+            return
+        with self._lock:
+            stale = [
+                key for key, (_, _, types, zone_ids) in self._entries.items()
+                if any(
+                    (types is None or indicator_type in types) and (zone_ids is None or zone_id in zone_ids)
+                    for indicator_type, zone_id in series
+                )
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            self.generation += 1
+
+    def discard(self, key: Hashable):
+        """Supprime une entrée (sans effet si elle est absente)"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+            self.generation += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable, types: Optional[Iterable[str]] = None,
+                       zone_ids: Optional[Iterable[int]] = None):
+        """Retourne la valeur en cache ou la calcule et la mémorise avec ses dépendances"""
+        found, value = self.get(key)
+        if found:
+            return value
+        generation = self.generation
+        value = compute()
+        self.set(key, value, types, zone_ids, generation=generation)
+        return value
+
+    async def get_or_compute_async(self, key: Hashable, compute: Callable, types: Optional[Iterable[str]] = None,
+                                   zone_ids: Optional[Iterable[int]] = None):
+        """Comme get_or_compute, pour une fonction de calcul asynchrone (routes async)"""
+        found, value = self.get(key)
+        if found:
+            return value
+        generation = self.generation
+        value = await compute()
+        self.set(key, value, types, zone_ids, generation=generation)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Résultats des routes /stats
+stats_cache = TTLCache(settings.STATS_CACHE_MAX_ENTRIES, settings.STATS_CACHE_TTL_SECONDS)
+
+
+def mark_series_written(db: Session, series: Iterable[Tuple[str, int]]):
+    """Note les séries (type, zone) écrites dans la transaction en cours"""
+    db.info.setdefault(WRITTEN_SERIES_KEY, set()).update(series)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_stats_after_commit(session):
+    # Invalidation après le commit : une lecture concurrente ne peut pas remettre en cache l'état précédent
+    series = session.info.pop(WRITTEN_SERIES_KEY, None)
+    if series:
+        stats_cache.invalidate(series)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_written_series(session):
+    session.info.pop(WRITTEN_SERIES_KEY, None)
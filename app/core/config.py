@@ -19,10 +19,105 @@ class Settings:
     DB_FILE_PATH = os.path.join(DATA_DIR, "ecotrack.db").replace('\\', '/')
     DATABASE_URL: str = os.getenv("DATABASE_URL", f"sqlite:///{DB_FILE_PATH}")
 
+    # Profil du moteur SQLite : "production" (WAL, pragmas, lecteurs en lecture seule, écrivain unique)
+    # ou "basic" (connexion d'origine, journal de rollback)
+    SQLITE_PROFILE: str = os.getenv("SQLITE_PROFILE", "production")
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    # Valeur négative : taille du cache de pages en Kio (ici 64 Mio par connexion)
+    SQLITE_CACHE_SIZE: int = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    # Moteur asynchrone du profil "basic" (par défaut : DATABASE_URL avec le pilote aiosqlite)
+    ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", "")
+    # Connexions en lecture seule utilisées par les routes GET (pool synchrone et pool async)
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+    # Attente maximale (secondes) de la connexion d'écriture unique
+    DB_WRITE_POOL_TIMEOUT: float = float(os.getenv("DB_WRITE_POOL_TIMEOUT", "30"))
+
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Hachage bcrypt dans un pool de processus dédié : taille, file d'attente maximale, délai conseillé (503)
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SECONDS", "1"))
+
+    # Cache des utilisateurs authentifiés, par sujet du token (taille et durée de vie en secondes)
+    USER_CACHE_MAX_ENTRIES: int = int(os.getenv("USER_CACHE_MAX_ENTRIES", "1024"))
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+    # Import CSV : nombre de lignes validées puis insérées par transaction
+    CSV_BATCH_SIZE: int = int(os.getenv("CSV_BATCH_SIZE", "5000"))
+    CSV_MAX_REPORTED_ERRORS: int = int(os.getenv("CSV_MAX_REPORTED_ERRORS", "1000"))
+
+    # Cache des résultats des routes /stats (taille maximale et durée de vie en secondes)
+    STATS_CACHE_MAX_ENTRIES: int = int(os.getenv("STATS_CACHE_MAX_ENTRIES", "256"))
+    STATS_CACHE_TTL_SECONDS: float = float(os.getenv("STATS_CACHE_TTL_SECONDS", "300"))
+
+    # Blobs additional_data dédupliqués : empreintes récemment vues gardées en mémoire
+    METADATA_CACHE_MAX_ENTRIES: int = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", "4096"))
+
+    # Archive colonnaire des mois clos (fichiers .npy par type, zone et mois)
+    ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", os.path.join(DATA_DIR, "archive"))
+
+    # Export en flux de /indicators/export : lignes lues par lot
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+    # Ingestion externe : nombre de requêtes simultanées autorisées par fournisseur
+    INGESTION_CONCURRENCY = {
+        "openmeteo": int(os.getenv("INGESTION_CONCURRENCY_OPENMETEO", "8")),
+        "waqi": int(os.getenv("INGESTION_CONCURRENCY_WAQI", "4")),
+        "datagouv": int(os.getenv("INGESTION_CONCURRENCY_DATAGOUV", "4")),
+    }
+
+    # Cache disque des réponses des fournisseurs externes : durée de fraîcheur par fournisseur
+    # (secondes, requête conditionnelle ensuite) et âge maximal avant purge (jours)
+    HTTP_CACHE_ENABLED: bool = os.getenv("HTTP_CACHE_ENABLED", "true").lower() == "true"
+    HTTP_CACHE_DIR: str = os.getenv("HTTP_CACHE_DIR", os.path.join(DATA_DIR, "http_cache"))
+    HTTP_CACHE_TTL_SECONDS = {
+        "openmeteo": int(os.getenv("HTTP_CACHE_TTL_OPENMETEO", "900")),
+        "waqi": int(os.getenv("HTTP_CACHE_TTL_WAQI", "600")),
+        "datagouv": int(os.getenv("HTTP_CACHE_TTL_DATAGOUV", "86400")),
+    }
+    HTTP_CACHE_MAX_AGE_DAYS: int = int(os.getenv("HTTP_CACHE_MAX_AGE_DAYS", "7"))
+
+    # URL de base des fournisseurs externes (remplaçables par le serveur de rejeu des benchmarks)
+    PROVIDER_BASE_URLS = {
+        "openmeteo": os.getenv("OPENMETEO_BASE_URL", "https://api.open-meteo.com").rstrip("/"),
+        "openmeteo_archive": os.getenv("OPENMETEO_ARCHIVE_BASE_URL", "https://archive-api.open-meteo.com").rstrip("/"),
+        "waqi": os.getenv("WAQI_BASE_URL", "https://api.waqi.info").rstrip("/"),
+        "datagouv": os.getenv("DATAGOUV_BASE_URL", "https://www.data.gouv.fr").rstrip("/"),
+    }
+    # Dossier où enregistrer les réponses des fournisseurs (fixtures), vide = pas d'enregistrement
+    PROVIDER_RECORD_DIR: str = os.getenv("PROVIDER_RECORD_DIR", "")
+
+    # Planificateur d'ingestion lancé avec l'application : intervalle par fournisseur (minutes),
+    # décalage aléatoire ajouté à chaque intervalle (secondes) et exécutions simultanées
+    INGESTION_SCHEDULER_ENABLED: bool = os.getenv("INGESTION_SCHEDULER_ENABLED", "true").lower() == "true"
+    INGESTION_INTERVAL_MINUTES = {
+        "openmeteo": int(os.getenv("INGESTION_INTERVAL_OPENMETEO", "60")),
+        "waqi": int(os.getenv("INGESTION_INTERVAL_WAQI", "60")),
+        "datagouv": int(os.getenv("INGESTION_INTERVAL_DATAGOUV", "1440")),
+    }
+    INGESTION_JITTER_SECONDS: int = int(os.getenv("INGESTION_JITTER_SECONDS", "120"))
+    INGESTION_JOB_WORKERS: int = int(os.getenv("INGESTION_JOB_WORKERS", "2"))
+
+    # Index spatial des zones (/zones/nearest) : taille des cellules de la grille (km) et âge
+    # maximal avant reconstruction (secondes, pour les zones modifiées par un autre processus)
+    SPATIAL_CELL_KM: float = float(os.getenv("SPATIAL_CELL_KM", "20"))
+    SPATIAL_INDEX_MAX_AGE_SECONDS: float = float(os.getenv("SPATIAL_INDEX_MAX_AGE_SECONDS", "300"))
+    # Rattachement d'un point (lat, lon) à une zone décrite par un simple point : distance maximale (km)
+    ZONE_MATCH_MAX_DISTANCE_KM: float = float(os.getenv("ZONE_MATCH_MAX_DISTANCE_KM", "10"))
+
+    # Métriques Prometheus (/metrics) : latences, requêtes SQL et ingestion
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    # Journal des requêtes SQL lentes (/admin/debug/slow-queries) : seuil en ms (0 = désactivé)
+    # et nombre d'entrées conservées
+    SLOW_QUERY_THRESHOLD_MS: float = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+    SLOW_QUERY_LOG_SIZE: int = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+
     def __init__(self):
         print(f"📁 Dossier data: {self.DATA_DIR}")
         print(f"📄 Fichier DB: {self.DB_FILE_PATH}")
@@ -0,0 +1,12 @@
+from passlib.context import CryptContext
+
+# Module volontairement léger : il est importé par les processus du pool de hachage
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def get_password_hash(password):
+    return pwd_context.hash(password)
@@ -1,9 +1,17 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
+from sqlalchemy import and_, func, select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Tuple
 from datetime import datetime
+from itertools import chain, islice
+import base64
+import heapq
+import json
 
-from . import models, schemas, auth
+import numpy as np
+
+from . import models, schemas, auth, rollups, downsampling, archive, indicator_metadata
 
 
 # Users - FONCTIONS AJOUTÉES
@@ -24,12 +32,15 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
         return None
 
     update_data = user_update.dict(exclude_unset=True)
+    previous_email = db_user.email
 
     # Ne pas permettre de modifier son propre rôle si admin
     for field, value in update_data.items():
         setattr(db_user, field, value)
 
     db.commit()
+    auth.invalidate_cached_user(previous_email)
+    auth.invalidate_cached_user(db_user.email)
     db.refresh(db_user)
     return db_user
 
@@ -40,8 +51,10 @@ def delete_user(db: Session, user_id: int):
     if not db_user:
         return False
 
+    email = db_user.email
     db.delete(db_user)
     db.commit()
+    auth.invalidate_cached_user(email)
     return True
 
 
@@ -49,8 +62,9 @@ def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = auth.get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None):
+    if hashed_password is None:
+        hashed_password = auth.get_password_hash(user.password)
     db_user = models.User(
         email=user.email,
         hashed_password=hashed_password,
@@ -90,19 +104,131 @@ def create_source(db: Session, source: schemas.SourceBase):
 
 
 # Indicators
+# Clé naturelle d'un indicateur (index unique uq_indicators_natural_key, migration 0007)
+NATURAL_KEY = ("zone_id", "source_id", "type", "timestamp")
+
+
+class DuplicateIndicatorError(ValueError):
+    """Un indicateur de même clé naturelle (zone, source, type, timestamp) existe déjà"""
+
+
+def natural_key(row) -> tuple:
+    return tuple(row[column] if isinstance(row, dict) else getattr(row, column) for column in NATURAL_KEY)
+
+
+def existing_indicator_keys(db: Session, keys) -> set:
+    """
+    Parmi les clés naturelles données, celles déjà présentes en base ou dans l'archive.
+    Une seule requête par lot : les clés, passées en un paramètre JSON et dépliées par json_each,
+    sont jointes à l'index unique uq_indicators_natural_key (une recherche d'index par clé).
+    Les clés avec une colonne NULL ne sont jamais des doublons (sémantique SQL de l'index unique).
+    """
+    keys = {key for key in keys if None not in key}
+    if not keys:
+        return set()
+    indicator = models.Indicator
+    # Horodatages au format stocké par SQLAlchemy, comparables à la colonne indexée
+    dialect = db.get_bind().dialect
+    to_stored = indicator.__table__.c.timestamp.type.dialect_impl(dialect).bind_processor(dialect)
+    requested = func.json_each(json.dumps([
+        [zone_id, source_id, indicator_type, to_stored(timestamp)]
+        for zone_id, source_id, indicator_type, timestamp in keys
+    ])).table_valued("value").alias("requested_keys")
+    columns = [getattr(indicator, column) for column in NATURAL_KEY]
+    matches = and_(*(
+        column == func.json_extract(requested.c.value, f"$[{position}]")
+        for position, column in enumerate(columns)
+    ))
+    found = {tuple(row) for row in db.execute(select(*columns).join_from(requested, indicator, matches))}
+    return found | archive.archived_keys(key for key in keys if key not in found)
+
+
 def create_indicator(db: Session, indicator: schemas.IndicatorCreate, user_id: int):
-    db_indicator = models.Indicator(
-        **indicator.dict(),
-        user_id=user_id,
-        timestamp=indicator.timestamp if isinstance(indicator.timestamp, datetime) else datetime.fromisoformat(
-            indicator.timestamp)
-    )
+    indicator_data = indicator.dict()
+    indicator_data["timestamp"] = indicator.timestamp if isinstance(indicator.timestamp, datetime) \
+        else datetime.fromisoformat(indicator.timestamp)
+    db_indicator = models.Indicator(**indicator_data, user_id=user_id)
+    if existing_indicator_keys(db, [natural_key(db_indicator)]):
+        raise DuplicateIndicatorError("Un indicateur existe déjà pour cette zone, source, type et date")
     db.add(db_indicator)
-    db.commit()
+    try:
+        rollups.record_indicators(db, [db_indicator])
+        db.commit()
+    except IntegrityError as e:
+        # Insertion concurrente de la même clé naturelle entre la vérification et le commit
+        db.rollback()
+        if "UNIQUE" not in str(e.orig):
+            raise
+        raise DuplicateIndicatorError("Un indicateur existe déjà pour cette zone, source, type et date") from e
     db.refresh(db_indicator)
     return db_indicator
 
 
+def bulk_create_indicators(db: Session, rows: List[dict]):
+    """
+    Insère un lot d'indicateurs (dictionnaires de colonnes) et retourne le nombre de lignes créées.
+    Les clés naturelles déjà connues (table, archive, lot lui-même) sont écartées d'avance ;
+    INSERT ... ON CONFLICT DO NOTHING (executemany Core) couvre les écritures concurrentes, et
+    seules les lignes réellement insérées (id supérieur au dernier id avant l'insertion)
+    alimentent les agrégats. Les blobs additional_data sont remplacés par leur metadata_id.
+    """
+    if not rows:
+        return 0
+    keys = [natural_key(row) for row in rows]
+    existing = existing_indicator_keys(db, keys)
+    new_rows = []
+    for row, key in zip(rows, keys):
+        if key in existing:
+            continue
+        if None not in key:
+            existing.add(key)
+        new_rows.append(row)
+    if not new_rows:
+        db.commit()
+        return 0
+
+    indicator = models.Indicator
+    new_rows = indicator_metadata.intern_rows(db, new_rows)
+    connection = db.connection()
+    # Identifiants AUTOINCREMENT croissants et écrivain unique jusqu'au commit : les lignes
+    # d'id supérieur à last_id sont exactement celles insérées par ce lot
+    last_id = connection.execute(select(func.max(indicator.id))).scalar() or 0
+    stmt = sqlite_insert(indicator.__table__).on_conflict_do_nothing(
+        index_elements=[getattr(indicator, column) for column in NATURAL_KEY]
+    )
+    inserted = connection.execute(stmt, new_rows).rowcount
+    if inserted:
+        rollups.record_inserted(db, last_id, {(row["type"], row["zone_id"]) for row in new_rows})
+    db.commit()
+    return inserted
+
+
+# Horodatages de reprise de l'ingestion
+def get_ingestion_watermarks(db: Session, provider: str) -> dict:
+    """Dernier horodatage ingéré par zone pour un fournisseur : {zone_id: datetime}"""
+    watermark = models.IngestionWatermark
+    return dict(db.query(watermark.zone_id, watermark.last_timestamp).filter(watermark.provider == provider).all())
+
+
+def set_ingestion_watermark(db: Session, provider: str, zone_id: int, last_timestamp: datetime):
+    """Avance l'horodatage de reprise d'une zone (jamais en arrière) ; validé avec la transaction en cours"""
+    watermark = models.IngestionWatermark
+    stmt = sqlite_insert(watermark).values(
+        provider=provider, zone_id=zone_id, last_timestamp=last_timestamp, updated_at=datetime.utcnow()
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[watermark.provider, watermark.zone_id],
+        set_={
+            "last_timestamp": func.max(watermark.last_timestamp, stmt.excluded.last_timestamp),
+            "updated_at": stmt.excluded.updated_at,
+        },
+    ))
+
+
+def get_ingestion_job(db: Session, job_id: int):
+    return db.query(models.IngestionJob).filter(models.IngestionJob.id == job_id).first()
+
+
 def get_indicators_by_type(db: Session, indicator_type: str, limit: int = 100):
     return db.query(models.Indicator).filter(
         models.Indicator.type == indicator_type
@@ -115,18 +241,39 @@ def get_indicators_by_zone(db: Session, zone_id: int, limit: int = 100):
     ).order_by(models.Indicator.timestamp.desc()).limit(limit).all()
 
 
-def get_indicators(
-        db: Session,
-        skip: int = 0,
-        limit: int = 100,
+def encode_cursor(timestamp: datetime, indicator_id: int) -> str:
+    """Curseur opaque de pagination : position (timestamp, id) du dernier élément renvoyé"""
+    raw = f"{timestamp.isoformat()}|{indicator_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Décode un curseur de pagination ; ValueError si le curseur est invalide"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, indicator_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(indicator_id)
+    except Exception:
+        raise ValueError("Curseur de pagination invalide")
+
+
+def day_bounds(start_date: datetime = None, end_date: datetime = None):
+    """Bornes des filtres de dates de /indicators/ : du début du jour de start_date à la fin du jour de end_date"""
+    if start_date:
+        start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    if end_date:
+        end_date = end_date.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return start_date, end_date
+
+
+def filter_indicators(
+        query,
         type: str = None,
         zone_id: int = None,
         start_date: datetime = None,
         end_date: datetime = None
 ):
-    """Récupère les indicateurs avec filtres optionnels"""
-    query = db.query(models.Indicator)
-
+    """Applique les filtres de /indicators/ (type, zone, dates incluses à la journée) à une requête"""
     # Filtrer par type seulement si spécifié et non vide
     if type and type.strip() != "":
         query = query.filter(models.Indicator.type == type)
@@ -134,18 +281,175 @@ def get_indicators(
     if zone_id:
         query = query.filter(models.Indicator.zone_id == zone_id)
 
-    # CORRECTION : Gestion correcte des dates
+    # CORRECTION : Gestion correcte des dates (journées entières)
+    start_date, end_date = day_bounds(start_date, end_date)
     if start_date:
-        # S'assurer que start_date est au début de la journée
-        start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
         query = query.filter(models.Indicator.timestamp >= start_date)
 
     if end_date:
-        # S'assurer que end_date est à la fin de la journée
-        end_date = end_date.replace(hour=23, minute=59, second=59, microsecond=999999)
         query = query.filter(models.Indicator.timestamp <= end_date)
 
-    return query.order_by(models.Indicator.timestamp.desc()).limit(limit).all()
+    return query
+
+
+def get_indicators(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        type: str = None,
+        zone_id: int = None,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        cursor: Optional[Tuple[datetime, int]] = None
+):
+    """
+    Récupère les indicateurs avec filtres optionnels, du plus récent au plus ancien.
+    La pagination se fait par curseur (timestamp, id) : chaque page est une recherche
+    d'index, quel que soit le nombre de pages déjà parcourues.
+    Les mois archivés (app/archive.py) sont fusionnés avec la table.
+    """
+    query = filter_indicators(db.query(models.Indicator), type, zone_id, start_date, end_date)
+
+    if cursor:
+        query = query.filter(
+            tuple_(models.Indicator.timestamp, models.Indicator.id) < tuple_(*cursor)
+        )
+
+    query = query.order_by(models.Indicator.timestamp.desc(), models.Indicator.id.desc())
+    archived = read_archived_indicators(type, zone_id, start_date, end_date, cursor, skip + limit)
+    if not archived:
+        if skip:
+            query = query.offset(skip)
+        return query.limit(limit).all()
+    return merge_latest(query.limit(skip + limit).all(), archived, skip, limit)
+
+
+def read_archived_indicators(
+        type: str = None,
+        zone_id: int = None,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        cursor: Optional[Tuple[datetime, int]] = None,
+        limit: int = 100
+):
+    """Indicateurs archivés les plus récents, avec les filtres de /indicators/"""
+    start_date, end_date = day_bounds(start_date, end_date)
+    return archive.read_latest(
+        type if type and type.strip() != "" else None, zone_id, start_date, end_date, cursor, limit
+    )
+
+
+def merge_latest(live: List, archived: List, skip: int, limit: int):
+    """Fusionne deux listes triées par (timestamp, id) décroissant et retourne la page demandée"""
+    merged = heapq.merge(live, archived, key=lambda indicator: (indicator.timestamp, indicator.id), reverse=True)
+    return list(islice(merged, skip, skip + limit))
+
+
+EXPORT_COLUMNS = archive.ROW_COLUMNS
+
+
+def iter_indicator_rows(
+        db: Session,
+        type: str = None,
+        zone_id: int = None,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        batch_size: int = 5000
+):
+    """
+    Parcourt les indicateurs filtrés par ordre chronologique, par lots de tuples bruts
+    (colonnes EXPORT_COLUMNS), sans construire d'objets ORM : la mémoire reste bornée.
+    Chaque lot est une requête keyset (timestamp, id) dans sa propre transaction : aucune
+    connexion n'est retenue pendant que l'appelant consomme le lot.
+    """
+    indicator = models.Indicator
+    columns = [getattr(indicator, column) for column in EXPORT_COLUMNS]
+    stmt = filter_indicators(select(*columns), type, zone_id, start_date, end_date)
+    stmt = stmt.order_by(indicator.timestamp, indicator.id).limit(batch_size)
+
+    def live_batches():
+        last = None
+        while True:
+            page = stmt if last is None else stmt.where(tuple_(indicator.timestamp, indicator.id) > tuple_(*last))
+            rows = db.execute(page).all()
+            # Fin de la transaction de lecture avant de rendre la main : la connexion retourne au pool
+            db.rollback()
+            if rows:
+                yield rows
+            if len(rows) < batch_size:
+                return
+            last = (rows[-1][4], rows[-1][0])
+
+    archive_start, archive_end = day_bounds(start_date, end_date)
+    archived = archive.iter_rows(type if type and type.strip() != "" else None, zone_id, archive_start, archive_end)
+    first_archived = next(archived, None)
+    if first_archived is None:
+        yield from live_batches()
+        return
+
+    # Fusion ordonnée (timestamp, id) des lignes archivées et de la table, toujours par lots
+    live = (row for batch in live_batches() for row in batch)
+    merged = heapq.merge(live, chain([first_archived], archived), key=lambda row: (row[4], row[0]))
+    while True:
+        batch = list(islice(merged, batch_size))
+        if not batch:
+            break
+        yield batch
+
+
+def get_indicator_series(
+        db: Session,
+        type: str,
+        zone_ids: Optional[List[int]] = None,
+        start_date: datetime = None,
+        end_date: datetime = None,
+        points: int = 500,
+        method: str = "lttb"
+):
+    """
+    Série réduite par zone pour les graphiques : au plus `points` points par zone
+    quelle que soit la période (LTTB ou min/max par seau, calculés en NumPy).
+    """
+    indicator = models.Indicator
+    stmt = filter_indicators(
+        select(indicator.zone_id, indicator.timestamp, indicator.value),
+        type, None, start_date, end_date
+    ).filter(indicator.zone_id.isnot(None), indicator.value.isnot(None))
+    if zone_ids:
+        stmt = stmt.filter(indicator.zone_id.in_(zone_ids))
+    rows = db.execute(stmt.order_by(indicator.zone_id, indicator.timestamp)).all()
+    archive_start, archive_end = day_bounds(start_date, end_date)
+    archived = archive.load_series(type, zone_ids, archive_start, archive_end)
+    if not rows and not archived:
+        return []
+
+    series = {}
+    if rows:
+        zones, timestamps, values = zip(*rows)
+        series = downsampling.split_by_zone(
+            np.array(zones, dtype=np.int64),
+            np.array(timestamps, dtype="datetime64[us]"),
+            np.array(values, dtype=np.float64)
+        )
+    for zone_id, (archived_timestamps, archived_values) in archived.items():
+        if zone_id in series:
+            # Mois archivés + lignes de la table (retardataires comprises), remis dans l'ordre
+            timestamps = np.concatenate((archived_timestamps, series[zone_id][0]))
+            order = np.argsort(timestamps, kind="stable")
+            series[zone_id] = (timestamps[order], np.concatenate((archived_values, series[zone_id][1]))[order])
+        else:
+            series[zone_id] = (archived_timestamps, archived_values)
+
+    result = []
+    for zone_id, (zone_timestamps, zone_values) in sorted(series.items()):
+        kept_timestamps, kept_values = downsampling.downsample(zone_timestamps, zone_values, points, method)
+        result.append({
+            "zone_id": zone_id,
+            "count": len(zone_timestamps),
+            "timestamps": kept_timestamps.tolist(),
+            "values": kept_values.tolist()
+        })
+    return result
 
 
 def get_air_quality_by_zone(
@@ -154,54 +458,82 @@ def get_air_quality_by_zone(
         end_date: datetime,
         zone_id: Optional[int] = None
 ):
-    query = db.query(
-        models.Zone.name,
-        func.avg(models.Indicator.value).label('average_quality'),
-        func.count(models.Indicator.id).label('data_points')
-    ).join(models.Zone, models.Zone.id == models.Indicator.zone_id) \
-        .filter(
-        models.Indicator.type == 'air_quality_pm25',
-        models.Indicator.timestamp >= start_date,
-        models.Indicator.timestamp <= end_date
+    """Moyenne PM2.5 par zone sur la période, calculée depuis les agrégats horaires/journaliers"""
+    aggregates = rollups.aggregate(
+        db, ['air_quality_pm25'], start_date, end_date,
+        zone_ids=[zone_id] if zone_id else None
     )
+    if not aggregates:
+        return []
 
-    if zone_id:
-        query = query.filter(models.Indicator.zone_id == zone_id)
+    zone_names = dict(
+        db.query(models.Zone.id, models.Zone.name)
+        .filter(models.Zone.id.in_({zone for zone, _ in aggregates}))
+        .all()
+    )
 
-    result = query.group_by(models.Zone.name).all()
+    # Regroupement par nom de zone, comme la requête SQL d'origine
+    by_name = {}
+    for (zone, _), agg in aggregates.items():
+        if zone in zone_names:
+            by_name.setdefault(zone_names[zone], rollups.Aggregate()).merge(agg)
 
     return [
         {
-            "zone_name": row[0],
-            "average_quality": float(row[1]) if row[1] else 0,
+            "zone_name": name,
+            "average_quality": agg.average or 0,
             "period": f"{start_date.date()} to {end_date.date()}",
-            "data_points": row[2]
+            "data_points": agg.count
         }
-        for row in result
+        for name, agg in sorted(by_name.items())
+    ]
+
+
+def get_summary_stats(
+        db: Session,
+        types: Optional[List[str]] = None,
+        zone_ids: Optional[List[int]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        by_zone: bool = False
+):
+    """
+    Statistiques (nombre, moyenne, min, max, écart-type, première/dernière mesure)
+    par type, ou par (type, zone) si by_zone, en une seule passe groupée sur les agrégats
+    """
+    totals = {}
+    for (zone, indicator_type), agg in rollups.aggregate(db, types, start_date, end_date, zone_ids).items():
+        key = (indicator_type, zone if by_zone else None)
+        totals.setdefault(key, rollups.Aggregate()).merge(agg)
+
+    return [
+        {
+            "type": indicator_type,
+            "zone_id": zone,
+            "count": agg.count,
+            "average": agg.average,
+            "min": float(agg.min),
+            "max": float(agg.max),
+            "stddev": agg.stddev,
+            "first_timestamp": agg.first_timestamp,
+            "last_timestamp": agg.last_timestamp
+        }
+        for (indicator_type, zone), agg in sorted(totals.items(), key=lambda item: (item[0][0], item[0][1] or 0))
     ]
 
 
 def get_air_quality_stats(db: Session):
     pollutants = ['air_quality_pm25', 'air_quality_pm10', 'air_quality_no2']
 
-    stats = []
-    for pollutant in pollutants:
-        result = db.query(
-            func.avg(models.Indicator.value).label('average'),
-            func.count(models.Indicator.id).label('count'),
-            func.min(models.Indicator.value).label('min'),
-            func.max(models.Indicator.value).label('max')
-        ).filter(
-            models.Indicator.type == pollutant
-        ).first()
-
-        if result and result[0]:
-            stats.append({
-                "type": pollutant,
-                "average": float(result.average),
-                "count": result.count,
-                "min": float(result.min),
-                "max": float(result.max)
-            })
-
-    return stats
\ No newline at end of file
+    summary = {row["type"]: row for row in get_summary_stats(db, types=pollutants)}
+    return [
+        {
+            "type": pollutant,
+            "average": summary[pollutant]["average"],
+            "count": summary[pollutant]["count"],
+            "min": summary[pollutant]["min"],
+            "max": summary[pollutant]["max"]
+        }
+        for pollutant in pollutants
+        if pollutant in summary
+    ]
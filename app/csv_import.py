@@ -0,0 +1,182 @@
+import codecs
+import csv
+import time
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterator, Optional
+
+from sqlalchemy.orm import Session
+
+from . import crud
+from .core.config import settings
+from .spatial import zone_index
+
+REQUIRED_COLUMNS = ("type", "value", "unit", "source_id")
+# Sans zone_id, la zone est celle qui contient le point (lat, lon)
+LOCATION_COLUMNS = ("lat", "lon")
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class CSVFormatError(ValueError):
+    """En-tête CSV invalide : le fichier ne peut pas être importé"""
+
+
+def iter_text_lines(stream: BinaryIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[str]:
+    """Lit un flux binaire par blocs et renvoie les lignes décodées une par une (mémoire bornée)"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def parse_row(row: dict, default_timestamp: datetime, user_id: int) -> dict:
+    """Valide une ligne CSV et la convertit en colonnes prêtes pour l'insertion"""
+    missing = [column for column in REQUIRED_COLUMNS if not (row.get(column) or "").strip()]
+    if missing:
+        raise ValueError(f"colonnes manquantes: {', '.join(missing)}")
+
+    parsed = {}
+    if (row.get("zone_id") or "").strip():
+        parsed["zone_id"] = int(row["zone_id"])
+    elif all((row.get(column) or "").strip() for column in LOCATION_COLUMNS):
+        parsed.update(zone_id=None, lat=float(row["lat"]), lon=float(row["lon"]))
+    else:
+        raise ValueError("colonnes manquantes: zone_id (ou lat et lon)")
+
+    raw_timestamp = (row.get("timestamp") or "").strip()
+    if raw_timestamp:
+        timestamp = datetime.fromisoformat(raw_timestamp)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    else:
+        timestamp = default_timestamp
+
+    parsed.update({
+        "type": row["type"].strip(),
+        "value": float(row["value"]),
+        "unit": row["unit"].strip(),
+        "timestamp": timestamp,
+        "source_id": int(row["source_id"]),
+        "additional_data": row.get("additional_data") or None,
+        "user_id": user_id,
+    })
+    return parsed
+
+
+def import_indicators_csv(
+        db: Session,
+        stream: BinaryIO,
+        user_id: int,
+        batch_size: Optional[int] = None
+):
+    """
+    Importe un fichier CSV d'indicateurs en streaming.
+    Les lignes sont validées puis insérées par lots, une transaction par lot. Une ligne sans
+    zone_id est rattachée à la zone contenant son point (lat, lon), par lot.
+    Retourne le nombre de créations et de doublons ignorés, le rapport d'erreurs par ligne et le débit.
+    """
+    batch_size = batch_size or settings.CSV_BATCH_SIZE
+    max_errors = settings.CSV_MAX_REPORTED_ERRORS
+
+    reader = csv.DictReader(iter_text_lines(stream))
+    columns = [name.strip() for name in (reader.fieldnames or [])]
+    missing_columns = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if "zone_id" not in columns and not all(column in columns for column in LOCATION_COLUMNS):
+        missing_columns.append("zone_id (ou lat et lon)")
+    if missing_columns:
+        raise CSVFormatError(f"Colonnes obligatoires absentes: {', '.join(missing_columns)}")
+    reader.fieldnames = columns
+
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    rows_read = 0
+    created = 0
+    duplicates = 0
+    rejected = 0
+    batches = 0
+    errors = []
+    errors_truncated = False
+
+    def report(line, message, count=1):
+        nonlocal rejected, errors_truncated
+        rejected += count
+        if len(errors) < max_errors:
+            errors.append({"line": line, "error": message})
+        else:
+            errors_truncated = True
+
+    def locate(batch, lines):
+        # Zones des lignes sans zone_id résolues en une fois ; lignes hors de toute zone rejetées
+        pending = [i for i, row in enumerate(batch) if row["zone_id"] is None]
+        if not pending:
+            return batch
+        points = [(batch[i].pop("lat"), batch[i].pop("lon")) for i in pending]
+        zone_ids = zone_index.resolve(db, (lat for lat, _ in points), (lon for _, lon in points))
+        unresolved = set()
+        for i, (lat, lon), zone_id in zip(pending, points, zone_ids):
+            if zone_id is None:
+                unresolved.add(i)
+                report(lines[i], f"aucune zone ne contient le point ({lat}, {lon})")
+            else:
+                batch[i]["zone_id"] = zone_id
+        return [row for i, row in enumerate(batch) if i not in unresolved]
+
+    def flush(batch, lines):
+        nonlocal created, duplicates, batches
+        first_line, last_line = lines[0], lines[-1]
+        try:
+            batch = locate(batch, lines)
+            inserted = crud.bulk_create_indicators(db, batch)
+            created += inserted
+            # Lignes déjà présentes (même zone, source, type et date) : ignorées
+            duplicates += len(batch) - inserted
+            batches += 1
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Erreur insertion lot CSV (lignes {first_line}-{last_line}): {e}")
+            report(first_line, f"lot des lignes {first_line}-{last_line} non inséré: {e}", count=len(batch))
+
+    batch = []
+    batch_lines = []
+    for row in reader:
+        rows_read += 1
+        line = reader.line_num
+        try:
+            batch.append(parse_row(row, now, user_id))
+        except (ValueError, TypeError, AttributeError) as e:
+            report(line, str(e))
+            continue
+
+        batch_lines.append(line)
+        if len(batch) >= batch_size:
+            flush(batch, batch_lines)
+            batch = []
+            batch_lines = []
+
+    if batch:
+        flush(batch, batch_lines)
+
+    duration = time.perf_counter() - started
+    return {
+        "message": f"{created} indicateurs créés avec succès",
+        "created": created,
+        "duplicates": duplicates,
+        "rejected": rejected,
+        "errors": errors,
+        "errors_truncated": errors_truncated,
+        "stats": {
+            "rows_read": rows_read,
+            "batches": batches,
+            "duration_seconds": round(duration, 3),
+            "rows_per_second": round(rows_read / duration, 1) if duration > 0 else None,
+        },
+    }
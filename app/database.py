@@ -1,15 +1,115 @@
-from sqlalchemy import create_engine
+import os
+import time
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from .core.config import settings
+from .metrics import instrument_engines
+from .slow_queries import slow_query_log
+
+
+def _sqlite_file_path(url: str):
+    """Chemin du fichier SQLite de l'URL, ou None (autre SGBD ou base en mémoire)"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        return None
+    return parsed.database
+
+
+SQLITE_FILE = _sqlite_file_path(settings.DATABASE_URL)
+PRODUCTION_PROFILE = SQLITE_FILE is not None and settings.SQLITE_PROFILE == "production"
+
+
+def _apply_pragmas(dbapi_connection, writer: bool):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    if writer:
+        # Le mode de journal est persistant dans le fichier : seul l'écrivain le fixe
+        cursor.execute(f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA cache_size = {int(settings.SQLITE_CACHE_SIZE)}")
+    cursor.close()
+
+
+if PRODUCTION_PROFILE:
+    # Écrivain unique : toutes les transactions d'écriture passent par une seule connexion,
+    # les autres attendent leur tour dans le pool au lieu d'échouer sur "database is locked"
+    engine = create_engine(
+        settings.DATABASE_URL,
+        connect_args={"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000},
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=settings.DB_WRITE_POOL_TIMEOUT,
+    )
+
+    # Lecteurs : connexions en lecture seule ; en WAL elles lisent pendant qu'une écriture est en cours
+    read_engine = create_engine(
+        f"sqlite:///file:{SQLITE_FILE}?mode=ro&uri=true",
+        connect_args={"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000},
+        pool_size=settings.DB_READ_POOL_SIZE,
+        max_overflow=0,
+    )
+
+    # Lecteurs asynchrones (aiosqlite) des routes async, sur les mêmes fichiers en lecture seule
+    async_read_engine = create_async_engine(
+        f"sqlite+aiosqlite:///file:{SQLITE_FILE}?mode=ro&uri=true",
+        connect_args={"timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000},
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=settings.DB_READ_POOL_SIZE,
+        max_overflow=0,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _configure_writer(dbapi_connection, connection_record):
+        _apply_pragmas(dbapi_connection, writer=True)
+
+    @event.listens_for(read_engine, "connect")
+    @event.listens_for(async_read_engine.sync_engine, "connect")
+    def _configure_reader(dbapi_connection, connection_record):
+        _apply_pragmas(dbapi_connection, writer=False)
+else:
+    # Configuration SQLite avec support pour les threads
+    engine = create_engine(
+        settings.DATABASE_URL,
+        connect_args={"check_same_thread": False}
+    )
+    read_engine = engine
+    async_read_engine = create_async_engine(
+        settings.ASYNC_DATABASE_URL or make_url(settings.DATABASE_URL).set(drivername="sqlite+aiosqlite")
+    )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info.pop("query_started", time.perf_counter())
+    if duration >= slow_query_log.threshold:
+        slow_query_log.record(conn, statement, parameters, duration, executemany)
+
+
+# Comptage des requêtes SQL par requête HTTP (/metrics), branché avant le journal des requêtes
+# lentes : les écouteurs s'exécutent dans l'ordre d'enregistrement, l'EXPLAIN QUERY PLAN de ce
+# dernier n'est donc pas compté dans le temps base de données
+if settings.METRICS_ENABLED:
+    instrument_engines(engine, read_engine, async_read_engine.sync_engine)
+
+# Journal des requêtes lentes sur tous les moteurs (écrivain, lecteurs, lecteurs async)
+if settings.SLOW_QUERY_THRESHOLD_MS > 0:
+    for _engine in {id(e): e for e in (engine, read_engine, async_read_engine.sync_engine)}.values():
+        event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
 
-# Configuration SQLite avec support pour les threads
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # Dépendance de base de données
@@ -18,4 +118,37 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db():
+    """Session en lecture seule (routes GET) : n'occupe pas la connexion d'écriture"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db():
+    """Session asynchrone en lecture seule (routes async) : n'occupe pas de thread du threadpool pendant le SQL"""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+def run_migrations():
+    """
+    Met le schéma à jour avec les migrations Alembic (remplace create_all).
+    Une base créée auparavant par create_all est d'abord marquée à la révision initiale.
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(settings.BASE_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(settings.BASE_DIR, "migrations"))
+    config.attributes["configure_logger"] = False
+
+    tables = inspect(engine).get_table_names()
+    if "indicators" in tables and "alembic_version" not in tables:
+        command.stamp(config, "0001")
+    command.upgrade(config, "head")
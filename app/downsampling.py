@@ -0,0 +1,88 @@
+import numpy as np
+
+DOWNSAMPLING_METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets : indices des threshold points qui conservent la forme
+    de la courbe. Le premier et le dernier point sont toujours gardés ; dans chaque seau
+    intermédiaire, on garde le point qui forme le plus grand triangle avec le point retenu
+    précédemment et la moyenne du seau suivant (aire calculée sur tout le seau en NumPy).
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 seaux répartis sur les points 1 .. n-2
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+
+    # Moyenne de chaque seau via les sommes cumulées, puis décalée : moyenne du seau suivant
+    sum_x = np.concatenate(([0.0], np.cumsum(x)))
+    sum_y = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = ends - starts
+    next_x = np.append(((sum_x[ends] - sum_x[starts]) / sizes)[1:], x[-1])
+    next_y = np.append(((sum_y[ends] - sum_y[starts]) / sizes)[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = starts[i], ends[i]
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y[i] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Min/max par seau : indices du minimum et du maximum de chaque seau (pics conservés),
+    plus le premier et le dernier point, soit au plus threshold points. Entièrement vectorisé.
+    """
+    n = len(y)
+    if threshold >= n:
+        return np.arange(n)
+    buckets = (threshold - 2) // 2
+    if buckets < 1:
+        return np.array([0, n - 1])
+
+    bucket = np.arange(n) * buckets // n
+    # Tri par seau puis par valeur : le premier élément de chaque seau est son minimum, le dernier son maximum
+    order = np.lexsort((y, bucket))
+    bounds = np.searchsorted(bucket, np.arange(buckets + 1))
+    minima = order[bounds[:-1]]
+    maxima = order[bounds[1:] - 1]
+    return np.unique(np.concatenate((minima, maxima, [0, n - 1])))
+
+
+def downsample(timestamps: np.ndarray, values: np.ndarray, points: int, method: str = "lttb"):
+    """
+    Réduit une série triée par date à au plus `points` points.
+    timestamps : datetime64, values : float64. Retourne (timestamps, values) réduits.
+    """
+    if method == "minmax":
+        indices = minmax_indices(values, points)
+    else:
+        # Abscisse en secondes depuis le premier point (précision des sommes cumulées)
+        seconds = (timestamps - timestamps[0]) / np.timedelta64(1, "s") if len(timestamps) else timestamps
+        indices = lttb_indices(seconds, values, points)
+    return timestamps[indices], values[indices]
+
+
+def split_by_zone(zone_ids: np.ndarray, timestamps: np.ndarray, values: np.ndarray):
+    """Découpe des colonnes triées par (zone, date) en une série par zone : {zone_id: (timestamps, values)}"""
+    if not len(zone_ids):
+        return {}
+    cuts = np.flatnonzero(np.diff(zone_ids)) + 1
+    starts = np.concatenate(([0], cuts))
+    ends = np.concatenate((cuts, [len(zone_ids)]))
+    return {
+        int(zone_ids[start]): (timestamps[start:end], values[start:end])
+        for start, end in zip(starts, ends)
+    }
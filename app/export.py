@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator, Optional
+
+from . import crud
+from .core.config import settings
+from .database import ReadSessionLocal
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _format_ndjson(batch) -> str:
+    lines = []
+    for row in batch:
+        record = dict(zip(crud.EXPORT_COLUMNS, row))
+        if record["timestamp"] is not None:
+            record["timestamp"] = record["timestamp"].isoformat()
+        lines.append(json.dumps(record, ensure_ascii=False))
+    return "\n".join(lines) + "\n"
+
+
+def _format_csv(batch) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [value.isoformat() if isinstance(value, datetime) else value for value in row]
+        for row in batch
+    )
+    return buffer.getvalue()
+
+
+def stream_indicators(
+        export_format: str,
+        type: Optional[str] = None,
+        zone_id: Optional[int] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+) -> Iterator[str]:
+    """
+    Génère l'export des indicateurs filtrés, morceau par morceau (un lot de lignes à la fois).
+    La session est propre au générateur ; sa connexion n'est tenue que le temps de lire chaque lot.
+    """
+    formatter = _format_csv if export_format == "csv" else _format_ndjson
+    if export_format == "csv":
+        yield _format_csv([crud.EXPORT_COLUMNS])
+
+    db = ReadSessionLocal()
+    try:
+        for batch in crud.iter_indicator_rows(
+                db, type=type, zone_id=zone_id, start_date=start_date, end_date=end_date,
+                batch_size=settings.EXPORT_BATCH_SIZE
+        ):
+            yield formatter(batch)
+    finally:
+        db.close()
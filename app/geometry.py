@@ -0,0 +1,83 @@
+import json
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+POLYGON_TYPES = ("Polygon", "MultiPolygon")
+
+
+def parse_geometry(geometry) -> Optional[dict]:
+    """Géométrie GeoJSON (texte ou dictionnaire) -> dictionnaire, None si absente ou invalide"""
+    if not geometry:
+        return None
+    if isinstance(geometry, dict):
+        return geometry
+    try:
+        geom = json.loads(geometry)
+    except (TypeError, ValueError):
+        return None
+    return geom if isinstance(geom, dict) else None
+
+
+def polygon_rings(geometry) -> List[List[np.ndarray]]:
+    """
+    Polygones d'une géométrie Polygon ou MultiPolygon : pour chacun, ses anneaux (extérieur puis
+    trous) en tableaux (n, 2) de (lon, lat). Liste vide pour les autres géométries.
+    """
+    geom = parse_geometry(geometry)
+    if geom is None or geom.get("type") not in POLYGON_TYPES:
+        return []
+    polygons = geom.get("coordinates") or []
+    if geom["type"] == "Polygon":
+        polygons = [polygons]
+    result = []
+    try:
+        for polygon in polygons:
+            rings = [np.asarray(ring, dtype=np.float64)[:, :2] for ring in polygon if len(ring) >= 3]
+            if rings:
+                result.append(rings)
+    except (TypeError, ValueError, IndexError):
+        return []
+    return result
+
+
+def ring_area_centroid(ring: np.ndarray) -> Tuple[float, float, float]:
+    """Aire (signée, en degrés²) et centroïde (lon, lat) d'un anneau, par la formule du lacet"""
+    # Calcul relatif au premier sommet : limite les erreurs d'arrondi
+    x0, y0 = ring[0]
+    x, y = ring[:, 0] - x0, ring[:, 1] - y0
+    x_next, y_next = np.roll(x, -1), np.roll(y, -1)
+    cross = x * y_next - x_next * y
+    area = cross.sum() / 2
+    if area == 0:
+        return 0.0, float(x.mean() + x0), float(y.mean() + y0)
+    centroid_x = ((x + x_next) * cross).sum() / (6 * area) + x0
+    centroid_y = ((y + y_next) * cross).sum() / (6 * area) + y0
+    return float(area), float(centroid_x), float(centroid_y)
+
+
+def representative_point(geometry) -> Optional[Tuple[float, float]]:
+    """
+    (lat, lon) représentatif d'une géométrie GeoJSON, None si elle n'en fournit pas : le point
+    lui-même pour un Point, le centroïde des anneaux extérieurs pour un (Multi)Polygon
+    """
+    geom = parse_geometry(geometry)
+    if geom is None:
+        return None
+    if geom.get("type") in POLYGON_TYPES:
+        parts = [ring_area_centroid(rings[0]) for rings in polygon_rings(geom)]
+        if not parts:
+            return None
+        total = sum(abs(area) for area, _, _ in parts)
+        if total == 0:
+            return parts[0][2], parts[0][1]
+        lon = sum(abs(area) * x for area, x, _ in parts) / total
+        lat = sum(abs(area) * y for area, _, y in parts) / total
+        return lat, lon
+    coords = geom.get("coordinates") or []
+    if geom.get("type", "Point") == "Point" and len(coords) >= 2:
+        try:
+            return float(coords[1]), float(coords[0])
+        except (TypeError, ValueError):
+            return None
+    return None
@@ -0,0 +1,148 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .core.config import settings
+
+# Clé de Session.info où sont notés les blobs insérés par la transaction en cours (empreinte -> id)
+PENDING_METADATA_KEY = "pending_metadata"
+# Nombre maximal de paramètres par requête IN (limite SQLite)
+LOOKUP_CHUNK_SIZE = 500
+
+
+def content_hash(content: str) -> str:
+    """Empreinte SHA-256 (hexadécimale) d'un blob additional_data"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class MetadataLRU:
+    """
+    Blobs vus récemment : empreinte -> id dans indicator_metadata. Ne contient que des
+    lignes commitées, pour ne jamais référencer un blob annulé par un rollback.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: str) -> Optional[int]:
+        with self._lock:
+            metadata_id = self._entries.get(digest)
+            if metadata_id is not None:
+                self._entries.move_to_end(digest)
+            return metadata_id
+
+    def update(self, entries: dict):
+        with self._lock:
+            for digest, metadata_id in entries.items():
+                self._entries[digest] = metadata_id
+                self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+metadata_lru = MetadataLRU(settings.METADATA_CACHE_MAX_ENTRIES)
+
+
+def _lookup(db: Session, digests: List[str]) -> dict:
+    found = {}
+    for offset in range(0, len(digests), LOOKUP_CHUNK_SIZE):
+        chunk = digests[offset:offset + LOOKUP_CHUNK_SIZE]
+        found.update(db.execute(
+            select(models.IndicatorMetadata.hash, models.IndicatorMetadata.id)
+            .where(models.IndicatorMetadata.hash.in_(chunk))
+        ).all())
+    return found
+
+
+def intern_many(db: Session, contents: Iterable[Optional[str]]) -> List[Optional[int]]:
+    """
+    Retourne l'id indicator_metadata de chaque blob (None pour un blob vide), en insérant
+    les blobs inconnus. Ordre de recherche : LRU, blobs de la transaction en cours, table.
+    Ne valide pas la transaction : l'appelant commit en même temps que les indicateurs.
+    """
+    contents = list(contents)
+    digests = [content_hash(content) if content is not None else None for content in contents]
+    pending = db.info.setdefault(PENDING_METADATA_KEY, {})
+
+    ids = {}
+    missing = {}
+    for digest, content in zip(digests, contents):
+        if digest is None or digest in ids or digest in missing:
+            continue
+        metadata_id = metadata_lru.get(digest) or pending.get(digest)
+        if metadata_id is not None:
+            ids[digest] = metadata_id
+        else:
+            missing[digest] = content
+
+    if missing:
+        # Blobs déjà commités : mémorisés tout de suite
+        committed = _lookup(db, list(missing))
+        metadata_lru.update(committed)
+        ids.update(committed)
+        new = {digest: content for digest, content in missing.items() if digest not in committed}
+        if new:
+            db.execute(
+                sqlite_insert(models.IndicatorMetadata).on_conflict_do_nothing(index_elements=["hash"]),
+                [{"hash": digest, "content": content} for digest, content in new.items()]
+            )
+            inserted = _lookup(db, list(new))
+            # Entrées du LRU seulement après le commit (voir _remember_after_commit)
+            pending.update(inserted)
+            ids.update(inserted)
+
+    return [ids[digest] if digest is not None else None for digest in digests]
+
+
+def intern(db: Session, content: Optional[str]) -> Optional[int]:
+    """Id indicator_metadata d'un blob (None pour un blob vide)"""
+    return intern_many(db, [content])[0]
+
+
+def intern_rows(db: Session, rows: List[dict]) -> List[dict]:
+    """Remplace la clé additional_data des dictionnaires de colonnes par metadata_id (insertions en lot)"""
+    metadata_ids = intern_many(db, (row.pop("additional_data", None) for row in rows))
+    for row, metadata_id in zip(rows, metadata_ids):
+        row["metadata_id"] = metadata_id
+    return rows
+
+
+@event.listens_for(Session, "before_flush")
+def _intern_new_indicators(session, flush_context, instances):
+    # additional_data est calculé en lecture (column_property) : les Indicator ajoutés à la
+    # session avec un blob reçoivent ici le metadata_id correspondant, avant l'INSERT
+    indicators = [
+        obj for obj in session.new
+        if isinstance(obj, models.Indicator) and obj.metadata_id is None
+        and obj.__dict__.get("additional_data") is not None
+    ]
+    if not indicators:
+        return
+    with session.no_autoflush:
+        metadata_ids = intern_many(session, (obj.__dict__["additional_data"] for obj in indicators))
+    for obj, metadata_id in zip(indicators, metadata_ids):
+        obj.metadata_id = metadata_id
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_after_commit(session):
+    pending = session.info.pop(PENDING_METADATA_KEY, None)
+    if pending:
+        metadata_lru.update(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(PENDING_METADATA_KEY, None)
@@ -1,5 +1,8 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 import os
 import sys
@@ -8,9 +11,11 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import models
-from app.database import engine
+from app.database import async_read_engine, run_migrations
 from app.core.config import settings
-from app.auth import get_db
+from app.metrics import CONTENT_TYPE, MetricsMiddleware, metrics
+from app.slow_queries import RouteContextMiddleware
+from app.auth import get_read_db, shutdown_hashing_pool
 
 # Importer les routeurs
 from app.routes import (
@@ -20,20 +25,36 @@ from app.routes import (
     sources_router,
     stats_router,
     admin_router,
-    upload_router
+    upload_router,
+    jobs_router
 )
+from app.scheduler import ingestion_scheduler
 
-# Créer les tables
+# Mettre le schéma à jour (migrations Alembic)
 try:
-    models.Base.metadata.create_all(bind=engine)
-    print("✅ Tables de base de données créées avec succès")
+    run_migrations()
+    print("✅ Schéma de base de données à jour")
 except Exception as e:
-    print(f"❌ Erreur création tables: {e}")
+    print(f"❌ Erreur migration base de données: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Ingestion planifiée en arrière-plan (jobs en attente repris au démarrage)
+    if settings.INGESTION_SCHEDULER_ENABLED:
+        ingestion_scheduler.start()
+    yield
+    ingestion_scheduler.stop()
+    # Arrêt du pool de processus bcrypt
+    shutdown_hashing_pool()
+    # Fermeture des connexions aiosqlite (leurs threads empêcheraient l'arrêt du processus)
+    await async_read_engine.dispose()
+
 
 app = FastAPI(
     title="EcoTrack API",
     description="API de suivi des indicateurs environnementaux",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS
@@ -43,8 +64,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Métriques par route (latence, requêtes en cours, requêtes SQL), exposées sur /metrics
+# (requêtes SQL comptées par les écouteurs branchés dans app.database)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Route appelante des requêtes SQL lentes (/admin/debug/slow-queries)
+if settings.SLOW_QUERY_THRESHOLD_MS > 0:
+    app.add_middleware(RouteContextMiddleware)
+
 # Inclure tous les routeurs
 app.include_router(auth_router)
 app.include_router(indicators_router)
@@ -53,6 +84,7 @@ app.include_router(sources_router)
 app.include_router(stats_router)
 app.include_router(admin_router)
 app.include_router(upload_router)
+app.include_router(jobs_router)
 
 # Routes de base
 @app.get("/")
@@ -63,8 +95,13 @@ def read_root():
 def health_check():
     return {"status": "healthy", "database": "SQLite"}
 
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """Métriques au format texte Prometheus"""
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
 @app.get("/test-db")
-def test_db(db: Session = Depends(get_db)):
+def test_db(db: Session = Depends(get_read_db)):
     """Route de test pour la base de données"""
     try:
         user_count = db.query(models.User).count()
@@ -0,0 +1,283 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+# Bornes des histogrammes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+ROW_COUNT_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+# Chemins déjà rattachés à leur route, vidé au-delà (les chemins avec identifiants sont illimités)
+ROUTE_CACHE_SIZE = 10_000
+# Libellé des requêtes qui ne correspondent à aucune route (évite un libellé par chemin inconnu)
+UNMATCHED_ROUTE = "unmatched"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RequestStats:
+    """Requêtes SQL, temps base de données et lignes lues pendant une requête HTTP"""
+
+    __slots__ = ("queries", "db_seconds", "rows")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+
+
+# Mesures de la requête HTTP en cours, propagées aux threads des routes sync et aux greenlets async
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    """Histogramme cumulatif au format Prometheus, une série par combinaison de libellés"""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        # libellés -> [compteurs par borne (+Inf en dernier), somme]
+        self.series = {}
+
+    def observe(self, labels: Tuple, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_bound(bound: float) -> str:
+    return str(int(bound)) if float(bound).is_integer() else repr(float(bound))
+
+
+class MetricsRegistry:
+    """
+    Métriques de l'application : latence, requêtes en cours et base de données par route,
+    ingestions et appels HTTP par fournisseur. Une mise à jour = quelques opérations sous verrou.
+    """
+
+    REQUEST_LABELS = ("method", "route")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = Histogram(
+            "ecotrack_http_request_duration_seconds", "Durée des requêtes HTTP par route", LATENCY_BUCKETS
+        )
+        self.db_queries = Histogram(
+            "ecotrack_http_request_db_queries", "Requêtes SQL exécutées par requête HTTP", QUERY_COUNT_BUCKETS
+        )
+        self.db_seconds = Histogram(
+            "ecotrack_http_request_db_seconds", "Temps passé en base de données par requête HTTP", LATENCY_BUCKETS
+        )
+        self.db_rows = Histogram(
+            "ecotrack_http_request_db_rows", "Lignes lues en base de données par requête HTTP", ROW_COUNT_BUCKETS
+        )
+        self.requests = defaultdict(int)
+        self.in_flight = defaultdict(int)
+        self.ingestion_runs = defaultdict(int)
+        self.ingestion_rows = defaultdict(int)
+        self.ingestion_seconds = defaultdict(float)
+        self.provider_requests = defaultdict(int)
+
+    # Requêtes HTTP
+    def request_started(self, labels: Tuple):
+        with self._lock:
+            self.in_flight[labels] += 1
+
+    def request_finished(self, started_labels: Tuple, labels: Tuple, status: int, duration: float,
+                         stats: RequestStats):
+        with self._lock:
+            self.in_flight[started_labels] -= 1
+            self.requests[labels + (str(status),)] += 1
+            self.latency.observe(labels, duration)
+            self.db_queries.observe(labels, stats.queries)
+            self.db_seconds.observe(labels, stats.db_seconds)
+            self.db_rows.observe(labels, stats.rows)
+
+    # Ingestion
+    def ingestion_finished(self, provider: str, status: str, rows: int, duration: float):
+        with self._lock:
+            self.ingestion_runs[(provider, status)] += 1
+            self.ingestion_rows[(provider,)] += rows
+            self.ingestion_seconds[(provider,)] += duration
+
+    def provider_request(self, provider: str, status: int):
+        with self._lock:
+            self.provider_requests[(provider, str(status))] += 1
+
+    # Exposition
+    def render(self) -> str:
+        """Toutes les métriques au format texte Prometheus (version 0.0.4)"""
+        with self._lock:
+            lines = []
+            self._render_values(lines, "counter", "ecotrack_http_requests_total", "Requêtes HTTP par route et statut",
+                                 self.REQUEST_LABELS + ("status",), self.requests)
+            self._render_values(lines, "gauge", "ecotrack_http_requests_in_flight", "Requêtes HTTP en cours par route",
+                               self.REQUEST_LABELS, self.in_flight)
+            for histogram in (self.latency, self.db_queries, self.db_seconds, self.db_rows):
+                self._render_histogram(lines, histogram)
+            self._render_values(lines, "counter", "ecotrack_ingestion_runs_total", "Ingestions par fournisseur et issue",
+                                 ("provider", "status"), self.ingestion_runs)
+            self._render_values(lines, "counter", "ecotrack_ingestion_rows_total", "Indicateurs créés par fournisseur",
+                                 ("provider",), self.ingestion_rows)
+            self._render_values(lines, "counter", "ecotrack_ingestion_duration_seconds_total",
+                                 "Durée cumulée des ingestions par fournisseur", ("provider",), self.ingestion_seconds)
+            self._render_values(lines, "counter", "ecotrack_provider_requests_total",
+                                 "Réponses des fournisseurs externes par statut HTTP", ("provider", "status"),
+                                 self.provider_requests)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_values(lines, kind, name, help_text, label_names, values: Dict[Tuple, float]):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(values.items()):
+            lines.append(f"{name}{_format_labels(label_names, labels)} {value}")
+
+    def _render_histogram(self, lines, histogram: Histogram):
+        lines.append(f"# HELP {histogram.name} {histogram.help}")
+        lines.append(f"# TYPE {histogram.name} histogram")
+        for labels, (counts, total) in sorted(histogram.series.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_bound(bound)
+                bucket_labels = _format_labels(self.REQUEST_LABELS, labels, f'le="{le}"')
+                lines.append(f"{histogram.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{histogram.name}_sum{_format_labels(self.REQUEST_LABELS, labels)} {total}")
+            lines.append(f"{histogram.name}_count{_format_labels(self.REQUEST_LABELS, labels)} {cumulative}")
+
+
+metrics = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI : rattache chaque requête HTTP au gabarit de sa route (/zones/{zone_id})
+    et enregistre sa durée, son statut et les requêtes SQL exécutées pendant son traitement
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = {}
+
+    def _route(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        template = self._routes.get(key)
+        if template is None:
+            template = UNMATCHED_ROUTE
+            for route in scope["app"].router.routes:
+                match, child_scope = route.matches(scope)
+                if match is Match.NONE:
+                    continue
+                # Route d'un routeur inclus : désignée par child_scope["route"] selon la version
+                matched = child_scope.get("route", route)
+                path = getattr(matched, "path_format", None) or getattr(matched, "path", UNMATCHED_ROUTE)
+                if match is Match.FULL:
+                    template = path
+                    break
+                if template == UNMATCHED_ROUTE:
+                    # Méthode non autorisée : la route est connue
+                    template = path
+            if len(self._routes) >= ROUTE_CACHE_SIZE:
+                self._routes.clear()
+            self._routes[key] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_labels = (scope["method"], self._route(scope))
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics.request_started(started_labels)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Route retenue par le routeur (routeurs inclus imbriqués selon la version de FastAPI)
+            route = scope.get("route")
+            template = getattr(route, "path_format", None) or getattr(route, "path", None)
+            labels = (scope["method"], template) if template else started_labels
+            metrics.request_finished(started_labels, labels, status, time.perf_counter() - started, stats)
+            _request_stats.reset(token)
+
+
+class _CountingCursor:
+    """Curseur DBAPI qui compte les lignes lues par SQLAlchemy pour la requête HTTP en cours"""
+
+    __slots__ = ("_cursor", "_stats")
+
+    def __init__(self, cursor, stats: RequestStats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _request_stats.get() is not None:
+        conn.info["metrics_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats.get()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_seconds += time.perf_counter() - conn.info.pop("metrics_started", time.perf_counter())
+    # Les lignes sont lues après l'exécution, via le curseur du contexte
+    if context is not None and cursor.description is not None:
+        context.cursor = _CountingCursor(cursor, stats)
+
+
+def instrument_engines(*engines):
+    """Branche le comptage des requêtes SQL sur les moteurs (synchrones ; .sync_engine pour un moteur async)"""
+    for engine in {id(engine): engine for engine in engines}.values():
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
@@ -1,9 +1,10 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, Index, event, select
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property, relationship
 from datetime import datetime
 
 from .database import Base
+from .geometry import representative_point
 
 
 class User(Base):
@@ -26,10 +27,21 @@ class Zone(Base):
     name = Column(String, index=True)
     postal_code = Column(String)
     geometry = Column(Text)
+    # Coordonnées extraites de geometry à l'écriture (index spatial, ingestion)
+    lat = Column(Float)
+    lon = Column(Float)
 
     indicators = relationship("Indicator", back_populates="zone")
 
 
+@event.listens_for(Zone, "before_insert")
+@event.listens_for(Zone, "before_update")
+def _materialize_zone_coordinates(mapper, connection, zone):
+    # Sans géométrie, des coordonnées fournies directement sont conservées
+    if zone.geometry:
+        zone.lat, zone.lon = representative_point(zone.geometry) or (None, None)
+
+
 class Source(Base):
     __tablename__ = "sources"
 
@@ -41,15 +53,46 @@ class Source(Base):
     indicators = relationship("Indicator", back_populates="source")
 
 
+class IndicatorMetadata(Base):
+    """Blobs additional_data dédupliqués, adressés par leur empreinte SHA-256 (voir app/indicator_metadata.py)"""
+    __tablename__ = "indicator_metadata"
+    __table_args__ = (
+        Index("ix_indicator_metadata_hash", "hash", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    hash = Column(String(64), nullable=False)
+    content = Column(Text, nullable=False)
+
+
 class Indicator(Base):
     __tablename__ = "indicators"
+    # Index composites créés par les migrations 0002 et 0004, AUTOINCREMENT par la 0005,
+    # clé naturelle unique par la 0007 (voir migrations/versions)
+    __table_args__ = (
+        Index("uq_indicators_natural_key", "zone_id", "source_id", "type", "timestamp", unique=True),
+        Index("ix_indicators_type_zone_ts", "type", "zone_id", "timestamp"),
+        Index("ix_indicators_type_ts", "type", "timestamp", "id"),
+        Index("ix_indicators_zone_ts", "zone_id", "timestamp", "id"),
+        Index("ix_indicators_zone_source_ts", "zone_id", "source_id", "timestamp"),
+        Index("ix_indicators_timestamp", "timestamp"),
+        # Id jamais réutilisés : les lignes archivées (app/archive.py) sont supprimées de la table
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    type = Column(String, index=True)
+    type = Column(String)
     value = Column(Float)
     unit = Column(String)
     timestamp = Column(DateTime, default=datetime.utcnow)
-    additional_data = Column(Text)
+    metadata_id = Column(Integer, ForeignKey("indicator_metadata.id"))
+    # Blob lu dans indicator_metadata ; à l'écriture, il est converti en metadata_id avant le flush
+    additional_data = column_property(
+        select(IndicatorMetadata.content)
+        .where(IndicatorMetadata.id == metadata_id)
+        .correlate_except(IndicatorMetadata)
+        .scalar_subquery()
+    )
 
     zone_id = Column(Integer, ForeignKey("zones.id"))
     source_id = Column(Integer, ForeignKey("sources.id"))
@@ -57,4 +100,65 @@ class Indicator(Base):
 
     zone = relationship("Zone", back_populates="indicators")
     source = relationship("Source", back_populates="indicators")
-    owner = relationship("User", back_populates="indicators")
\ No newline at end of file
+    owner = relationship("User", back_populates="indicators")
+
+
+class IndicatorRollupHourly(Base):
+    """Agrégats incrémentaux des indicateurs par (type, zone, heure)"""
+    __tablename__ = "indicator_rollups_hourly"
+
+    type = Column(String, primary_key=True)
+    zone_id = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False)
+    sum = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+    sum_sq = Column(Float, nullable=False)
+    first_timestamp = Column(DateTime, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+
+
+class IndicatorRollupDaily(Base):
+    """Agrégats incrémentaux des indicateurs par (type, zone, jour)"""
+    __tablename__ = "indicator_rollups_daily"
+
+    type = Column(String, primary_key=True)
+    zone_id = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    count = Column(Integer, nullable=False)
+    sum = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+    sum_sq = Column(Float, nullable=False)
+    first_timestamp = Column(DateTime, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+
+
+class IngestionWatermark(Base):
+    """Dernier horodatage ingéré par fournisseur et par zone (reprise des ingestions incrémentales)"""
+    __tablename__ = "ingestion_watermarks"
+
+    provider = Column(String, primary_key=True)
+    zone_id = Column(Integer, primary_key=True)
+    last_timestamp = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class IngestionJob(Base):
+    """Exécution d'ingestion (planifiée ou demandée via l'API) et son avancement (voir app/scheduler.py)"""
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(Integer, primary_key=True)
+    trigger = Column(String, nullable=False)
+    # Fournisseurs séparés par des virgules (openmeteo, waqi, datagouv)
+    providers = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    providers_done = Column(Integer, nullable=False, default=0)
+    # Créations par fournisseur, en JSON
+    counts = Column(Text)
+    error = Column(Text)
+    requested_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
\ No newline at end of file
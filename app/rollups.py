@@ -0,0 +1,307 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import archive, models
+from .cache import mark_series_written, stats_cache
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+# Format de stockage des DateTime SQLAlchemy sous SQLite (tronqué à l'heure / au jour)
+_BUCKET_FORMATS = {
+    "indicator_rollups_hourly": "%Y-%m-%d %H:00:00.000000",
+    "indicator_rollups_daily": "%Y-%m-%d 00:00:00.000000",
+}
+
+
+class Aggregate:
+    """Agrégat fusionnable : nombre, somme, min, max, somme des carrés et bornes temporelles"""
+
+    __slots__ = ("count", "sum", "min", "max", "sum_sq", "first_timestamp", "last_timestamp")
+
+    def __init__(self, count=0, sum=0.0, min=None, max=None, sum_sq=0.0,
+                 first_timestamp=None, last_timestamp=None):
+        self.count = count or 0
+        self.sum = sum or 0.0
+        self.min = min
+        self.max = max
+        self.sum_sq = sum_sq or 0.0
+        self.first_timestamp = first_timestamp
+        self.last_timestamp = last_timestamp
+
+    def add(self, value: float, timestamp: datetime):
+        self.merge(Aggregate(1, value, value, value, value * value, timestamp, timestamp))
+
+    def merge(self, other: "Aggregate"):
+        if not other.count:
+            return self
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        if self.first_timestamp is None or other.first_timestamp < self.first_timestamp:
+            self.first_timestamp = other.first_timestamp
+        if self.last_timestamp is None or other.last_timestamp > self.last_timestamp:
+            self.last_timestamp = other.last_timestamp
+        return self
+
+    @property
+    def average(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    @property
+    def stddev(self) -> Optional[float]:
+        """Écart-type de population calculé à partir de la somme des carrés"""
+        if not self.count:
+            return None
+        variance = self.sum_sq / self.count - (self.sum / self.count) ** 2
+        return math.sqrt(max(variance, 0.0))
+
+
+def floor_hour(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ceil(ts: datetime, floor, step) -> datetime:
+    floored = floor(ts)
+    return floored if floored == ts else floored + step
+
+
+def _field(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
+
+
+# Écriture incrémentale
+def record_indicators(db: Session, rows: Iterable):
+    """
+    Met à jour les tables d'agrégats avec des indicateurs nouvellement écrits.
+    Accepte des objets Indicator ou des dictionnaires de colonnes ; le lot est agrégé
+    en mémoire puis fusionné par upsert. Ne valide pas la transaction : l'appelant
+    commit en même temps que les indicateurs.
+    """
+    hourly = defaultdict(Aggregate)
+    daily = defaultdict(Aggregate)
+    for row in rows:
+        zone_id = _field(row, "zone_id")
+        value = _field(row, "value")
+        timestamp = _field(row, "timestamp")
+        if zone_id is None or value is None or timestamp is None:
+            continue
+        indicator_type = _field(row, "type")
+        hourly[(indicator_type, zone_id, floor_hour(timestamp))].add(value, timestamp)
+        daily[(indicator_type, zone_id, floor_day(timestamp))].add(value, timestamp)
+
+    _upsert(db, models.IndicatorRollupHourly, hourly)
+    _upsert(db, models.IndicatorRollupDaily, daily)
+    # Les résultats /stats en cache pour ces séries sont invalidés au commit
+    mark_series_written(db, {(indicator_type, zone_id) for indicator_type, zone_id, _ in daily})
+
+
+def record_inserted(db: Session, after_id: int, series: Iterable[Tuple[str, int]]):
+    """
+    Met à jour les tables d'agrégats avec les indicateurs d'id supérieur à after_id, insérés par
+    la transaction en cours : agrégation par seau en SQL (INSERT ... SELECT ... GROUP BY sur la
+    plage de clés primaires) fusionnée par upsert, sans objet Python par ligne. NOT INDEXED :
+    SQLite préférerait sinon parcourir ix_indicators_type_zone_ts en entier pour éviter le tri.
+    Ne valide pas la transaction : l'appelant commit en même temps que les indicateurs.
+    """
+    for table, bucket_format in _BUCKET_FORMATS.items():
+        db.execute(text(f"""
+            INSERT INTO {table}
+                (type, zone_id, bucket_start, count, sum, min, max, sum_sq, first_timestamp, last_timestamp)
+            SELECT type, zone_id, strftime('{bucket_format}', timestamp),
+                   COUNT(*), SUM(value), MIN(value), MAX(value), SUM(value * value),
+                   MIN(timestamp), MAX(timestamp)
+            FROM indicators NOT INDEXED
+            WHERE id > :after_id AND zone_id IS NOT NULL AND value IS NOT NULL AND timestamp IS NOT NULL
+            GROUP BY type, zone_id, strftime('{bucket_format}', timestamp)
+            ON CONFLICT (type, zone_id, bucket_start) DO UPDATE SET
+                count = {table}.count + excluded.count,
+                sum = {table}.sum + excluded.sum,
+                min = min({table}.min, excluded.min),
+                max = max({table}.max, excluded.max),
+                sum_sq = {table}.sum_sq + excluded.sum_sq,
+                first_timestamp = min({table}.first_timestamp, excluded.first_timestamp),
+                last_timestamp = max({table}.last_timestamp, excluded.last_timestamp)
+        """), {"after_id": after_id})
+    # Les résultats /stats en cache pour ces séries sont invalidés au commit
+    mark_series_written(db, {(indicator_type, zone_id) for indicator_type, zone_id in series if zone_id is not None})
+
+
+def _upsert(db: Session, model, buckets: Dict[Tuple, Aggregate]):
+    if not buckets:
+        return
+    stmt = sqlite_insert(model)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[model.type, model.zone_id, model.bucket_start],
+        set_={
+            "count": model.count + excluded.count,
+            "sum": model.sum + excluded.sum,
+            "min": func.min(model.min, excluded.min),
+            "max": func.max(model.max, excluded.max),
+            "sum_sq": model.sum_sq + excluded.sum_sq,
+            "first_timestamp": func.min(model.first_timestamp, excluded.first_timestamp),
+            "last_timestamp": func.max(model.last_timestamp, excluded.last_timestamp),
+        },
+    )
+    db.execute(stmt, [
+        {
+            "type": indicator_type, "zone_id": zone_id, "bucket_start": bucket_start,
+            "count": agg.count, "sum": agg.sum, "min": agg.min, "max": agg.max, "sum_sq": agg.sum_sq,
+            "first_timestamp": agg.first_timestamp, "last_timestamp": agg.last_timestamp,
+        }
+        for (indicator_type, zone_id, bucket_start), agg in buckets.items()
+    ])
+
+
+# Lecture
+def _plan_ranges(start: Optional[datetime], end: Optional[datetime]):
+    """
+    Découpe [start, end] en morceaux lus dans la table la plus grossière possible :
+    jours complets -> agrégats journaliers, heures complètes -> agrégats horaires,
+    heures partielles aux bords -> lignes brutes.
+    Les bornes None sont ouvertes ; end est inclusive pour les lignes brutes.
+    """
+    raw, hourly, daily = [], [], []
+
+    h0 = _ceil(start, floor_hour, HOUR) if start else None
+    h1 = floor_hour(end) if end else None
+    if h0 and h1 and h0 >= h1:
+        raw.append((start, end, True))
+        return raw, hourly, daily
+
+    if start and start < h0:
+        raw.append((start, h0, False))
+    if end:
+        raw.append((h1, end, True))
+
+    d0 = _ceil(h0, floor_day, DAY) if h0 else None
+    d1 = floor_day(h1) if h1 else None
+    if d0 and d1 and d0 >= d1:
+        hourly.append((h0, h1))
+        return raw, hourly, daily
+
+    if h0 and h0 < d0:
+        hourly.append((h0, d0))
+    daily.append((d0, d1))
+    if h1 and d1 < h1:
+        hourly.append((d1, h1))
+    return raw, hourly, daily
+
+
+def _range_clause(column, lower, upper, upper_inclusive=False):
+    clauses = []
+    if lower is not None:
+        clauses.append(column >= lower)
+    if upper is not None:
+        clauses.append(column <= upper if upper_inclusive else column < upper)
+    return and_(*clauses) if clauses else None
+
+
+def _collect(result, totals):
+    for row in result:
+        totals[(row.zone_id, row.type)].merge(Aggregate(
+            row.count, row.sum, row.min, row.max, row.sum_sq, row.first_timestamp, row.last_timestamp
+        ))
+
+
+def aggregate(
+        db: Session,
+        types: Optional[List[str]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        zone_ids: Optional[List[int]] = None
+) -> Dict[Tuple[int, str], Aggregate]:
+    """
+    Agrège les indicateurs des types demandés (tous si None) sur [start, end] par (zone_id, type),
+    en lisant les agrégats horaires/journaliers et uniquement les lignes brutes
+    (table ou archive) des heures partielles aux bords de la période.
+    """
+    totals = defaultdict(Aggregate)
+    raw_ranges, hourly_ranges, daily_ranges = _plan_ranges(start, end)
+
+    indicator = models.Indicator
+    for lower, upper, upper_inclusive in raw_ranges:
+        query = db.query(
+            indicator.zone_id, indicator.type,
+            func.count(indicator.value).label("count"),
+            func.sum(indicator.value).label("sum"),
+            func.min(indicator.value).label("min"),
+            func.max(indicator.value).label("max"),
+            func.sum(indicator.value * indicator.value).label("sum_sq"),
+            func.min(indicator.timestamp).label("first_timestamp"),
+            func.max(indicator.timestamp).label("last_timestamp"),
+        ).filter(
+            indicator.zone_id.isnot(None),
+            indicator.value.isnot(None),
+            _range_clause(indicator.timestamp, lower, upper, upper_inclusive),
+        )
+        if types:
+            query = query.filter(indicator.type.in_(types))
+        if zone_ids:
+            query = query.filter(indicator.zone_id.in_(zone_ids))
+        _collect(query.group_by(indicator.zone_id, indicator.type), totals)
+        # Mêmes bords lus dans les mois archivés (seulement les séries demandées)
+        for key, part in archive.aggregate(types, zone_ids, lower, upper, upper_inclusive).items():
+            totals[key].merge(Aggregate(*part))
+
+    for model, ranges in ((models.IndicatorRollupHourly, hourly_ranges), (models.IndicatorRollupDaily, daily_ranges)):
+        if not ranges:
+            continue
+        range_clauses = [_range_clause(model.bucket_start, lower, upper) for lower, upper in ranges]
+        query = db.query(
+            model.zone_id, model.type,
+            func.sum(model.count).label("count"),
+            func.sum(model.sum).label("sum"),
+            func.min(model.min).label("min"),
+            func.max(model.max).label("max"),
+            func.sum(model.sum_sq).label("sum_sq"),
+            func.min(model.first_timestamp).label("first_timestamp"),
+            func.max(model.last_timestamp).label("last_timestamp"),
+        )
+        if types:
+            query = query.filter(model.type.in_(types))
+        range_clauses = [clause for clause in range_clauses if clause is not None]
+        if range_clauses:
+            query = query.filter(or_(*range_clauses))
+        if zone_ids:
+            query = query.filter(model.zone_id.in_(zone_ids))
+        _collect(query.group_by(model.zone_id, model.type), totals)
+
+    return {key: agg for key, agg in totals.items() if agg.count}
+
+
+# Reconstruction complète (backfill)
+def rebuild(db: Session):
+    """Recalcule entièrement les tables d'agrégats depuis la table indicators et l'archive"""
+    for table, bucket_format in _BUCKET_FORMATS.items():
+        db.execute(text(f"DELETE FROM {table}"))
+        db.execute(text(f"""
+            INSERT INTO {table}
+                (type, zone_id, bucket_start, count, sum, min, max, sum_sq, first_timestamp, last_timestamp)
+            SELECT type, zone_id, strftime('{bucket_format}', timestamp),
+                   COUNT(*), SUM(value), MIN(value), MAX(value), SUM(value * value),
+                   MIN(timestamp), MAX(timestamp)
+            FROM indicators
+            WHERE zone_id IS NOT NULL AND value IS NOT NULL AND timestamp IS NOT NULL
+            GROUP BY type, zone_id, strftime('{bucket_format}', timestamp)
+        """))
+    for model, step in ((models.IndicatorRollupHourly, HOUR), (models.IndicatorRollupDaily, DAY)):
+        buckets = {}
+        for indicator_type, zone_id, bucket_start, *values in archive.bucket_aggregates(step):
+            buckets[(indicator_type, zone_id, bucket_start)] = Aggregate(*values)
+        _upsert(db, model, buckets)
+    db.commit()
+    stats_cache.clear()
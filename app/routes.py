@@ -1,18 +1,35 @@
 # routes.py
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
-import csv
-import io
 import sys
 import os
 
 # Ajouter le chemin pour pouvoir importer data_ingestion
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import models, schemas, crud
-from app.auth import get_current_active_user, get_current_admin_user, get_db, authenticate_user, create_access_token
+from app import models, schemas, crud, async_crud
+from app.cache import stats_cache
+from app.export import stream_indicators, EXPORT_FORMATS
+from app.downsampling import DOWNSAMPLING_METHODS
+from app.csv_import import import_indicators_csv, CSVFormatError
+from app.slow_queries import slow_query_log
+from app.scheduler import PROVIDERS, describe_job, ingestion_scheduler
+from app.spatial import zone_index
+from app.auth import (
+    get_current_active_user,
+    get_current_admin_user,
+    get_db,
+    get_read_db,
+    get_async_read_db,
+    authenticate_user_async,
+    get_password_hash_async,
+    create_access_token
+)
 
 # Création des routeurs
 auth_router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -22,20 +39,25 @@ sources_router = APIRouter(prefix="/sources", tags=["Sources"])
 stats_router = APIRouter(prefix="/stats", tags=["Statistics"])
 admin_router = APIRouter(prefix="/admin", tags=["Admin"])
 upload_router = APIRouter(prefix="/upload", tags=["Upload"])
+jobs_router = APIRouter(prefix="/jobs", tags=["Jobs"])
 
 
 # Routes d'authentification
 @auth_router.post("/register", response_model=schemas.User)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(crud.get_user_by_email, db, email=user.email)
+    # Fin de la lecture : la connexion d'écriture unique est rendue pendant le hachage
+    await run_in_threadpool(db.rollback)
     if db_user:
         raise HTTPException(status_code=400, detail="Email déjà enregistré")
-    return crud.create_user(db=db, user=user)
+    # bcrypt hors du thread de requête, dans le pool de hachage ; l'insertion ouvre une nouvelle transaction
+    hashed_password = await get_password_hash_async(user.password)
+    return await run_in_threadpool(crud.create_user, db=db, user=user, hashed_password=hashed_password)
 
 
 @auth_router.post("/login")
-def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
-    db_user = authenticate_user(db, user.email, user.password)
+async def login(user: schemas.UserLogin, db: Session = Depends(get_read_db)):
+    db_user = await authenticate_user_async(db, user.email, user.password)
     if not db_user:
         raise HTTPException(status_code=400, detail="Email ou mot de passe incorrect")
     return create_access_token(data={"sub": db_user.email})
@@ -43,18 +65,29 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
 
 # Routes pour les indicateurs
 @indicators_router.get("/", response_model=List[schemas.Indicator])
-def read_indicators(
+async def read_indicators(
+        response: Response,
         type: Optional[str] = None,
         zone_id: Optional[int] = None,
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
         limit: int = 25,
-        db: Session = Depends(get_db),
+        cursor: Optional[str] = None,
+        db: AsyncSession = Depends(get_async_read_db),
         current_user: models.User = Depends(get_current_active_user)
 ):
-    """Récupère les indicateurs avec filtres optionnels"""
+    """
+    Récupère les indicateurs avec filtres optionnels.
+    Si la page est pleine, l'en-tête X-Next-Cursor contient le curseur de la page suivante,
+    à renvoyer tel quel dans le paramètre cursor.
+    """
     print(f"🔍 Filtres reçus - type: {type}, zone: {zone_id}, start: {start_date}, end: {end_date}, limit: {limit}")
 
+    try:
+        position = crud.decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     start_dt = None
     end_dt = None
 
@@ -69,109 +102,247 @@ def read_indicators(
 
     filter_type = type if type and type.strip() != "" else None
 
-    indicators = crud.get_indicators(
+    indicators = await async_crud.get_indicators(
         db,
         type=filter_type,
         zone_id=zone_id,
         start_date=start_dt,
         end_date=end_dt,
-        limit=limit
+        limit=limit,
+        cursor=position
     )
 
+    if indicators and len(indicators) == limit:
+        last = indicators[-1]
+        response.headers["X-Next-Cursor"] = crud.encode_cursor(last.timestamp, last.id)
+
     print(f"✅ {len(indicators)} indicateurs trouvés")
     return indicators
 
 
-@indicators_router.post("/", response_model=schemas.Indicator)
-def create_indicator(
-        indicator: schemas.IndicatorCreate,
-        db: Session = Depends(get_db),
+@indicators_router.get("/export")
+def export_indicators(
+        format: str = "ndjson",
+        type: Optional[str] = None,
+        zone_id: Optional[int] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
         current_user: models.User = Depends(get_current_active_user)
 ):
-    return crud.create_indicator(db=db, indicator=indicator, user_id=current_user.id)
+    """Export en flux (NDJSON ou CSV) des indicateurs, avec les mêmes filtres que /indicators/"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format d'export inconnu: {format} (ndjson ou csv)")
 
+    try:
+        start_dt = datetime.fromisoformat(start_date) if start_date else None
+        end_dt = datetime.fromisoformat(end_date) if end_date else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Format de date invalide: {e}")
 
-# NOUVELLE ROUTE : Ingestion des données externes
-@indicators_router.post("/ingest/external-data")
-def ingest_external_data(
-        db: Session = Depends(get_db),
+    filter_type = type if type and type.strip() != "" else None
+    return StreamingResponse(
+        stream_indicators(format, type=filter_type, zone_id=zone_id, start_date=start_dt, end_date=end_dt),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="indicators.{format}"'}
+    )
+
+
+@indicators_router.get("/series", response_model=List[schemas.IndicatorSeries])
+def read_indicator_series(
+        type: str,
+        zone_ids: Optional[List[int]] = Query(None),
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        points: int = Query(500, ge=3, le=5000),
+        method: str = "lttb",
+        db: Session = Depends(get_read_db),
         current_user: models.User = Depends(get_current_active_user)
 ):
-    """Lance l'ingestion de données depuis les APIs externes"""
+    """
+    Série temporelle réduite par zone pour les graphiques (au plus `points` points par zone).
+    method : lttb (forme de la courbe) ou minmax (pics conservés). count = nombre de mesures brutes.
+    """
+    if method not in DOWNSAMPLING_METHODS:
+        raise HTTPException(status_code=400, detail=f"Méthode inconnue: {method} (lttb ou minmax)")
+
     try:
-        print("🚀 Lancement de l'ingestion de données externes...")
+        start_dt = datetime.fromisoformat(start_date) if start_date else None
+        end_dt = datetime.fromisoformat(end_date) if end_date else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Format de date invalide: {e}")
 
-        # Importer et exécuter les fonctions d'ingestion
-        from data_ingestion import ingest_weather_data, ingest_air_quality_data, ingest_energy_data
+    return crud.get_indicator_series(
+        db,
+        type=type,
+        zone_ids=sorted(set(zone_ids)) if zone_ids else None,
+        start_date=start_dt,
+        end_date=end_dt,
+        points=points,
+        method=method
+    )
 
-        # Exécuter l'ingestion
-        weather_count = ingest_weather_data()
-        air_quality_count = ingest_air_quality_data()
-        energy_count = ingest_energy_data()
 
-        total = weather_count + air_quality_count + energy_count
+@indicators_router.post("/", response_model=schemas.Indicator)
+def create_indicator(
+        indicator: schemas.IndicatorCreate,
+        db: Session = Depends(get_db),
+        current_user: models.User = Depends(get_current_active_user)
+):
+    try:
+        return crud.create_indicator(db=db, indicator=indicator, user_id=current_user.id)
+    except crud.DuplicateIndicatorError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
-        return {
-            "success": True,
-            "message": f"Ingestion terminée - {total} nouvelles données ajoutées",
-            "details": {
-                "weather_data": weather_count,
-                "air_quality_data": air_quality_count,
-                "energy_data": energy_count,
-                "total": total
-            }
-        }
 
-    except Exception as e:
-        print(f"❌ Erreur lors de l'ingestion: {e}")
-        raise HTTPException(status_code=500, detail=f"Erreur lors de l'ingestion: {str(e)}")
+# NOUVELLE ROUTE : Ingestion des données externes
+@indicators_router.post("/ingest/external-data", status_code=202)
+def ingest_external_data(
+        providers: Optional[List[str]] = Query(None),
+        current_user: models.User = Depends(get_current_active_user)
+):
+    """Met en file d'attente une ingestion depuis les APIs externes et retourne aussitôt l'id du job"""
+    unknown = [provider for provider in providers or [] if provider not in PROVIDERS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Fournisseur inconnu: {', '.join(unknown)} ({', '.join(PROVIDERS)})"
+        )
+
+    job = ingestion_scheduler.enqueue(providers, requested_by=current_user.id)
+    print(f"🚀 Ingestion de données externes programmée (job {job.id})")
+    return {
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "message": f"Ingestion programmée (job {job.id})",
+        "status_url": f"/jobs/{job.id}"
+    }
+
+
+# Suivi des jobs d'ingestion
+@jobs_router.get("/{job_id}", response_model=schemas.IngestionJob)
+def read_job(
+        job_id: int,
+        db: Session = Depends(get_read_db),
+        current_user: models.User = Depends(get_current_active_user)
+):
+    """Avancement d'un job d'ingestion : statut, durée et créations par fournisseur"""
+    job = crud.get_ingestion_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job introuvable")
+    return describe_job(job)
 
 
 # Routes pour les zones
 @zones_router.get("/", response_model=List[schemas.Zone])
-def read_zones(
+async def read_zones(
         skip: int = 0,
         limit: int = 100,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_read_db),
+        current_user: models.User = Depends(get_current_active_user)
+):
+    return await async_crud.get_zones(db, skip=skip, limit=limit)
+
+
+@zones_router.get("/nearest", response_model=List[schemas.ZoneNearest])
+async def nearest_zones(
+        lat: float = Query(..., ge=-90, le=90),
+        lon: float = Query(..., ge=-180, le=180),
+        k: int = Query(5, ge=1, le=100),
+        db: AsyncSession = Depends(get_async_read_db),
         current_user: models.User = Depends(get_current_active_user)
 ):
-    return crud.get_zones(db, skip=skip, limit=limit)
+    """Les k zones géolocalisées les plus proches du point, avec leur distance en km"""
+    lookup = await zone_index.get_async(db)
+    return lookup.nearest(lat, lon, k)
 
 
 # Routes pour les sources
 @sources_router.get("/", response_model=List[schemas.Source])
-def read_sources(
+async def read_sources(
         skip: int = 0,
         limit: int = 100,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_read_db),
         current_user: models.User = Depends(get_current_active_user)
 ):
-    return crud.get_sources(db, skip=skip, limit=limit)
+    return await async_crud.get_sources(db, skip=skip, limit=limit)
 
 
 # Routes de statistiques
 @stats_router.get("/air/averages")
-def get_air_averages(
+async def get_air_averages(
         start_date: str,
         end_date: str,
         zone_id: Optional[int] = None,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_read_db),
         current_user: models.User = Depends(get_current_active_user)
 ):
     try:
         start_dt = datetime.fromisoformat(start_date)
         end_dt = datetime.fromisoformat(end_date)
-        return crud.get_air_quality_by_zone(db, start_dt, end_dt, zone_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Format de date invalide: {e}")
 
+    return await stats_cache.get_or_compute_async(
+        ("air_averages", start_dt, end_dt, zone_id),
+        lambda: async_crud.get_air_quality_by_zone(db, start_dt, end_dt, zone_id),
+        types=["air_quality_pm25"],
+        zone_ids=[zone_id] if zone_id else None
+    )
+
 
 @stats_router.get("/air/quality")
-def get_air_quality_stats(
-        db: Session = Depends(get_db),
+async def get_air_quality_stats(
+        db: AsyncSession = Depends(get_async_read_db),
         current_user: models.User = Depends(get_current_active_user)
 ):
-    return crud.get_air_quality_stats(db)
+    return await stats_cache.get_or_compute_async(
+        ("air_quality",),
+        lambda: async_crud.get_air_quality_stats(db),
+        types=["air_quality_pm25", "air_quality_pm10", "air_quality_no2"]
+    )
+
+
+@stats_router.get("/summary", response_model=List[schemas.SummaryStats])
+async def get_summary_stats(
+        types: Optional[List[str]] = Query(None),
+        zone_ids: Optional[List[int]] = Query(None),
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        by_zone: bool = False,
+        db: AsyncSession = Depends(get_async_read_db),
+        current_user: models.User = Depends(get_current_active_user)
+):
+    """Statistiques résumées pour n'importe quels types, zones et période"""
+    try:
+        start_dt = datetime.fromisoformat(start_date) if start_date else None
+        end_dt = datetime.fromisoformat(end_date) if end_date else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Format de date invalide: {e}")
+
+    types = sorted(set(types)) if types else None
+    zone_ids = sorted(set(zone_ids)) if zone_ids else None
+    return await stats_cache.get_or_compute_async(
+        ("summary", tuple(types or ()), tuple(zone_ids or ()), start_dt, end_dt, by_zone),
+        lambda: async_crud.get_summary_stats(
+            db,
+            types=types,
+            zone_ids=zone_ids,
+            start_date=start_dt,
+            end_date=end_dt,
+            by_zone=by_zone
+        ),
+        types=types,
+        zone_ids=zone_ids
+    )
+
+
+@stats_router.get("/cache")
+async def get_stats_cache_info(
+        current_user: models.User = Depends(get_current_admin_user)
+):
+    """Compteurs du cache des statistiques : hits, misses, taille (admin seulement)"""
+    return stats_cache.stats()
 
 
 # Routes ADMIN
@@ -179,7 +350,7 @@ def get_air_quality_stats(
 def get_all_users(
         skip: int = 0,
         limit: int = 100,
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         current_user: models.User = Depends(get_current_admin_user)
 ):
     """Récupère tous les utilisateurs (admin seulement)"""
@@ -191,7 +362,7 @@ def get_all_users(
 @admin_router.get("/users/{user_id}", response_model=schemas.User)
 def get_user(
         user_id: int,
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         current_user: models.User = Depends(get_current_admin_user)
 ):
     """Récupère un utilisateur par ID (admin seulement)"""
@@ -243,39 +414,46 @@ def get_current_user_info(
     return current_user
 
 
+@admin_router.get("/debug/slow-queries")
+async def get_slow_queries(
+        limit: int = Query(100, ge=1, le=1000, description="Entrées récentes renvoyées"),
+        current_user: models.User = Depends(get_current_admin_user)
+):
+    """
+    Requêtes SQL lentes (au-delà de SLOW_QUERY_THRESHOLD_MS) : entrées récentes avec paramètres,
+    route et plan d'exécution, et agrégats par empreinte de requête (admin seulement)
+    """
+    return slow_query_log.summary(limit)
+
+
+@admin_router.delete("/debug/slow-queries")
+async def clear_slow_queries(
+        current_user: models.User = Depends(get_current_admin_user)
+):
+    """Vide le journal des requêtes lentes (admin seulement)"""
+    slow_query_log.clear()
+    return {"message": "Journal des requêtes lentes vidé"}
+
+
 # Upload CSV
 @upload_router.post("/csv/")
-async def upload_csv(
+def upload_csv(
         file: UploadFile = File(...),
         db: Session = Depends(get_db),
         current_user: models.User = Depends(get_current_admin_user)
 ):
+    """Import CSV en streaming : validation et insertion par lots, rapport d'erreurs par ligne"""
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Seuls les fichiers CSV sont acceptés")
 
     try:
-        contents = await file.read()
-        csv_data = io.StringIO(contents.decode('utf-8'))
-        csv_reader = csv.DictReader(csv_data)
-
-        indicators_created = 0
-        for row in csv_reader:
-            try:
-                indicator_data = schemas.IndicatorCreate(
-                    type=row['type'],
-                    value=float(row['value']),
-                    unit=row['unit'],
-                    timestamp=row.get('timestamp', datetime.utcnow().isoformat()),
-                    zone_id=int(row['zone_id']),
-                    source_id=int(row['source_id']),
-                    additional_data=row.get('additional_data')
-                )
-                crud.create_indicator(db, indicator_data, current_user.id)
-                indicators_created += 1
-            except Exception as e:
-                print(f"Erreur ligne CSV: {e}")
-                continue
-
-        return {"message": f"{indicators_created} indicateurs créés avec succès"}
+        report = import_indicators_csv(db, file.file, current_user.id)
+    except CSVFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur traitement CSV: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Erreur traitement CSV: {e}")
+
+    stats = report["stats"]
+    print(f"📥 CSV importé: {report['created']} créés, {report['duplicates']} doublons, {report['rejected']} rejetés "
+          f"({stats['rows_per_second']} lignes/s)")
+    return report
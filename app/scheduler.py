@@ -0,0 +1,224 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+import schedule
+
+from . import models
+from .core.config import settings
+from .database import SessionLocal
+from .metrics import metrics
+
+# Fournisseur -> fonction d'ingestion de scripts/data_ingestion.py
+PROVIDERS = {
+    "openmeteo": "ingest_weather_data",
+    "waqi": "ingest_air_quality_data",
+    "datagouv": "ingest_energy_data",
+}
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+TRIGGER_MANUAL = "manual"
+TRIGGER_SCHEDULE = "schedule"
+
+# Période de vérification des tâches planifiées (secondes)
+TICK_SECONDS = 1
+
+
+def describe_job(job: models.IngestionJob) -> dict:
+    """Représentation d'un job pour l'API : avancement, durée et créations par fournisseur"""
+    providers = job.providers.split(",")
+    counts = json.loads(job.counts or "{}")
+    end = job.finished_at or (datetime.utcnow() if job.started_at else None)
+    return {
+        "id": job.id,
+        "trigger": job.trigger,
+        "status": job.status,
+        "providers": providers,
+        "progress": {"done": job.providers_done, "total": len(providers)},
+        "counts": counts,
+        "total": sum(counts.values()),
+        "error": job.error,
+        "requested_by": job.requested_by,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "duration_seconds": round((end - job.started_at).total_seconds(), 3) if job.started_at else None,
+    }
+
+
+class IngestionScheduler:
+    """
+    Ingestion en arrière-plan. Un thread déclenche chaque fournisseur à son intervalle, avec un
+    décalage aléatoire. Chaque exécution (planifiée ou demandée via l'API) est enregistrée dans
+    ingestion_jobs puis tourne dans un pool de threads. Un verrou par fournisseur empêche deux
+    ingestions simultanées de la même source : une exécution planifiée est alors ignorée, une
+    exécution demandée attend la fin de la précédente.
+    """
+
+    def __init__(self):
+        self._schedule = schedule.Scheduler()
+        self._provider_locks = {provider: threading.Lock() for provider in PROVIDERS}
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.INGESTION_JOB_WORKERS, thread_name_prefix="ingestion-job"
+                )
+            return self._executor
+
+    # Jobs
+    def enqueue(self, providers: Optional[Iterable[str]] = None, trigger: str = TRIGGER_MANUAL,
+                requested_by: Optional[int] = None) -> models.IngestionJob:
+        """Enregistre un job en file d'attente et le soumet au pool ; retourne immédiatement"""
+        providers = list(providers or PROVIDERS)
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            job = models.IngestionJob(
+                trigger=trigger,
+                providers=",".join(providers),
+                status=QUEUED,
+                providers_done=0,
+                counts="{}",
+                requested_by=requested_by,
+            )
+            db.add(job)
+            db.commit()
+        finally:
+            db.close()
+
+        self._get_executor().submit(self._run, job.id, providers, trigger == TRIGGER_SCHEDULE)
+        return job
+
+    def _update(self, job_id: int, **fields):
+        # Transaction courte : la connexion d'écriture unique est rendue aussitôt
+        db = SessionLocal()
+        try:
+            db.query(models.IngestionJob).filter(models.IngestionJob.id == job_id).update(fields)
+            db.commit()
+        finally:
+            db.close()
+
+    def _run(self, job_id: int, providers: List[str], skip_if_busy: bool):
+        self._update(job_id, status=RUNNING, started_at=datetime.utcnow())
+        print(f"🚀 Job d'ingestion {job_id} démarré ({', '.join(providers)})")
+        counts = {}
+        errors = []
+        try:
+            # Import différé : scripts/ est ajouté au chemin par app.routes
+            from scripts import data_ingestion
+
+            with ThreadPoolExecutor(max_workers=len(providers), thread_name_prefix=f"ingest-{job_id}") as pool:
+                futures = {
+                    pool.submit(self._run_provider, data_ingestion, provider, skip_if_busy): provider
+                    for provider in providers
+                }
+                for future in as_completed(futures):
+                    provider = futures[future]
+                    try:
+                        counts[provider] = future.result()
+                    except Exception as e:
+                        errors.append(f"{provider}: {e}")
+                    self._update(job_id, providers_done=len(counts) + len(errors), counts=json.dumps(counts))
+        except Exception as e:
+            errors.append(str(e))
+
+        self._update(
+            job_id,
+            status=FAILED if errors else SUCCEEDED,
+            error="; ".join(errors) or None,
+            finished_at=datetime.utcnow(),
+        )
+        if errors:
+            print(f"❌ Job d'ingestion {job_id} en échec: {'; '.join(errors)}")
+        else:
+            print(f"✅ Job d'ingestion {job_id} terminé: {sum(counts.values())} nouvelles données")
+
+    def _run_provider(self, data_ingestion, provider: str, skip_if_busy: bool) -> int:
+        lock = self._provider_locks[provider]
+        if not lock.acquire(blocking=not skip_if_busy):
+            print(f"⏭️ Ingestion {provider} déjà en cours : exécution planifiée ignorée")
+            metrics.ingestion_finished(provider, "skipped", 0, 0.0)
+            return 0
+        started = time.perf_counter()
+        try:
+            created = getattr(data_ingestion, PROVIDERS[provider])()
+        except Exception:
+            metrics.ingestion_finished(provider, FAILED, 0, time.perf_counter() - started)
+            raise
+        finally:
+            lock.release()
+        metrics.ingestion_finished(provider, SUCCEEDED, created, time.perf_counter() - started)
+        return created
+
+    def _recover(self):
+        """Au démarrage : jobs interrompus marqués en échec, jobs en file d'attente relancés"""
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            job = models.IngestionJob
+            interrupted = db.query(job).filter(job.status == RUNNING).update({
+                "status": FAILED,
+                "error": "Interrompu par l'arrêt de l'application",
+                "finished_at": datetime.utcnow(),
+            })
+            queued = db.query(job.id, job.providers, job.trigger).filter(job.status == QUEUED).order_by(job.id).all()
+            db.commit()
+        finally:
+            db.close()
+
+        if interrupted:
+            print(f"⚠️ {interrupted} job(s) d'ingestion interrompu(s) marqué(s) en échec")
+        for job_id, providers, trigger in queued:
+            self._get_executor().submit(self._run, job_id, providers.split(","), trigger == TRIGGER_SCHEDULE)
+
+    # Planification
+    def start(self):
+        """Reprend les jobs en attente et lance le thread de planification"""
+        if self._thread is not None:
+            return
+        self._recover()
+        jitter = max(0, settings.INGESTION_JITTER_SECONDS)
+        for provider, minutes in settings.INGESTION_INTERVAL_MINUTES.items():
+            # Intervalle tiré au hasard dans [intervalle, intervalle + jitter] à chaque exécution
+            seconds = minutes * 60
+            self._schedule.every(seconds).to(seconds + jitter).seconds.do(
+                self.enqueue, [provider], TRIGGER_SCHEDULE
+            ).tag(provider)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="ingestion-scheduler", daemon=True)
+        self._thread.start()
+        print(f"⏰ Planificateur d'ingestion démarré ({settings.INGESTION_INTERVAL_MINUTES} min)")
+
+    def _loop(self):
+        while not self._stop.wait(TICK_SECONDS):
+            try:
+                self._schedule.run_pending()
+            except Exception as e:
+                print(f"❌ Erreur planificateur d'ingestion: {e}")
+
+    def stop(self):
+        """Arrête la planification ; les jobs en file d'attente seront repris au prochain démarrage"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._schedule.clear()
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+ingestion_scheduler = IngestionScheduler()
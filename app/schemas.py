@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 
@@ -41,11 +41,22 @@ class ZoneBase(BaseModel):
 
 class Zone(ZoneBase):
     id: int
+    lat: Optional[float] = None
+    lon: Optional[float] = None
 
     class Config:
         from_attributes = True
 
 
+class ZoneNearest(BaseModel):
+    id: int
+    name: str
+    postal_code: Optional[str] = None
+    lat: float
+    lon: float
+    distance_km: float
+
+
 class SourceBase(BaseModel):
     name: str
     description: Optional[str] = None
@@ -101,4 +112,44 @@ class AirQualityStats(BaseModel):
     max: float
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class SummaryStats(BaseModel):
+    type: str
+    zone_id: Optional[int] = None
+    count: int
+    average: float
+    min: float
+    max: float
+    stddev: float
+    first_timestamp: datetime
+    last_timestamp: datetime
+
+
+class IndicatorSeries(BaseModel):
+    zone_id: int
+    count: int
+    timestamps: List[datetime]
+    values: List[float]
+
+
+class IngestionJobProgress(BaseModel):
+    done: int
+    total: int
+
+
+class IngestionJob(BaseModel):
+    id: int
+    trigger: str
+    status: str
+    providers: List[str]
+    progress: IngestionJobProgress
+    counts: Dict[str, int]
+    total: int
+    error: Optional[str] = None
+    requested_by: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration_seconds: Optional[float] = None
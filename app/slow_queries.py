@@ -0,0 +1,188 @@
+import hashlib
+import re
+import threading
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import List, Optional
+
+from .core.config import settings
+
+# Taille maximale du texte des paramètres conservé par entrée
+MAX_PARAMETERS_LENGTH = 500
+# Lots d'un executemany conservés par entrée
+MAX_PARAMETER_SETS = 3
+# Lignes du plan d'exécution conservées (un OR de N clés produit N lignes)
+MAX_PLAN_ROWS = 50
+# Plans mémorisés par empreinte, vidé au-delà (un plan par forme de requête suffit)
+PLAN_CACHE_SIZE = 1000
+# Requêtes dont le plan est demandé : DDL, PRAGMA et transactions n'en ont pas d'utile
+EXPLAINABLE_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+_FIRST_KEYWORD = re.compile(r"\s*(\w+)")
+
+# Route HTTP en cours ("GET /indicators/"), renseignée par RouteContextMiddleware
+request_route: ContextVar[Optional[str]] = ContextVar("request_route", default=None)
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    Forme normalisée d'une requête SQL : littéraux remplacés par ?, listes de paramètres
+    (IN, VALUES multiples) réduites à (...), espaces regroupés
+    """
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _WHITESPACE.sub(" ", normalized).strip()
+    normalized = _PLACEHOLDER_LIST.sub("(...)", normalized)
+    return _VALUES_LIST.sub(r"\1", normalized)
+
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def _format_parameters(parameters, executemany: bool) -> str:
+    if executemany:
+        parameters = list(parameters[:MAX_PARAMETER_SETS]) + (
+            [f"... {len(parameters) - MAX_PARAMETER_SETS} lots de plus"] if len(parameters) > MAX_PARAMETER_SETS else []
+        )
+    text = repr(parameters)
+    return text if len(text) <= MAX_PARAMETERS_LENGTH else text[:MAX_PARAMETERS_LENGTH] + "..."
+
+
+class SlowQueryLog:
+    """
+    Journal borné (anneau) des requêtes SQL plus lentes que le seuil : requête normalisée,
+    paramètres, durée, route appelante et plan d'exécution SQLite (EXPLAIN QUERY PLAN).
+    Les plus anciennes entrées sont écartées une fois la capacité atteinte. Le plan n'est
+    calculé qu'une fois par empreinte, et seulement pour les requêtes DML.
+    """
+
+    def __init__(self, threshold_ms: float, capacity: int):
+        self.threshold = threshold_ms / 1000
+        self.capacity = capacity
+        self._entries = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._plans = {}
+        self.recorded = 0
+
+    @staticmethod
+    def explain(conn, statement: str, parameters, executemany: bool) -> Optional[List[str]]:
+        """Plan SQLite de la requête sur la même connexion (curseur distinct), None si indisponible"""
+        if conn.dialect.name != "sqlite":
+            return None
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        try:
+            cursor = conn.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())
+                plan = [row[-1] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+        except Exception as e:
+            return [f"EXPLAIN QUERY PLAN impossible : {e}"]
+        if len(plan) > MAX_PLAN_ROWS:
+            plan = plan[:MAX_PLAN_ROWS] + [f"... {len(plan) - MAX_PLAN_ROWS} lignes de plus"]
+        return plan
+
+    def plan(self, conn, key: str, statement: str, parameters, executemany: bool) -> Optional[List[str]]:
+        """Plan mémorisé de l'empreinte, calculé à sa première occurrence ; None hors DML"""
+        keyword = _FIRST_KEYWORD.match(statement)
+        if keyword is None or keyword.group(1).upper() not in EXPLAINABLE_STATEMENTS:
+            return None
+        with self._lock:
+            if key in self._plans:
+                return self._plans[key]
+        plan = self.explain(conn, statement, parameters, executemany)
+        with self._lock:
+            if len(self._plans) >= PLAN_CACHE_SIZE:
+                self._plans.clear()
+            self._plans[key] = plan
+        return plan
+
+    def record(self, conn, statement: str, parameters, duration: float, executemany: bool):
+        normalized = normalize_statement(statement)
+        key = fingerprint(normalized)
+        entry = {
+            "fingerprint": key,
+            "statement": normalized,
+            "parameters": _format_parameters(parameters, executemany),
+            "duration_ms": round(duration * 1000, 2),
+            "route": request_route.get(),
+            "executemany": executemany,
+            "plan": self.plan(conn, key, statement, parameters, executemany),
+            "recorded_at": datetime.utcnow().isoformat(timespec="milliseconds"),
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self.recorded += 1
+
+    def entries(self) -> List[dict]:
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._plans.clear()
+
+    def summary(self, limit: int = 100) -> dict:
+        """Entrées récentes (les plus récentes d'abord) et agrégats par empreinte, triés par temps cumulé"""
+        entries = self.entries()
+        groups = {}
+        for entry in entries:
+            group = groups.get(entry["fingerprint"])
+            if group is None:
+                group = groups[entry["fingerprint"]] = {
+                    "fingerprint": entry["fingerprint"],
+                    "statement": entry["statement"],
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "routes": {},
+                    "last_seen": None,
+                    "last_plan": None,
+                }
+            group["count"] += 1
+            group["total_ms"] += entry["duration_ms"]
+            group["max_ms"] = max(group["max_ms"], entry["duration_ms"])
+            if entry["route"]:
+                group["routes"][entry["route"]] = group["routes"].get(entry["route"], 0) + 1
+            group["last_seen"] = entry["recorded_at"]
+            group["last_plan"] = entry["plan"]
+        for group in groups.values():
+            group["total_ms"] = round(group["total_ms"], 2)
+            group["mean_ms"] = round(group["total_ms"] / group["count"], 2)
+        return {
+            "threshold_ms": round(self.threshold * 1000, 2),
+            "capacity": self.capacity,
+            "recorded": self.recorded,
+            "fingerprints": sorted(groups.values(), key=lambda group: group["total_ms"], reverse=True),
+            "entries": entries[::-1][:limit],
+        }
+
+
+class RouteContextMiddleware:
+    """Middleware ASGI : rend la route de la requête HTTP en cours visible du journal des requêtes lentes"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = request_route.set(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_route.reset(token)
+
+
+slow_query_log = SlowQueryLog(settings.SLOW_QUERY_THRESHOLD_MS, settings.SLOW_QUERY_LOG_SIZE)
@@ -0,0 +1,371 @@
+import math
+import time
+from itertools import chain
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .core.config import settings
+from .geometry import polygon_rings, ring_area_centroid
+
+EARTH_RADIUS_KM = 6371.0088
+# En dessous de ce nombre de zones, le calcul exhaustif vectorisé est plus rapide que la grille
+BRUTE_FORCE_MAX_ZONES = 256
+# Nombre de fils par noeud du R-tree des polygones
+RTREE_NODE_CAPACITY = 16
+# Clé de Session.info indiquant qu'une transaction a modifié des zones
+ZONES_CHANGED_KEY = "zones_changed"
+
+
+def unit_vectors(lats, lons) -> np.ndarray:
+    """Coordonnées (degrés) -> vecteurs unitaires (x, y, z) : la distance euclidienne (corde) croît avec la distance sur la sphère"""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def _chord_lengths(xyz: np.ndarray, query) -> np.ndarray:
+    diff = xyz - query
+    return np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+
+def chord_to_km(chord):
+    """Longueur de corde (sphère unité) -> distance orthodromique en km"""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.asarray(chord) / 2, 1.0))
+
+
+def _ring_cells(cx: int, cy: int, cz: int, ring: int):
+    # Cellules à distance de Tchebychev exactement ring de (cx, cy, cz)
+    if ring == 0:
+        yield cx, cy, cz
+        return
+    for dx in range(-ring, ring + 1):
+        for dy in range(-ring, ring + 1):
+            if abs(dx) == ring or abs(dy) == ring:
+                for dz in range(-ring, ring + 1):
+                    yield cx + dx, cy + dy, cz + dz
+            else:
+                yield cx + dx, cy + dy, cz - ring
+                yield cx + dx, cy + dy, cz + ring
+
+
+class ZoneGrid:
+    """
+    Grille régulière sur les vecteurs unitaires des zones. Les zones sont triées par cellule et
+    chaque cellule occupée pointe vers sa tranche. Une recherche parcourt les couronnes de
+    cellules autour du point jusqu'à ce que les k plus proches trouvées soient plus proches que
+    toute cellule non parcourue.
+    """
+
+    def __init__(self, ids, names, postal_codes, lats, lons, cell_km: float):
+        self.size = len(ids)
+        self.cell = cell_km / EARTH_RADIUS_KM
+        xyz = unit_vectors(lats, lons).reshape(-1, 3)
+        cells = np.floor(xyz / self.cell).astype(np.int64)
+        order = np.lexsort((cells[:, 2], cells[:, 1], cells[:, 0]))
+
+        self.xyz = xyz[order]
+        self.ids = np.asarray(ids, dtype=np.int64)[order].tolist()
+        self.lats = np.asarray(lats, dtype=np.float64)[order].tolist()
+        self.lons = np.asarray(lons, dtype=np.float64)[order].tolist()
+        self.names = [names[i] for i in order]
+        self.postal_codes = [postal_codes[i] for i in order]
+
+        cells = cells[order]
+        starts = np.flatnonzero(np.r_[True, np.any(cells[1:] != cells[:-1], axis=1)]) if self.size else np.empty(0, dtype=np.int64)
+        ends = np.r_[starts[1:], self.size]
+        positions = np.arange(self.size)
+        self._cells = {
+            tuple(cell): positions[start:end]
+            for cell, start, end in zip(cells[starts].tolist(), starts.tolist(), ends.tolist())
+        }
+        # Au-delà, toute la sphère (diamètre 2) est couverte
+        self._max_ring = int(np.ceil(2 / self.cell)) + 1
+
+    def _search(self, query, k: int):
+        cx, cy, cz = (math.floor(value / self.cell) for value in query)
+        chunks = []
+        found = 0
+        visited = 0
+        for ring in range(self._max_ring + 1):
+            for cell in _ring_cells(cx, cy, cz, ring):
+                visited += 1
+                positions = self._cells.get(cell)
+                if positions is not None:
+                    chunks.append(positions)
+                    found += len(positions)
+            if ring and found >= k:
+                candidates = np.concatenate(chunks)
+                distances = _chord_lengths(self.xyz[candidates], query)
+                # Toute zone d'une cellule non parcourue est à plus de ring * cell (corde)
+                if np.partition(distances, k - 1)[k - 1] <= ring * self.cell:
+                    return candidates, distances
+            if visited > len(self._cells):
+                # Zones clairsemées autour du point : le calcul exhaustif coûte moins cher
+                break
+        return np.arange(self.size), _chord_lengths(self.xyz, query)
+
+    def nearest(self, lat: float, lon: float, k: int) -> List[dict]:
+        """Les k zones les plus proches de (lat, lon), de la plus proche à la plus lointaine"""
+        k = min(k, self.size)
+        if k <= 0:
+            return []
+        lat_rad, lon_rad = math.radians(lat), math.radians(lon)
+        query = (math.cos(lat_rad) * math.cos(lon_rad), math.cos(lat_rad) * math.sin(lon_rad), math.sin(lat_rad))
+        if self.size <= BRUTE_FORCE_MAX_ZONES:
+            candidates, distances = np.arange(self.size), _chord_lengths(self.xyz, query)
+        else:
+            candidates, distances = self._search(query, k)
+
+        top = np.argpartition(distances, k - 1)[:k] if len(candidates) > k else np.arange(len(candidates))
+        top = top[np.argsort(distances[top], kind="stable")]
+        positions = candidates[top].tolist()
+        distances_km = chord_to_km(distances[top]).tolist()
+        return [
+            {
+                "id": self.ids[position],
+                "name": self.names[position],
+                "postal_code": self.postal_codes[position],
+                "lat": self.lats[position],
+                "lon": self.lons[position],
+                "distance_km": round(distance, 3),
+            }
+            for position, distance in zip(positions, distances_km)
+        ]
+
+
+def _str_order(boxes: np.ndarray, capacity: int) -> np.ndarray:
+    # Sort-Tile-Recursive : tranches verticales par centre x, puis tri par centre y dans chaque tranche
+    centers_x = (boxes[:, 0] + boxes[:, 2]) / 2
+    centers_y = (boxes[:, 1] + boxes[:, 3]) / 2
+    slice_size = capacity * math.ceil(math.sqrt(math.ceil(len(boxes) / capacity)))
+    order = np.argsort(centers_x, kind="stable")
+    for start in range(0, len(order), slice_size):
+        chunk = order[start:start + slice_size]
+        order[start:start + slice_size] = chunk[np.argsort(centers_y[chunk], kind="stable")]
+    return order
+
+
+def _boxes_contain(boxes: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return (boxes[:, 0] <= x) & (x <= boxes[:, 2]) & (boxes[:, 1] <= y) & (y <= boxes[:, 3])
+
+
+def points_in_polygon(edges: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Test exact point-dans-polygone (parité des croisements d'une demi-droite horizontale) sur les
+    arêtes (x1, y1, x2, y2) de tous les anneaux : les points d'un trou sont hors du polygone
+    """
+    inside = np.zeros(len(x), dtype=bool)
+    x1, y1, x2, y2 = edges.T
+    # Matrice points x arêtes bornée à ~1M de cellules
+    step = max(1, 1_000_000 // max(len(edges), 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for start in range(0, len(x), step):
+            px = x[start:start + step, None]
+            py = y[start:start + step, None]
+            spans = (y1 > py) != (y2 > py)
+            crossing_x = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+            inside[start:start + step] = np.count_nonzero(spans & (px < crossing_x), axis=1) % 2 == 1
+    return inside
+
+
+class PolygonIndex:
+    """
+    Zones polygonales : R-tree construit par STR sur leurs rectangles englobants, puis test exact
+    point-dans-polygone sur les candidats. Les requêtes sont traitées par lot, un niveau de
+    l'arbre à la fois. Un point contenu dans plusieurs zones va à la plus petite.
+    """
+
+    def __init__(self, zone_ids, polygons, capacity: int = RTREE_NODE_CAPACITY):
+        # polygons : pour chaque zone, ses polygones (anneaux de (lon, lat), cf. geometry.polygon_rings)
+        self.size = len(zone_ids)
+        self.capacity = capacity
+        edges = []
+        boxes = np.empty((self.size, 4))
+        areas = np.empty(self.size)
+        for i, zone_polygons in enumerate(polygons):
+            rings = [ring for rings in zone_polygons for ring in rings]
+            points = np.concatenate(rings)
+            boxes[i] = points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()
+            areas[i] = sum(abs(ring_area_centroid(rings[0])[0]) for rings in zone_polygons)
+            edges.append(np.concatenate([np.hstack((ring, np.roll(ring, -1, axis=0))) for ring in rings]))
+
+        order = _str_order(boxes, capacity) if self.size else np.arange(0)
+        self.zone_ids = np.asarray(zone_ids, dtype=np.int64)[order]
+        self.areas = areas[order]
+        self.edges = [edges[i] for i in order]
+
+        # Niveau 0 = zones ; chaque niveau supérieur regroupe `capacity` noeuds consécutifs du niveau inférieur
+        self._boxes = [boxes[order]]
+        self._children = [None]
+        while len(self._boxes[-1]) > capacity:
+            below = self._boxes[-1]
+            starts = np.arange(0, len(below), capacity)
+            ends = np.minimum(starts + capacity, len(below))
+            parents = np.column_stack((
+                np.minimum.reduceat(below[:, 0], starts), np.minimum.reduceat(below[:, 1], starts),
+                np.maximum.reduceat(below[:, 2], starts), np.maximum.reduceat(below[:, 3], starts),
+            ))
+            parent_order = _str_order(parents, capacity)
+            self._boxes.append(parents[parent_order])
+            self._children.append((starts[parent_order], ends[parent_order]))
+
+    def candidates(self, x: np.ndarray, y: np.ndarray):
+        """Paires (indice du point, indice de zone) dont le rectangle englobant contient le point"""
+        top = len(self._boxes) - 1
+        points = np.repeat(np.arange(len(x)), len(self._boxes[top]))
+        nodes = np.tile(np.arange(len(self._boxes[top])), len(x))
+        keep = _boxes_contain(self._boxes[top][nodes], x[points], y[points])
+        points, nodes = points[keep], nodes[keep]
+        for level in range(top, 0, -1):
+            starts, ends = self._children[level]
+            counts = ends[nodes] - starts[nodes]
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            nodes = np.repeat(starts[nodes], counts) + offsets
+            points = np.repeat(points, counts)
+            keep = _boxes_contain(self._boxes[level - 1][nodes], x[points], y[points])
+            points, nodes = points[keep], nodes[keep]
+        return points, nodes
+
+    def resolve(self, lats, lons) -> np.ndarray:
+        """Id de la zone contenant chaque point, -1 si aucune"""
+        x = np.asarray(lons, dtype=np.float64)
+        y = np.asarray(lats, dtype=np.float64)
+        result = np.full(len(x), -1, dtype=np.int64)
+        if self.size == 0 or len(x) == 0:
+            return result
+
+        points, nodes = self.candidates(x, y)
+        inside = np.zeros(len(points), dtype=bool)
+        order = np.argsort(nodes, kind="stable")
+        points, nodes = points[order], nodes[order]
+        bounds = np.flatnonzero(np.r_[True, nodes[1:] != nodes[:-1], True])
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            group = points[start:end]
+            inside[start:end] = points_in_polygon(self.edges[nodes[start]], x[group], y[group])
+
+        points, nodes = points[inside], nodes[inside]
+        # Plusieurs zones contiennent le point : la plus petite (ex. arrondissement plutôt que commune)
+        order = np.lexsort((self.areas[nodes], points))
+        points, nodes = points[order], nodes[order]
+        first = np.r_[True, points[1:] != points[:-1]] if len(points) else np.zeros(0, dtype=bool)
+        result[points[first]] = self.zone_ids[nodes[first]]
+        return result
+
+
+class ZoneLookup:
+    """État de l'index à un instant donné : grille de toutes les zones géolocalisées et R-tree des polygones"""
+
+    def __init__(self, rows, cell_km: float):
+        located = [row for row in rows if row.lat is not None and row.lon is not None]
+        self.grid = ZoneGrid(
+            [row.id for row in located], [row.name for row in located], [row.postal_code for row in located],
+            [row.lat for row in located], [row.lon for row in located], cell_km
+        )
+
+        polygon_ids, polygons, points = [], [], []
+        for row in rows:
+            zone_polygons = polygon_rings(row.geometry)
+            if zone_polygons:
+                polygon_ids.append(row.id)
+                polygons.append(zone_polygons)
+            elif row.lat is not None and row.lon is not None:
+                points.append(row)
+        self.polygons = PolygonIndex(polygon_ids, polygons)
+        # Zones décrites par un simple point : rattachement par proximité
+        self.points = ZoneGrid(
+            [row.id for row in points], [row.name for row in points], [row.postal_code for row in points],
+            [row.lat for row in points], [row.lon for row in points], cell_km
+        )
+
+    def nearest(self, lat: float, lon: float, k: int) -> List[dict]:
+        return self.grid.nearest(lat, lon, k)
+
+    def resolve(self, lats, lons, max_distance_km: Optional[float] = None) -> List[Optional[int]]:
+        """
+        Zone de chaque point (lat, lon) : le polygone qui le contient, à défaut la zone-point la plus
+        proche à moins de max_distance_km (ZONE_MATCH_MAX_DISTANCE_KM par défaut), sinon None
+        """
+        if max_distance_km is None:
+            max_distance_km = settings.ZONE_MATCH_MAX_DISTANCE_KM
+        zone_ids = self.polygons.resolve(lats, lons).tolist()
+        for i, zone_id in enumerate(zone_ids):
+            if zone_id >= 0:
+                continue
+            nearest = self.points.nearest(lats[i], lons[i], 1)
+            zone_ids[i] = nearest[0]["id"] if nearest and nearest[0]["distance_km"] <= max_distance_km else None
+        return zone_ids
+
+
+class ZoneIndex:
+    """
+    Index spatial des zones, partagé par les requêtes. Il est reconstruit au premier appel après
+    un commit modifiant des zones (ou après SPATIAL_INDEX_MAX_AGE_SECONDS, pour les modifications
+    faites par un autre processus).
+    """
+
+    def __init__(self, cell_km: float, max_age_seconds: float):
+        self.cell_km = cell_km
+        self.max_age_seconds = max_age_seconds
+        self._lookup = None
+        self._built_at = 0.0
+        self._generation = 0
+
+    def invalidate(self):
+        self._generation += 1
+        self._lookup = None
+
+    def _current(self) -> Optional[ZoneLookup]:
+        lookup = self._lookup
+        if lookup is not None and time.monotonic() - self._built_at < self.max_age_seconds:
+            return lookup
+        return None
+
+    def _rebuild(self, db: Session) -> ZoneLookup:
+        # Pas de verrou : deux reconstructions simultanées produisent le même index
+        generation = self._generation
+        zone = models.Zone
+        rows = db.execute(select(zone.id, zone.name, zone.postal_code, zone.lat, zone.lon, zone.geometry)).all()
+        lookup = ZoneLookup(rows, self.cell_km)
+        # Index ignoré si les zones ont changé pendant la lecture
+        if generation == self._generation:
+            self._lookup = lookup
+            self._built_at = time.monotonic()
+        return lookup
+
+    def get(self, db: Session) -> ZoneLookup:
+        return self._current() or self._rebuild(db)
+
+    async def get_async(self, db: AsyncSession) -> ZoneLookup:
+        return self._current() or await db.run_sync(self._rebuild)
+
+    def resolve(self, db: Session, lats, lons) -> List[Optional[int]]:
+        """Zone contenant chaque point (lat, lon), None si aucune (voir ZoneLookup.resolve)"""
+        return self.get(db).resolve(list(lats), list(lons))
+
+
+zone_index = ZoneIndex(settings.SPATIAL_CELL_KM, settings.SPATIAL_INDEX_MAX_AGE_SECONDS)
+
+
+@event.listens_for(Session, "after_flush")
+def _note_zone_changes(session, flush_context):
+    if ZONES_CHANGED_KEY not in session.info and any(
+        isinstance(obj, models.Zone) for obj in chain(session.new, session.dirty, session.deleted)
+    ):
+        session.info[ZONES_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_zone_index(session):
+    if session.info.pop(ZONES_CHANGED_KEY, None):
+        zone_index.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_zone_changes(session):
+    session.info.pop(ZONES_CHANGED_KEY, None)
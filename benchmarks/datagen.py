@@ -0,0 +1,223 @@
+import argparse
+import json
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Indicateurs générés : (type, unité, valeur moyenne, amplitude journalière, bruit)
+TYPES = (
+    ("temperature", "°C", 12.0, 6.0, 1.5),
+    ("humidity", "%", 70.0, 15.0, 5.0),
+    ("air_quality_pm25", "µg/m³", 12.0, 5.0, 4.0),
+    ("air_quality_pm10", "µg/m³", 20.0, 8.0, 6.0),
+    ("air_quality_no2", "µg/m³", 25.0, 10.0, 8.0),
+)
+DEFAULT_ZONES = 50
+# Mesures horaires à partir de cette date
+START = np.datetime64("2023-01-01T00:00:00", "s")
+STEP_SECONDS = 3600
+# Lignes insérées par transaction
+INSERT_BATCH_ROWS = 200_000
+# Compte administrateur des benchmarks
+BENCH_EMAIL = "bench@ecotrack.com"
+BENCH_PASSWORD = "bench1234"
+# Emprise des zones générées (France métropolitaine)
+LAT_RANGE = (42.3, 51.0)
+LON_RANGE = (-4.8, 8.2)
+
+
+def plan(rows, zones=DEFAULT_ZONES, types=len(TYPES)):
+    """(zones, types, horodatages) produisant au moins `rows` lignes"""
+    types = max(1, min(types, len(TYPES)))
+    zones = max(1, zones)
+    return zones, types, max(1, math.ceil(rows / (zones * types)))
+
+
+def dataset_path(directory, zones, types, timestamps, seed):
+    return os.path.join(directory, f"bench_{zones}z_{types}t_{timestamps}h_s{seed}.db")
+
+
+def default_directory():
+    return os.path.join(tempfile.gettempdir(), "ecotrack-bench")
+
+
+def timestamp_strings(timestamps):
+    """Horodatages au format de stockage SQLAlchemy/SQLite ('AAAA-MM-JJ HH:MM:SS.ffffff')"""
+    times = START + np.arange(timestamps, dtype=np.int64) * np.timedelta64(STEP_SECONDS, "s")
+    return [f"{t.replace('T', ' ')}.000000" for t in np.datetime_as_string(times, unit="s")]
+
+
+def generate_values(rng, type_index, zone_count, hours):
+    """Valeurs (zones x heures) : cycle journalier, décalage par zone et bruit gaussien"""
+    type_, _, mean, amplitude, noise = TYPES[type_index]
+    daily = amplitude * np.sin(2 * np.pi * ((hours % 24) - 9) / 24)
+    offsets = rng.normal(0, amplitude / 2, size=(zone_count, 1))
+    values = mean + offsets + daily[None, :] + rng.normal(0, noise, size=(zone_count, len(hours)))
+    if type_ != "temperature":
+        values = np.maximum(values, 0)
+    return np.round(values, 2)
+
+
+def bench_zones(zones, seed=0):
+    """Zones ponctuelles réparties au hasard dans l'emprise LAT_RANGE x LON_RANGE"""
+    from app.models import Zone
+
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(*LAT_RANGE, zones)
+    lons = rng.uniform(*LON_RANGE, zones)
+    return [
+        Zone(id=i + 1, name=f"Zone {i + 1}", postal_code=f"{10000 + i:05d}",
+             geometry=json.dumps({"type": "Point", "coordinates": [round(lon, 5), round(lat, 5)]}))
+        for i, (lat, lon) in enumerate(zip(lats.tolist(), lons.tolist()))
+    ]
+
+
+def insert_indicators(db_path, zones, types, timestamps, seed):
+    """
+    Insertion directe (sqlite3, executemany) des zones x types x horodatages : bien plus rapide
+    que l'API pour des millions de lignes. Les agrégats sont recalculés ensuite.
+    """
+    rng = np.random.default_rng(seed)
+    stamps = timestamp_strings(timestamps)
+    hours = np.arange(timestamps)
+    chunk = max(1, INSERT_BATCH_ROWS // (zones * types))
+
+    connection = sqlite3.connect(db_path)
+    connection.execute("PRAGMA synchronous = OFF")
+    # Index supprimés pendant le chargement puis recréés en une passe (bien plus rapide)
+    indexes = [sql for (sql,) in connection.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'indicators' AND sql IS NOT NULL"
+    )]
+    for (name,) in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'indicators' AND sql IS NOT NULL"
+    ).fetchall():
+        connection.execute(f'DROP INDEX "{name}"')
+    inserted = 0
+    try:
+        for offset in range(0, timestamps, chunk):
+            window = slice(offset, min(offset + chunk, timestamps))
+            rows = []
+            for type_index in range(types):
+                type_, unit = TYPES[type_index][:2]
+                values = generate_values(rng, type_index, zones, hours[window])
+                for zone_index in range(zones):
+                    zone_values = values[zone_index].tolist()
+                    rows.extend(
+                        (type_, value, unit, stamp, zone_index + 1, 1, 1)
+                        for value, stamp in zip(zone_values, stamps[window])
+                    )
+            connection.executemany(
+                "INSERT INTO indicators (type, value, unit, timestamp, zone_id, source_id, user_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            connection.commit()
+            inserted += len(rows)
+            print(f"  📥 {inserted:,} lignes".replace(",", " "), end="\r", flush=True)
+        print()
+        print(f"  🗂️ Reconstruction de {len(indexes)} index...")
+        for sql in indexes:
+            connection.execute(sql)
+        connection.commit()
+    finally:
+        connection.close()
+    return inserted
+
+
+def generate(db_path, zones, types, timestamps, seed=0):
+    """
+    Crée la base de benchmark : schéma (migrations), compte admin, zones, source, indicateurs et
+    agrégats. DATABASE_URL doit désigner db_path avant l'import de app (voir ensure_dataset).
+    """
+    from app import rollups
+    from app.auth import get_password_hash
+    from app.database import SessionLocal, run_migrations
+    from app.models import Source, User
+
+    started = time.perf_counter()
+    run_migrations()
+    db = SessionLocal()
+    try:
+        db.add(User(id=1, email=BENCH_EMAIL, full_name="Bench", role="admin",
+                    hashed_password=get_password_hash(BENCH_PASSWORD)))
+        db.add_all(bench_zones(zones, seed))
+        db.add(Source(id=1, name="Bench", description="Données synthétiques des benchmarks"))
+        db.commit()
+    finally:
+        db.close()
+
+    rows = insert_indicators(db_path, zones, types, timestamps, seed)
+    db = SessionLocal()
+    try:
+        rollups.rebuild(db)
+    finally:
+        db.close()
+    return {"rows": rows, "generation_seconds": round(time.perf_counter() - started, 2)}
+
+
+def ensure_dataset(directory, zones, types, timestamps, seed=0):
+    """
+    Chemin de la base de benchmark, générée si besoin (réutilisée ensuite : un marqueur .done
+    n'est écrit qu'une fois la génération terminée). À appeler avant tout import de app.
+    """
+    os.makedirs(directory, exist_ok=True)
+    db_path = dataset_path(directory, zones, types, timestamps, seed)
+    marker = db_path + ".done"
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    # Archive et cache HTTP propres à la base de benchmark
+    os.environ.setdefault("ARCHIVE_DIR", os.path.join(directory, "archive"))
+    os.environ.setdefault("HTTP_CACHE_DIR", os.path.join(directory, "http_cache"))
+
+    if os.path.exists(marker):
+        with open(marker, encoding="utf-8") as f:
+            return db_path, json.load(f)
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    print(f"🏗️ Génération de {zones} zones x {types} types x {timestamps} heures -> {db_path}")
+    info = generate(db_path, zones, types, timestamps, seed)
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    print(f"✅ {info['rows']:,} indicateurs générés en {info['generation_seconds']}s".replace(",", " "))
+    return db_path, info
+
+
+def working_copy(db_path):
+    """
+    Copie jetable de la base générée, désignée par DATABASE_URL : les imports CSV mesurés ne
+    modifient pas la base de référence. À appeler avant tout import de app.
+    """
+    copy_path = db_path[:-len(".db")] + "_run.db"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(copy_path + suffix):
+            os.remove(copy_path + suffix)
+    # API de sauvegarde SQLite : inclut les pages encore dans le journal WAL
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(copy_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    os.environ["DATABASE_URL"] = f"sqlite:///{copy_path}"
+    return copy_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère une base SQLite synthétique pour les benchmarks")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--zones", type=int, default=DEFAULT_ZONES)
+    parser.add_argument("--types", type=int, default=len(TYPES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", default=default_directory())
+    args = parser.parse_args()
+
+    ensure_dataset(args.dir, *plan(args.rows, args.zones, args.types), seed=args.seed)
@@ -0,0 +1,276 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks import datagen
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_ROWS = (10_000, 1_000_000, 10_000_000)
+DEFAULT_CONCURRENCY = (10, 50)
+# Lignes par fichier envoyé à /upload/csv/
+UPLOAD_ROWS = 500
+AIR_TYPES = [type_ for type_, *_ in datagen.TYPES if type_.startswith("air_quality")]
+
+
+def percentiles(latencies):
+    """Latences p50/p95/p99 en millisecondes"""
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2)}
+
+
+class Scenarios:
+    """Requêtes de chaque route mesurée ; la i-ème requête varie zones, types et périodes"""
+
+    def __init__(self, zones, types, timestamps):
+        self.zones = zones
+        self.types = [type_ for type_, *_ in datagen.TYPES[:types]]
+        self.air_types = [type_ for type_ in self.types if type_ in AIR_TYPES] or self.types
+        self.times = datagen.START + np.arange(timestamps) * np.timedelta64(datagen.STEP_SECONDS, "s")
+        self.upload_start = self.times[-1] + np.timedelta64(datagen.STEP_SECONDS, "s")
+
+    def _window(self, i, hours):
+        # Fenêtre de `hours` heures dans la période générée
+        start = (i * 7919) % max(1, len(self.times) - hours)
+        end = min(start + hours, len(self.times) - 1)
+        return str(self.times[start]), str(self.times[end])
+
+    def indicators(self, i):
+        start, end = self._window(i, 24 * 7)
+        return "GET", "/indicators/", {"params": {
+            "type": self.types[i % len(self.types)], "zone_id": 1 + i % self.zones,
+            "start_date": start, "end_date": end, "limit": 100,
+        }}
+
+    def stats_averages(self, i):
+        start, end = self._window(i, 24 * 30)
+        params = {"start_date": start, "end_date": end}
+        if i % 2:
+            params["zone_id"] = 1 + i % self.zones
+        return "GET", "/stats/air/averages", {"params": params}
+
+    def stats_quality(self, i):
+        return "GET", "/stats/air/quality", {}
+
+    def zones_list(self, i):
+        return "GET", "/zones/", {"params": {"limit": 100}}
+
+    def upload_csv(self, i):
+        # Mesures postérieures à la période générée, distinctes d'une requête à l'autre
+        first = self.upload_start + np.timedelta64(i * UPLOAD_ROWS * datagen.STEP_SECONDS, "s")
+        lines = ["type,value,unit,zone_id,source_id,timestamp"]
+        for row in range(UPLOAD_ROWS):
+            timestamp = first + np.timedelta64(row * datagen.STEP_SECONDS, "s")
+            lines.append(f"{self.air_types[row % len(self.air_types)]},{row % 50}.5,µg/m³,"
+                         f"{1 + row % self.zones},1,{timestamp}")
+        content = ("\n".join(lines) + "\n").encode("utf-8")
+        return "POST", "/upload/csv/", {"files": {"file": (f"bench_{i}.csv", content, "text/csv")}}
+
+
+ENDPOINTS = {
+    "indicators": Scenarios.indicators,
+    "stats_air_averages": Scenarios.stats_averages,
+    "stats_air_quality": Scenarios.stats_quality,
+    "zones": Scenarios.zones_list,
+    # En dernier : les imports ajoutent des lignes à la base
+    "upload_csv": Scenarios.upload_csv,
+}
+
+
+async def run_load(client, scenario, requests_count, concurrency, offset):
+    """`concurrency` clients httpx simultanés sur l'application ASGI (1 : requêtes en série)"""
+    latencies = []
+    errors = 0
+    queue = iter(range(offset, offset + requests_count))
+
+    async def worker():
+        nonlocal errors
+        for i in queue:
+            method, path, kwargs = scenario(i)
+            began = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - began)
+            errors += response.status_code >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+    return {"requests": requests_count, "errors": errors,
+            "requests_per_second": round(requests_count / duration, 1), **percentiles(latencies)}
+
+
+async def measure(app, scenarios, args):
+    """Chaque route en série puis à chaque niveau de concurrence ; les requêtes ne se répètent pas"""
+    import httpx
+
+    from app.database import async_read_engine
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        token = await client.post("/auth/login", json={"email": datagen.BENCH_EMAIL, "password": datagen.BENCH_PASSWORD})
+        token.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {token.json()['access_token']}"
+
+        offset = 0
+        for endpoint in args.endpoints:
+            scenario = ENDPOINTS[endpoint].__get__(scenarios)
+            # Préchauffage (pools de connexions, cache de pages SQLite), hors mesure
+            await run_load(client, scenario, min(20, args.requests), 1, offset)
+            offset += args.requests
+            measures = {"sequential": await run_load(client, scenario, args.requests, 1, offset)}
+            offset += args.requests
+            for concurrency in args.concurrency:
+                measures[f"concurrent_{concurrency}"] = await run_load(
+                    client, scenario, args.requests, concurrency, offset
+                )
+                offset += args.requests
+            results[endpoint] = measures
+    await async_read_engine.dispose()
+    return results
+
+
+def worker_main(args):
+    """
+    Sous-processus : mesure chaque route sur une copie de la base du palier. Un processus par
+    palier, l'URL de base étant lue à l'import de app.
+    """
+    zones, types, timestamps = datagen.plan(args.rows[0], args.zones, args.types)
+    db_path, info = datagen.ensure_dataset(args.dir, zones, types, timestamps, args.seed)
+    datagen.working_copy(db_path)
+
+    from app.main import app
+
+    results = asyncio.run(measure(app, Scenarios(zones, types, timestamps), args))
+    with open(args.result_file, "w", encoding="utf-8") as f:
+        json.dump({
+            "rows": info["rows"], "zones": zones, "types": types, "timestamps": timestamps,
+            "generation_seconds": info["generation_seconds"], "database": db_path, "endpoints": results,
+        }, f)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True,
+            cwd=ROOT_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_dataset(dataset):
+    print(f"\n📊 {dataset['rows']:,} lignes ({dataset['zones']} zones x {dataset['types']} types x "
+          f"{dataset['timestamps']} heures)".replace(",", " "))
+    for endpoint, measures in dataset["endpoints"].items():
+        for mode, result in measures.items():
+            print(f"   {endpoint:<20} {mode:<15} {result['requests_per_second']:>9} req/s  "
+                  f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms"
+                  + (f"  ⚠️ {result['errors']} erreurs" if result["errors"] else ""))
+
+
+def run(args):
+    """Un sous-processus par palier de lignes ; résultats regroupés dans un fichier JSON"""
+    report = {
+        "revision": git_revision(),
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "datasets": [],
+    }
+    for rows in args.rows:
+        print(f"⏱️ Palier {rows:,} lignes...".replace(",", " "))
+        fd, result_file = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        command = [
+            sys.executable, "-m", "benchmarks.harness", "--worker", "--rows", str(rows),
+            "--zones", str(args.zones), "--types", str(args.types), "--seed", str(args.seed),
+            "--dir", args.dir, "--requests", str(args.requests), "--result-file", result_file,
+            "--concurrency", *map(str, args.concurrency), "--endpoints", *args.endpoints,
+        ]
+        # Journaux de l'application (un print par requête) écartés ; pas d'ingestion planifiée
+        env = dict(os.environ, INGESTION_SCHEDULER_ENABLED="false")
+        try:
+            # Génération dans son propre processus (base réutilisée si déjà générée)
+            subprocess.run([
+                sys.executable, "-m", "benchmarks.datagen", "--rows", str(rows), "--zones", str(args.zones),
+                "--types", str(args.types), "--seed", str(args.seed), "--dir", args.dir,
+            ], check=True, env=env, cwd=ROOT_DIR)
+            subprocess.run(command, check=True, env=env, stdout=subprocess.DEVNULL, cwd=ROOT_DIR)
+            with open(result_file, encoding="utf-8") as f:
+                dataset = json.load(f)
+        finally:
+            os.remove(result_file)
+        report["datasets"].append(dataset)
+        print_dataset(dataset)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.utcnow():%Y%m%d-%H%M%S}-{report['revision'] or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Résultats enregistrés dans {output}")
+
+
+def compare(before_path, after_path):
+    """Écart de débit et de p95 entre deux fichiers de résultats (mêmes paliers et routes)"""
+    with open(before_path, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"🔍 {before['revision']} -> {after['revision']}")
+    previous = {dataset["rows"]: dataset for dataset in before["datasets"]}
+    for dataset in after["datasets"]:
+        old = previous.get(dataset["rows"])
+        if old is None:
+            continue
+        print(f"\n📊 {dataset['rows']:,} lignes".replace(",", " "))
+        for endpoint, measures in dataset["endpoints"].items():
+            for mode, result in measures.items():
+                reference = old["endpoints"].get(endpoint, {}).get(mode)
+                if not reference:
+                    continue
+                throughput = result["requests_per_second"] / reference["requests_per_second"]
+                p95 = (result["p95_ms"] / reference["p95_ms"]) if reference["p95_ms"] else float("nan")
+                print(f"   {endpoint:<20} {mode:<15} débit x{throughput:.2f}  p95 x{p95:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Débit et latences (p50/p95/p99) des routes principales")
+    parser.add_argument("--rows", type=int, nargs="+", default=list(DEFAULT_ROWS))
+    parser.add_argument("--zones", type=int, default=datagen.DEFAULT_ZONES)
+    parser.add_argument("--types", type=int, default=len(datagen.TYPES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=200, help="requêtes par route et par mode")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=list(DEFAULT_CONCURRENCY),
+                        help="clients simultanés (en plus de la mesure en série)")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--dir", default=datagen.default_directory(), help="dossier des bases générées")
+    parser.add_argument("--output", help="fichier JSON (défaut : benchmarks/results/<date>-<révision>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("AVANT", "APRES"), help="compare deux fichiers de résultats")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    elif args.worker:
+        worker_main(args)
+    else:
+        run(args)
@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks import datagen
+from benchmarks.harness import RESULTS_DIR, git_revision
+from benchmarks.provider_stub import ProviderStub, provider_environment
+
+# Fournisseurs mesurés, dans l'ordre d'exécution (noms de app.scheduler.PROVIDERS)
+DEFAULT_PROVIDERS = ("openmeteo", "waqi", "datagouv")
+# Sources attendues par les fonctions d'ingestion (voir scripts/init_db.py)
+SOURCES = (
+    ("OpenMeteo", "API météorologique gratuite avec données historiques", "https://open-meteo.com"),
+    ("WAQI", "World Air Quality Index - Données qualité air mondiales", "https://waqi.info"),
+    ("ADEME", "Agence de la transition écologique - Données environnementales françaises", "https://data.ademe.fr"),
+)
+
+
+class Timings:
+    """Temps cumulé et nombre d'appels par catégorie, alimentés depuis plusieurs threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    def add(self, category, seconds):
+        with self._lock:
+            self.seconds[category] += seconds
+            self.calls[category] += 1
+
+    def reset(self):
+        with self._lock:
+            self.seconds.clear()
+            self.calls.clear()
+
+
+def instrument(timings):
+    """
+    Mesure le temps réseau (chaque appel de data_ingestion.cached_get, par fournisseur) et le temps
+    base de données (chaque requête SQL, entre before et after_cursor_execute)
+    """
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    from scripts import data_ingestion
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("bench_started", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timings.add("db", time.perf_counter() - conn.info["bench_started"].pop())
+
+    cached_get = data_ingestion.cached_get
+
+    def timed_get(provider, url, params, timeout):
+        began = time.perf_counter()
+        try:
+            return cached_get(provider, url, params, timeout)
+        finally:
+            timings.add(f"network_{provider}", time.perf_counter() - began)
+
+    data_ingestion.cached_get = timed_get
+
+
+def prepare_database(zones, seed):
+    """Schéma, compte utilisateur, zones et sources de la base jetable"""
+    from app.auth import get_password_hash
+    from app.database import SessionLocal, run_migrations
+    from app.models import Source, User
+
+    run_migrations()
+    db = SessionLocal()
+    try:
+        db.add(User(id=1, email=datagen.BENCH_EMAIL, full_name="Bench", role="admin",
+                    hashed_password=get_password_hash(datagen.BENCH_PASSWORD)))
+        db.add_all(datagen.bench_zones(zones, seed))
+        db.add_all([Source(name=name, description=description, url=url) for name, description, url in SOURCES])
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_provider(provider, timings, zones, days):
+    """Une ingestion complète du fournisseur ; débits et répartition réseau / base de données"""
+    from app.scheduler import PROVIDERS
+    from scripts import data_ingestion
+
+    ingest = getattr(data_ingestion, PROVIDERS[provider])
+    kwargs = {}
+    if provider == "openmeteo" and days:
+        kwargs["start_date"] = datetime.utcnow().date() - timedelta(days=days)
+
+    timings.reset()
+    started = time.perf_counter()
+    rows = ingest(**kwargs)
+    wall = time.perf_counter() - started
+    network = timings.seconds[f"network_{provider}"]
+    requests_count = timings.calls[f"network_{provider}"]
+    return {
+        "zones": zones,
+        "rows": rows,
+        "wall_seconds": round(wall, 3),
+        "zones_per_second": round(zones / wall, 1),
+        "rows_per_second": round(rows / wall, 1),
+        # Temps réseau cumulé sur les threads de fetch_concurrently (peut dépasser wall_seconds)
+        "network_seconds": round(network, 3),
+        "requests": requests_count,
+        "network_ms_per_request": round(network * 1000 / requests_count, 2) if requests_count else None,
+        "db_seconds": round(timings.seconds["db"], 3),
+        "db_queries": timings.calls["db"],
+    }
+
+
+def print_result(provider, result):
+    print(f"   {provider:<10} {result['wall_seconds']:>8}s  {result['zones_per_second']:>8} zones/s  "
+          f"{result['rows_per_second']:>10} lignes/s  réseau {result['network_seconds']}s "
+          f"({result['requests']} requêtes)  base {result['db_seconds']}s ({result['db_queries']} requêtes SQL)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Débit de l'ingestion (zones/s, lignes/s, temps réseau et base) sur le serveur de rejeu"
+    )
+    parser.add_argument("--zones", type=int, default=datagen.DEFAULT_ZONES)
+    parser.add_argument("--providers", nargs="+", choices=DEFAULT_PROVIDERS, default=list(DEFAULT_PROVIDERS))
+    parser.add_argument("--days", type=int, default=7, help="jours d'historique météo demandés par zone")
+    parser.add_argument("--fixtures", help="fixtures enregistrées (PROVIDER_RECORD_DIR), à défaut réponses synthétiques")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, help="requêtes par seconde et par fournisseur")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="fichier JSON (défaut : benchmarks/results/ingestion-<date>-<révision>.json)")
+    args = parser.parse_args()
+
+    stub = ProviderStub(args.fixtures, args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit, args.seed)
+    base_url = stub.start()
+    directory = tempfile.mkdtemp(prefix="ecotrack-ingestion-")
+    # Configuration lue à l'import de app : fournisseurs redirigés, base et archive jetables,
+    # pas de cache HTTP (chaque requête atteint le serveur de rejeu)
+    os.environ.update(provider_environment(base_url))
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(directory, 'ingestion.db')}",
+        "ARCHIVE_DIR": os.path.join(directory, "archive"),
+        "HTTP_CACHE_ENABLED": "false",
+        "PROVIDER_RECORD_DIR": "",
+        "INGESTION_SCHEDULER_ENABLED": "false",
+    })
+
+    try:
+        prepare_database(args.zones, args.seed)
+        timings = Timings()
+        instrument(timings)
+        print(f"⏱️ Ingestion de {args.zones} zones via {base_url} (latence {args.latency_ms} ms)...")
+        results = {}
+        for provider in args.providers:
+            results[provider] = run_provider(provider, timings, args.zones, args.days)
+    finally:
+        stub.stop()
+
+    print(f"\n📊 {args.zones} zones")
+    for provider, result in results.items():
+        print_result(provider, result)
+
+    report = {
+        "revision": git_revision(),
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "zones": args.zones,
+        "days": args.days,
+        "stub": {
+            "fixtures": args.fixtures, "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate, "rate_limit": args.rate_limit, "responses": stub.stats(),
+        },
+        "providers": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"ingestion-{datetime.utcnow():%Y%m%d-%H%M%S}-{report['revision'] or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Résultats enregistrés dans {output}")
+
+
+if __name__ == "__main__":
+    main()
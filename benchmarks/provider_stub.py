@@ -0,0 +1,234 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.provider_fixtures import fixture_key, load_fixtures, route
+
+OPENMETEO_ROUTES = ("/v1/forecast", "/v1/archive")
+WAQI_ROUTE = "/feed/geo:*/"
+DATAGOUV_ROUTE = "/api/1/datasets/"
+# Fournisseur de chaque route (limite de débit par fournisseur)
+ROUTE_PROVIDERS = {
+    "/v1/forecast": "openmeteo",
+    "/v1/archive": "openmeteo",
+    WAQI_ROUTE: "waqi",
+    DATAGOUV_ROUTE: "datagouv",
+}
+
+
+def _noise(*parts):
+    # Valeur pseudo-aléatoire reproductible dans [0, 1) pour une requête donnée
+    digest = hashlib.sha256(repr(parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+def synthetic_openmeteo(params):
+    """Réponse horaire OpenMeteo de start_date à end_date inclus, une valeur par variable demandée"""
+    lat = float(params.get("latitude", 0))
+    lon = float(params.get("longitude", 0))
+    start = date.fromisoformat(params.get("start_date") or date.today().isoformat())
+    end = date.fromisoformat(params.get("end_date") or start.isoformat())
+    hours = max(0, ((end - start).days + 1) * 24)
+    times = [datetime.combine(start, datetime.min.time()) + timedelta(hours=h) for h in range(hours)]
+    base = {
+        "temperature_2m": (12, 6), "relative_humidity_2m": (70, 15),
+        "wind_speed_10m": (15, 8), "pressure_msl": (1013, 6),
+    }
+    hourly = {"time": [t.strftime("%Y-%m-%dT%H:%M") for t in times]}
+    for variable in (params.get("hourly") or "").split(","):
+        mean, amplitude = base.get(variable, (0, 1))
+        offset = (_noise(variable, lat, lon) - 0.5) * amplitude
+        hourly[variable] = [round(mean + offset + amplitude * math.sin(2 * math.pi * (t.hour - 9) / 24), 1)
+                            for t in times]
+    return {"latitude": lat, "longitude": lon, "utc_offset_seconds": 0, "timezone": "GMT", "hourly": hourly}
+
+
+def synthetic_waqi(path):
+    """Flux WAQI d'une station placée au point demandé, mesure de l'heure en cours"""
+    coordinates = unquote(path).split("geo:", 1)[1].strip("/").split(";")
+    lat, lon = (float(value) for value in coordinates[:2])
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    return {
+        "status": "ok",
+        "data": {
+            "iaqi": {
+                pollutant: {"v": round(mean * (0.5 + _noise(pollutant, lat, lon, now.isoformat())), 1)}
+                for pollutant, mean in (("pm25", 12), ("pm10", 20), ("no2", 25))
+            },
+            "city": {"name": f"Station {lat:.3f};{lon:.3f}", "geo": [lat, lon]},
+            "time": {"iso": now.isoformat() + "+00:00"},
+        },
+    }
+
+
+def synthetic_datagouv(params):
+    """Résultat de recherche data.gouv.fr : page_size jeux de données"""
+    count = int(params.get("page_size", 3))
+    return {"data": [{"id": f"stub-{i}", "title": f"{params.get('q', '')} ({i})"} for i in range(count)],
+            "total": count}
+
+
+class ProviderStub:
+    """
+    Serveur HTTP local qui remplace OpenMeteo, WAQI et data.gouv.fr. Une requête reçoit la fixture
+    enregistrée pour la même requête, à défaut une fixture de la même route, à défaut une réponse
+    synthétique au format du fournisseur. Latence (moyenne + variation), taux d'erreurs (503) et
+    limite de débit par fournisseur (429) se règlent pour reproduire des conditions réelles.
+    """
+
+    def __init__(self, fixtures_dir=None, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 rate_limit=None, seed=0, host="127.0.0.1", port=0):
+        self.by_key, self.by_route = load_fixtures(fixtures_dir) if fixtures_dir else ({}, {})
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.host = host
+        self.port = port
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._counters = defaultdict(lambda: defaultdict(int))
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self._server.server_address[1]}"
+
+    def _count(self, provider, outcome):
+        with self._lock:
+            self._counters[provider][outcome] += 1
+
+    def _draw(self):
+        with self._lock:
+            return self._random.random(), self._random.uniform(-self.jitter, self.jitter)
+
+    def _allow(self, provider):
+        # Seau à jetons par fournisseur : rate_limit requêtes par seconde, rafale d'une seconde
+        if not self.rate_limit:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(provider, (self.rate_limit, now))
+            tokens = min(self.rate_limit, tokens + (now - updated) * self.rate_limit)
+            allowed = tokens >= 1
+            self._buckets[provider] = (tokens - 1 if allowed else tokens, now)
+            return allowed
+
+    def respond(self, path, params):
+        """(statut, type de contenu, corps) de la réponse à une requête GET"""
+        request_route = route(path)
+        provider = ROUTE_PROVIDERS.get(request_route, "unknown")
+        draw, jitter = self._draw()
+        time.sleep(max(0.0, self.latency + jitter))
+
+        if not self._allow(provider):
+            self._count(provider, "rate_limited")
+            return 429, "application/json", b'{"error": "rate limited"}'
+        if draw < self.error_rate:
+            self._count(provider, "errors")
+            return 503, "application/json", b'{"error": "unavailable"}'
+
+        fixture = self.by_key.get(fixture_key(path, params))
+        if fixture is None and self.by_route.get(request_route):
+            candidates = self.by_route[request_route]
+            fixture = candidates[int(fixture_key(path, params), 16) % len(candidates)]
+        if fixture is not None:
+            self._count(provider, "replayed")
+            return fixture["status"], fixture["content_type"], fixture["body"].encode("utf-8")
+
+        if request_route in OPENMETEO_ROUTES:
+            body = synthetic_openmeteo(params)
+        elif request_route == WAQI_ROUTE:
+            body = synthetic_waqi(path)
+        elif request_route == DATAGOUV_ROUTE:
+            body = synthetic_datagouv(params)
+        else:
+            self._count(provider, "not_found")
+            return 404, "application/json", b'{"error": "unknown route"}'
+        self._count(provider, "synthesized")
+        return 200, "application/json", json.dumps(body).encode("utf-8")
+
+    def start(self):
+        """Démarre le serveur dans un thread et retourne son URL de base"""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                status, content_type, body = stub.respond(parts.path, dict(parse_qsl(parts.query)))
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                if status == 429:
+                    self.send_header("Retry-After", "1")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="provider-stub", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def stats(self):
+        """Réponses servies par fournisseur : rejouées, synthétiques, erreurs, limitées"""
+        with self._lock:
+            return {provider: dict(counters) for provider, counters in self._counters.items()}
+
+
+def provider_environment(base_url):
+    """Variables d'environnement qui dirigent toutes les requêtes de data_ingestion vers le serveur"""
+    return {
+        "OPENMETEO_BASE_URL": base_url,
+        "OPENMETEO_ARCHIVE_BASE_URL": base_url,
+        "WAQI_BASE_URL": base_url,
+        "DATAGOUV_BASE_URL": base_url,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur local de rejeu des fournisseurs externes")
+    parser.add_argument("--fixtures", help="dossier des fixtures enregistrées (PROVIDER_RECORD_DIR)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="part des requêtes en erreur 503 (0 à 1)")
+    parser.add_argument("--rate-limit", type=float, help="requêtes par seconde et par fournisseur (429 au-delà)")
+    args = parser.parse_args()
+
+    stub = ProviderStub(args.fixtures, args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit,
+                        port=args.port)
+    base_url = stub.start()
+    print(f"🛰️ Rejeu des fournisseurs sur {base_url} ({len(stub.by_key)} fixtures)")
+    for name, value in provider_environment(base_url).items():
+        print(f"   export {name}={value}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stub.stop()
@@ -1,5 +1,8 @@
 // Gestion de l'ingestion des données externes
 const dataIngestion = {
+    // Intervalle de suivi de l'avancement d'un job (ms)
+    POLL_INTERVAL_MS: 2000,
+    
     // Lance l'ingestion des données externes
     fetchExternalData: async function() {
         const button = document.getElementById('fetch-external-data');
@@ -29,19 +32,23 @@ const dataIngestion = {
                 throw new Error(errorData.detail || `Erreur HTTP: ${response.status}`);
             }
             
-            const data = await response.json();
+            // La requête met seulement le job en file d'attente : suivi via /jobs/{id}
+            const queued = await response.json();
+            resultDiv.innerHTML = `⏳ Ingestion programmée (job ${queued.job_id})...`;
+            const job = await this.waitForJob(queued.job_id, resultDiv);
             
-            if (data.success) {
-                resultDiv.innerHTML = `✅ ${data.message}`;
+            if (job.status === 'succeeded') {
+                resultDiv.innerHTML = `✅ Ingestion terminée - ${job.total} nouvelles données ajoutées`;
                 resultDiv.style.color = '#155724';
                 
                 // Afficher les détails
-                const details = data.details;
+                const counts = job.counts;
                 resultDiv.innerHTML += `<br><small>
-                    🌤️ Météo: ${details.weather_data} | 
-                    🌫️ Qualité air: ${details.air_quality_data} | 
-                    ⚡ Énergie: ${details.energy_data} | 
-                    📊 Total: ${details.total}
+                    🌤️ Météo: ${counts.openmeteo ?? 0} | 
+                    🌫️ Qualité air: ${counts.waqi ?? 0} | 
+                    ⚡ Énergie: ${counts.datagouv ?? 0} | 
+                    📊 Total: ${job.total} | 
+                    ⏱️ ${job.duration_seconds}s
                 </small>`;
                 
                 // Recharger les indicateurs après un délai
@@ -51,7 +58,7 @@ const dataIngestion = {
                 
                 App.showMessage('Données externes récupérées avec succès!', 'success');
             } else {
-                throw new Error(data.detail || 'Erreur inconnue');
+                throw new Error(job.error || 'Erreur inconnue');
             }
             
         } catch (error) {
@@ -72,11 +79,38 @@ const dataIngestion = {
         }
     },
     
+    // Interroge /jobs/{id} jusqu'à la fin du job en affichant l'avancement
+    waitForJob: async function(jobId, resultDiv) {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, this.POLL_INTERVAL_MS));
+            
+            const response = await fetch(`${App.API_BASE}/jobs/${jobId}`, {
+                headers: {
+                    'Authorization': `Bearer ${App.token}`
+                }
+            });
+            
+            if (!response.ok) {
+                const errorData = await response.json();
+                throw new Error(errorData.detail || `Erreur HTTP: ${response.status}`);
+            }
+            
+            const job = await response.json();
+            if (job.status === 'succeeded' || job.status === 'failed') {
+                return job;
+            }
+            
+            resultDiv.innerHTML = job.status === 'queued'
+                ? `⏳ Job ${jobId} en attente...`
+                : `⏳ Job ${jobId} en cours : ${job.progress.done}/${job.progress.total} fournisseurs (${job.total} données)`;
+        }
+    },
+    
     // Initialisation
     init: function() {
         const button = document.getElementById('fetch-external-data');
         if (button) {
-            button.addEventListener('click', this.fetchExternalData);
+            button.addEventListener('click', () => this.fetchExternalData());
         }
     }
 };
@@ -0,0 +1,47 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from app.database import engine
+from app import models
+
+config = context.config
+
+# Au démarrage de l'API, la journalisation est déjà configurée par uvicorn
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = models.Base.metadata
+
+
+def run_migrations_offline():
+    """Génère le SQL des migrations sans connexion à la base"""
+    context.configure(
+        url=str(engine.url),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """Applique les migrations sur la base configurée dans DATABASE_URL"""
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite ne sait pas modifier une table en place : mode batch
+            render_as_batch=True,
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
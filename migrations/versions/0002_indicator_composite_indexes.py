@@ -0,0 +1,38 @@
+"""Index composites sur indicators pour les requêtes de lecture, statistiques et dédoublonnage
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filtres type (+ zone) triés par date : /indicators/, dédoublonnage énergie
+    op.create_index("ix_indicators_type_zone_ts", "indicators", ["type", "zone_id", "timestamp"])
+    # Agrégats par type sur une période : index couvrant (aucun accès à la table)
+    op.create_index("ix_indicators_type_ts_cover", "indicators", ["type", "timestamp", "zone_id", "value"])
+    # Dédoublonnage de l'ingestion : (zone, source, date)
+    op.create_index("ix_indicators_zone_source_ts", "indicators", ["zone_id", "source_id", "timestamp"])
+    # Liste sans filtre triée par date
+    op.create_index("ix_indicators_timestamp", "indicators", ["timestamp"])
+
+    # Préfixe des index composites ci-dessus : devenu redondant
+    op.drop_index("ix_indicators_type", table_name="indicators")
+
+
+def downgrade():
+    op.create_index("ix_indicators_type", "indicators", ["type"])
+    op.drop_index("ix_indicators_timestamp", table_name="indicators")
+    op.drop_index("ix_indicators_zone_source_ts", table_name="indicators")
+    op.drop_index("ix_indicators_type_ts_cover", table_name="indicators")
+    op.drop_index("ix_indicators_type_zone_ts", table_name="indicators")
@@ -0,0 +1,56 @@
+"""Tables d'agrégats horaires et journaliers des indicateurs (remplies depuis l'historique)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+ROLLUP_TABLES = {
+    "indicator_rollups_hourly": "%Y-%m-%d %H:00:00.000000",
+    "indicator_rollups_daily": "%Y-%m-%d 00:00:00.000000",
+}
+
+
+def upgrade():
+    for table, bucket_format in ROLLUP_TABLES.items():
+        op.create_table(
+            table,
+            sa.Column("type", sa.String(), nullable=False),
+            sa.Column("zone_id", sa.Integer(), nullable=False),
+            sa.Column("bucket_start", sa.DateTime(), nullable=False),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.Column("sum", sa.Float(), nullable=False),
+            sa.Column("min", sa.Float(), nullable=False),
+            sa.Column("max", sa.Float(), nullable=False),
+            sa.Column("sum_sq", sa.Float(), nullable=False),
+            sa.Column("first_timestamp", sa.DateTime(), nullable=False),
+            sa.Column("last_timestamp", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("type", "zone_id", "bucket_start"),
+        )
+
+        # Backfill depuis les indicateurs existants
+        op.execute(f"""
+            INSERT INTO {table}
+                (type, zone_id, bucket_start, count, sum, min, max, sum_sq, first_timestamp, last_timestamp)
+            SELECT type, zone_id, strftime('{bucket_format}', timestamp),
+                   COUNT(*), SUM(value), MIN(value), MAX(value), SUM(value * value),
+                   MIN(timestamp), MAX(timestamp)
+            FROM indicators
+            WHERE zone_id IS NOT NULL AND value IS NOT NULL AND timestamp IS NOT NULL
+            GROUP BY type, zone_id, strftime('{bucket_format}', timestamp)
+        """)
+
+
+def downgrade():
+    for table in ROLLUP_TABLES:
+        op.drop_table(table)
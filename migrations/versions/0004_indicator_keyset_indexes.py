@@ -0,0 +1,31 @@
+"""Index (…, timestamp, id) pour la pagination par curseur de /indicators/
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 11:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Pagination filtrée par type ou par zone, triée par (timestamp, id)
+    op.create_index("ix_indicators_type_ts", "indicators", ["type", "timestamp", "id"])
+    op.create_index("ix_indicators_zone_ts", "indicators", ["zone_id", "timestamp", "id"])
+
+    # Les agrégats par type sont lus dans les tables de rollups : l'index couvrant n'est plus utile
+    op.drop_index("ix_indicators_type_ts_cover", table_name="indicators")
+
+
+def downgrade():
+    op.create_index("ix_indicators_type_ts_cover", "indicators", ["type", "timestamp", "zone_id", "value"])
+    op.drop_index("ix_indicators_zone_ts", table_name="indicators")
+    op.drop_index("ix_indicators_type_ts", table_name="indicators")
@@ -0,0 +1,28 @@
+"""Identifiants d'indicateurs jamais réutilisés (AUTOINCREMENT) pour l'archive colonnaire
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 13:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Les lignes archivées sont supprimées de la table : sans AUTOINCREMENT, SQLite pourrait
+    # réattribuer leurs id et créer des doublons entre la table et l'archive
+    with op.batch_alter_table("indicators", recreate="always", table_kwargs={"sqlite_autoincrement": True}):
+        pass
+
+
+def downgrade():
+    with op.batch_alter_table("indicators", recreate="always", table_kwargs={"sqlite_autoincrement": False}):
+        pass
@@ -0,0 +1,78 @@
+"""Blobs additional_data dédupliqués dans indicator_metadata, référencés par indicators.metadata_id
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 15:00:00
+
+"""
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+INSERT_BATCH_SIZE = 1000
+
+
+def upgrade():
+    op.create_table(
+        "indicator_metadata",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("hash", sa.String(length=64), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_indicator_metadata_hash", "indicator_metadata", ["hash"], unique=True)
+
+    with op.batch_alter_table("indicators", recreate="always", table_kwargs={"sqlite_autoincrement": True}) as batch_op:
+        batch_op.add_column(sa.Column("metadata_id", sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            "fk_indicators_metadata_id", "indicator_metadata", ["metadata_id"], ["id"]
+        )
+
+    # Un blob par contenu distinct, puis rattachement des indicateurs via un index temporaire sur le contenu
+    bind = op.get_bind()
+    contents = bind.execute(sa.text(
+        "SELECT DISTINCT additional_data FROM indicators WHERE additional_data IS NOT NULL"
+    )).scalars().all()
+    insert = sa.text("INSERT INTO indicator_metadata (hash, content) VALUES (:hash, :content)")
+    for offset in range(0, len(contents), INSERT_BATCH_SIZE):
+        bind.execute(insert, [
+            {"hash": hashlib.sha256(content.encode("utf-8")).hexdigest(), "content": content}
+            for content in contents[offset:offset + INSERT_BATCH_SIZE]
+        ])
+    op.create_index("tmp_ix_indicator_metadata_content", "indicator_metadata", ["content"])
+    op.execute(
+        "UPDATE indicators SET metadata_id = ("
+        "SELECT m.id FROM indicator_metadata m WHERE m.content = indicators.additional_data"
+        ") WHERE additional_data IS NOT NULL"
+    )
+    op.drop_index("tmp_ix_indicator_metadata_content", table_name="indicator_metadata")
+
+    # L'espace libéré n'est rendu au système de fichiers qu'après un VACUUM (voir README)
+    with op.batch_alter_table("indicators", recreate="always", table_kwargs={"sqlite_autoincrement": True}) as batch_op:
+        batch_op.drop_column("additional_data")
+
+
+def downgrade():
+    with op.batch_alter_table("indicators", recreate="always", table_kwargs={"sqlite_autoincrement": True}) as batch_op:
+        batch_op.add_column(sa.Column("additional_data", sa.Text(), nullable=True))
+
+    op.execute(
+        "UPDATE indicators SET additional_data = ("
+        "SELECT m.content FROM indicator_metadata m WHERE m.id = indicators.metadata_id"
+        ") WHERE metadata_id IS NOT NULL"
+    )
+
+    with op.batch_alter_table("indicators", recreate="always", table_kwargs={"sqlite_autoincrement": True}) as batch_op:
+        batch_op.drop_constraint("fk_indicators_metadata_id", type_="foreignkey")
+        batch_op.drop_column("metadata_id")
+
+    op.drop_index("ix_indicator_metadata_hash", table_name="indicator_metadata")
+    op.drop_table("indicator_metadata")
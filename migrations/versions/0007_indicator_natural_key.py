@@ -0,0 +1,68 @@
+"""Clé naturelle unique (zone_id, source_id, type, timestamp) sur les indicateurs
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 16:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+ROLLUP_TABLES = {
+    "indicator_rollups_hourly": "%Y-%m-%d %H:00:00.000000",
+    "indicator_rollups_daily": "%Y-%m-%d 00:00:00.000000",
+}
+KEY_FILTER = "zone_id IS NOT NULL AND source_id IS NOT NULL AND type IS NOT NULL AND timestamp IS NOT NULL"
+
+
+def upgrade():
+    # Doublons existants : la ligne d'id le plus petit est conservée pour chaque clé
+    op.execute(f"""
+        CREATE TEMP TABLE duplicate_indicators AS
+        SELECT id, type, zone_id, timestamp FROM indicators
+        WHERE {KEY_FILTER} AND id NOT IN (
+            SELECT MIN(id) FROM indicators WHERE {KEY_FILTER}
+            GROUP BY zone_id, source_id, type, timestamp
+        )
+    """)
+    bind = op.get_bind()
+    duplicates = bind.execute(sa.text("SELECT COUNT(*) FROM duplicate_indicators")).scalar()
+    if duplicates:
+        print(f"🧹 {duplicates} indicateurs en double supprimés")
+        op.execute("DELETE FROM indicators WHERE id IN (SELECT id FROM duplicate_indicators)")
+        # Agrégats des seaux touchés recalculés depuis les lignes restantes
+        for table, bucket_format in ROLLUP_TABLES.items():
+            affected = f"""
+                SELECT DISTINCT type, zone_id, strftime('{bucket_format}', timestamp) AS bucket_start
+                FROM duplicate_indicators
+            """
+            op.execute(f"""
+                DELETE FROM {table} WHERE (type, zone_id, bucket_start) IN ({affected})
+            """)
+            op.execute(f"""
+                INSERT INTO {table}
+                    (type, zone_id, bucket_start, count, sum, min, max, sum_sq, first_timestamp, last_timestamp)
+                SELECT type, zone_id, strftime('{bucket_format}', timestamp),
+                       COUNT(*), SUM(value), MIN(value), MAX(value), SUM(value * value),
+                       MIN(timestamp), MAX(timestamp)
+                FROM indicators
+                WHERE value IS NOT NULL
+                  AND (type, zone_id, strftime('{bucket_format}', timestamp)) IN ({affected})
+                GROUP BY type, zone_id, strftime('{bucket_format}', timestamp)
+            """)
+    op.execute("DROP TABLE duplicate_indicators")
+
+    op.create_index(
+        "uq_indicators_natural_key", "indicators", ["zone_id", "source_id", "type", "timestamp"], unique=True
+    )
+
+
+def downgrade():
+    op.drop_index("uq_indicators_natural_key", table_name="indicators")
@@ -0,0 +1,31 @@
+"""Horodatages de reprise de l'ingestion par fournisseur et par zone
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 17:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ingestion_watermarks",
+        sa.Column("provider", sa.String(), nullable=False),
+        sa.Column("zone_id", sa.Integer(), nullable=False),
+        sa.Column("last_timestamp", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("provider", "zone_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("ingestion_watermarks")
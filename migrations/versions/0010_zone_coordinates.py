@@ -0,0 +1,48 @@
+"""Coordonnées lat/lon des zones, extraites de la géométrie GeoJSON
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 19:00:00
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def _point(geometry):
+    # Même règle que app.geometry.representative_point au moment de la migration
+    try:
+        geom = json.loads(geometry)
+        coords = geom.get("coordinates") or []
+        if geom.get("type", "Point") == "Point" and len(coords) >= 2:
+            return float(coords[1]), float(coords[0])
+    except (AttributeError, TypeError, ValueError):
+        pass
+    return None
+
+
+def upgrade():
+    op.add_column("zones", sa.Column("lat", sa.Float(), nullable=True))
+    op.add_column("zones", sa.Column("lon", sa.Float(), nullable=True))
+
+    bind = op.get_bind()
+    zones = bind.execute(sa.text("SELECT id, geometry FROM zones WHERE geometry IS NOT NULL")).all()
+    points = [(zone_id, _point(geometry)) for zone_id, geometry in zones]
+    updates = [{"id": zone_id, "lat": point[0], "lon": point[1]} for zone_id, point in points if point]
+    if updates:
+        bind.execute(sa.text("UPDATE zones SET lat = :lat, lon = :lon WHERE id = :id"), updates)
+
+
+def downgrade():
+    with op.batch_alter_table("zones") as batch_op:
+        batch_op.drop_column("lon")
+        batch_op.drop_column("lat")
@@ -0,0 +1,41 @@
+"""Coordonnées lat/lon des zones décrites par un Polygon ou un MultiPolygon
+
+0010 n'a rempli lat/lon que pour les géométries Point : les zones polygonales existantes
+reçoivent ici le centroïde calculé par le hook d'écriture des zones.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 20:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.geometry import POLYGON_TYPES, parse_geometry, representative_point
+
+
+# revision identifiers, used by Alembic.
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    zones = bind.execute(sa.text("SELECT id, geometry FROM zones WHERE geometry IS NOT NULL")).all()
+    updates = []
+    for zone_id, geometry in zones:
+        geom = parse_geometry(geometry)
+        if geom is None or geom.get("type") not in POLYGON_TYPES:
+            continue
+        point = representative_point(geom)
+        if point:
+            updates.append({"id": zone_id, "lat": point[0], "lon": point[1]})
+    if updates:
+        bind.execute(sa.text("UPDATE zones SET lat = :lat, lon = :lon WHERE id = :id"), updates)
+
+
+def downgrade():
+    # Coordonnées dérivées de geometry : rien à restaurer, le hook les recalcule à l'écriture
+    pass
@@ -0,0 +1,45 @@
+import argparse
+import sys
+import os
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.database import SessionLocal, run_migrations
+from app import archive
+
+
+def archive_indicators(before=None):
+    """Déplace les indicateurs des mois clos vers l'archive colonnaire (data/archive)"""
+    print(f"🗄️ Archivage des mois clos dans {settings.ARCHIVE_DIR}...")
+    run_migrations()
+    db = SessionLocal()
+
+    try:
+        started = time.perf_counter()
+        stats = archive.archive_closed_months(db, before)
+        print(f"✅ {stats['rows']} indicateurs archivés ({stats['series_months']} séries-mois) "
+              f"en {time.perf_counter() - started:.2f}s")
+        return True
+
+    except Exception as e:
+        print(f"❌ Erreur lors de l'archivage: {e}")
+        return False
+
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive les indicateurs des mois clos")
+    parser.add_argument(
+        "--before",
+        type=lambda value: datetime.strptime(value, "%Y-%m"),
+        help="archive les mois antérieurs à ce mois (AAAA-MM, par défaut le mois en cours)"
+    )
+    args = parser.parse_args()
+
+    if not archive_indicators(args.before):
+        sys.exit(1)
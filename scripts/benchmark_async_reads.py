@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Base jetable : le benchmark ne touche pas à data/ecotrack.db
+_tmp_dir = tempfile.mkdtemp(prefix="ecotrack-async-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import async_crud, crud
+from app.database import SessionLocal, async_read_engine, get_async_read_db, get_read_db, run_migrations
+from app.models import Source, User, Zone
+
+TYPES = ("temperature", "air_quality_pm25", "air_quality_pm10")
+ZONES = 5
+
+
+def seed(rows):
+    run_migrations()
+    db = SessionLocal()
+    try:
+        if db.query(User).count():
+            return
+        db.add(User(id=1, email="bench@ecotrack.com", full_name="Bench", role="admin"))
+        db.add_all([Zone(id=zone_id, name=f"Zone {zone_id}") for zone_id in range(1, ZONES + 1)])
+        db.add(Source(id=1, name="Bench"))
+        db.commit()
+        start = datetime(2024, 1, 1)
+        crud.bulk_create_indicators(db, [
+            {
+                "type": TYPES[i % len(TYPES)], "value": float(i % 97), "unit": "u",
+                "timestamp": start + timedelta(seconds=60 * i),
+                "zone_id": 1 + i % ZONES, "source_id": 1, "user_id": 1,
+            }
+            for i in range(rows)
+        ])
+    finally:
+        db.close()
+
+
+def build_app():
+    """Mêmes lectures servies par une route synchrone (threadpool) et une route async (aiosqlite)"""
+    app = FastAPI()
+
+    @app.get("/sync/indicators")
+    def sync_indicators(type: str, zone_id: int, db: Session = Depends(get_read_db)):
+        return len(crud.get_indicators(db, type=type, zone_id=zone_id, limit=100))
+
+    @app.get("/async/indicators")
+    async def async_indicators(type: str, zone_id: int, db: AsyncSession = Depends(get_async_read_db)):
+        return len(await async_crud.get_indicators(db, type=type, zone_id=zone_id, limit=100))
+
+    @app.get("/sync/zones")
+    def sync_zones(db: Session = Depends(get_read_db)):
+        return len(crud.get_zones(db))
+
+    @app.get("/async/zones")
+    async def async_zones(db: AsyncSession = Depends(get_async_read_db)):
+        return len(await async_crud.get_zones(db))
+
+    return app
+
+
+async def run_load(client, path, requests_count, concurrency):
+    latencies = []
+    queue = iter(range(requests_count))
+
+    async def worker():
+        for i in queue:
+            params = {"type": TYPES[i % len(TYPES)], "zone_id": 1 + i % ZONES} if "indicators" in path else None
+            began = time.perf_counter()
+            response = await client.get(path, params=params)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - began)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests_per_second": round(requests_count / duration, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+    }
+
+
+async def benchmark(requests_count, concurrency_levels):
+    print(f"⏱️ Lectures synchrones vs async : {requests_count} requêtes par mesure")
+    transport = httpx.ASGITransport(app=build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for endpoint in ("indicators", "zones"):
+            # Préchauffage des pools de connexions
+            await run_load(client, f"/sync/{endpoint}", 50, 10)
+            await run_load(client, f"/async/{endpoint}", 50, 10)
+            for concurrency in concurrency_levels:
+                sync_result = await run_load(client, f"/sync/{endpoint}", requests_count, concurrency)
+                async_result = await run_load(client, f"/async/{endpoint}", requests_count, concurrency)
+                gain = async_result["requests_per_second"] / sync_result["requests_per_second"]
+                print(f"\n📊 /{endpoint}, {concurrency} clients simultanés (x{gain:.2f})")
+                print(f"   sync  : {sync_result['requests_per_second']} req/s, "
+                      f"p50 {sync_result['p50_ms']} ms, p95 {sync_result['p95_ms']} ms")
+                print(f"   async : {async_result['requests_per_second']} req/s, "
+                      f"p50 {async_result['p50_ms']} ms, p95 {async_result['p95_ms']} ms")
+    await async_read_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Débit des routes de lecture synchrones et async")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 500])
+    args = parser.parse_args()
+
+    seed(args.rows)
+    asyncio.run(benchmark(args.requests, args.concurrency))
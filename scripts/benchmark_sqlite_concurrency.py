@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROFILES = ("basic", "production")
+TYPES = ("temperature", "air_quality_pm25", "air_quality_pm10")
+ZONES = 5
+
+
+def make_rows(count, start, offset=0):
+    return [
+        {
+            "type": TYPES[i % len(TYPES)], "value": float(i % 97), "unit": "u",
+            "timestamp": start + timedelta(seconds=30 * (offset + i)),
+            "zone_id": 1 + i % ZONES, "source_id": 1, "user_id": 1,
+        }
+        for i in range(count)
+    ]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_profile(seed_rows, write_rows, readers):
+    """
+    Exécuté dans un sous-processus (profil fixé par l'environnement) :
+    une écriture en masse tourne pendant que des lecteurs enchaînent des requêtes GET.
+    """
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+    from app import crud
+    from app.core.config import settings
+    from app.database import ReadSessionLocal, SessionLocal, run_migrations
+    from app.models import Source, User, Zone
+
+    run_migrations()
+    db = SessionLocal()
+    db.add(User(id=1, email="bench@ecotrack.com", full_name="Bench", role="admin"))
+    db.add_all([Zone(id=zone_id, name=f"Zone {zone_id}") for zone_id in range(1, ZONES + 1)])
+    db.add(Source(id=1, name="Bench"))
+    db.commit()
+
+    start = datetime(2024, 1, 1)
+    for offset in range(0, seed_rows, settings.CSV_BATCH_SIZE):
+        crud.bulk_create_indicators(db, make_rows(min(settings.CSV_BATCH_SIZE, seed_rows - offset), start, offset))
+    db.close()
+
+    writing = threading.Event()
+    writing.set()
+    write_stats = {}
+    lock = threading.Lock()
+    latencies = []
+    errors = {"locked": 0, "timeout": 0}
+
+    def writer():
+        session = SessionLocal()
+        started = time.perf_counter()
+        try:
+            for offset in range(0, write_rows, settings.CSV_BATCH_SIZE):
+                crud.bulk_create_indicators(
+                    session,
+                    make_rows(min(settings.CSV_BATCH_SIZE, write_rows - offset), start, seed_rows + offset)
+                )
+        finally:
+            write_stats["duration_seconds"] = time.perf_counter() - started
+            session.close()
+            writing.clear()
+
+    def reader(index):
+        local = []
+        while writing.is_set():
+            session = ReadSessionLocal()
+            began = time.perf_counter()
+            try:
+                crud.get_indicators(session, type=TYPES[index % len(TYPES)], zone_id=1 + index % ZONES, limit=100)
+                local.append(time.perf_counter() - began)
+            except OperationalError:
+                with lock:
+                    errors["locked"] += 1
+            except PoolTimeoutError:
+                with lock:
+                    errors["timeout"] += 1
+            finally:
+                session.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    write_thread = threading.Thread(target=writer)
+    write_thread.start()
+    for thread in threads:
+        thread.start()
+    write_thread.join()
+    for thread in threads:
+        thread.join()
+
+    duration = write_stats["duration_seconds"]
+    return {
+        "profile": settings.SQLITE_PROFILE,
+        "write_seconds": round(duration, 3),
+        "write_rows_per_second": round(write_rows / duration, 1),
+        "reads": len(latencies),
+        "reads_per_second": round(len(latencies) / duration, 1),
+        "read_p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "read_p95_ms": round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        "read_max_ms": round(max(latencies) * 1000, 2) if latencies else None,
+        "locked_errors": errors["locked"],
+        "pool_timeouts": errors["timeout"],
+    }
+
+
+def benchmark(seed_rows, write_rows, readers):
+    """Compare les profils SQLite, chacun dans un processus et sur une base neuve"""
+    print(f"⏱️ Lectures concurrentes pendant l'écriture de {write_rows} lignes "
+          f"({readers} lecteurs, {seed_rows} lignes initiales)")
+    results = []
+    for profile in PROFILES:
+        tmp_dir = tempfile.mkdtemp(prefix=f"ecotrack-bench-{profile}-")
+        env = dict(
+            os.environ,
+            SQLITE_PROFILE=profile,
+            DATABASE_URL=f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}",
+        )
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child",
+             "--seed-rows", str(seed_rows), "--write-rows", str(write_rows), "--readers", str(readers)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    for result in results:
+        print(f"\n📊 Profil {result['profile']}")
+        print(f"   Écriture : {result['write_seconds']}s ({result['write_rows_per_second']} lignes/s)")
+        print(f"   Lectures : {result['reads']} ({result['reads_per_second']}/s), "
+              f"p50 {result['read_p50_ms']} ms, p95 {result['read_p95_ms']} ms, max {result['read_max_ms']} ms")
+        print(f"   Erreurs  : {result['locked_errors']} 'database is locked', {result['pool_timeouts']} attentes de pool")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Débit de lecture pendant une écriture en masse, par profil SQLite")
+    parser.add_argument("--seed-rows", type=int, default=50000)
+    parser.add_argument("--write-rows", type=int, default=200000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_profile(args.seed_rows, args.write_rows, args.readers)))
+    else:
+        benchmark(args.seed_rows, args.write_rows, args.readers)
@@ -0,0 +1,18 @@
+import sys
+import os
+
+import pytest
+
+# Les plans sont vérifiés par tests/test_query_plans.py (base jetable issue des migrations) ;
+# ce script lance ce seul test et affiche les plans
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+if __name__ == "__main__":
+    print("🔍 Vérification des plans de requête (EXPLAIN QUERY PLAN)...")
+    exit_code = pytest.main(["-q", "-s", "--rootdir", ROOT, os.path.join(ROOT, "tests", "test_query_plans.py")])
+    if exit_code == 0:
+        print("🎉 Toutes les requêtes utilisent un index")
+    else:
+        print("💡 Ajoutez un index adapté via une migration Alembic (migrations/versions)")
+    sys.exit(exit_code)
@@ -1,20 +1,108 @@
 import requests
+from requests.adapters import HTTPAdapter
 from sqlalchemy.orm import Session
-from datetime import datetime, timedelta
-import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import argparse
+import threading
 import sys
 import os
 import json
 
+import numpy as np
+
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from app.core.config import settings
 from app.database import SessionLocal
-from app.models import Indicator, Zone, Source
-
-
-def ingest_weather_data():
-    """Ingère les données météorologiques réelles depuis OpenMeteo"""
-    db = SessionLocal()
+from app import crud
+from app.models import Zone, Source
+from app.metrics import metrics
+from app.spatial import zone_index
+from scripts.http_cache import http_cache
+from scripts.provider_fixtures import FixtureRecorder
+
+OPENMETEO_FORECAST_URL = f"{settings.PROVIDER_BASE_URLS['openmeteo']}/v1/forecast"
+OPENMETEO_ARCHIVE_URL = f"{settings.PROVIDER_BASE_URLS['openmeteo_archive']}/v1/archive"
+WAQI_FEED_URL = settings.PROVIDER_BASE_URLS["waqi"] + "/feed/geo:{lat};{lon}/"
+DATAGOUV_DATASETS_URL = f"{settings.PROVIDER_BASE_URLS['datagouv']}/api/1/datasets/"
+# Historique servi par l'API de prévision (au-delà : API d'archive)
+FORECAST_MAX_PAST_DAYS = 92
+# Période lue lors de la première ingestion d'une zone
+DEFAULT_PAST_DAYS = 7
+# Fournisseur des horodatages de reprise (table ingestion_watermarks)
+WEATHER_PROVIDER = "openmeteo"
+# Variables horaires Open-Meteo : (variable, type d'indicateur, unité)
+WEATHER_VARIABLES = (
+    ("temperature_2m", "temperature", "°C"),
+    ("relative_humidity_2m", "humidity", "%"),
+    ("wind_speed_10m", "wind_speed", "km/h"),
+    ("pressure_msl", "pressure", "hPa"),
+)
+
+# Enregistrement des réponses pour le serveur de rejeu (benchmarks/provider_stub.py)
+provider_recorder = FixtureRecorder(settings.PROVIDER_RECORD_DIR) if settings.PROVIDER_RECORD_DIR else None
+
+# Sessions HTTP keep-alive partagées, une par fournisseur
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+
+def get_http_session(provider):
+    """Retourne la session HTTP poolée du fournisseur (connexions réutilisées entre les zones)"""
+    with _http_sessions_lock:
+        session = _http_sessions.get(provider)
+        if session is None:
+            pool_size = settings.INGESTION_CONCURRENCY[provider]
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_sessions[provider] = session
+        return session
+
+
+def cached_get(provider, url, params, timeout):
+    """
+    GET d'un fournisseur via le cache disque des réponses (HTTP_CACHE_ENABLED), sinon requête directe.
+    Avec PROVIDER_RECORD_DIR, la réponse est aussi enregistrée comme fixture de rejeu.
+    """
+    session = get_http_session(provider)
+    if not settings.HTTP_CACHE_ENABLED:
+        response = session.get(url, params=params, timeout=timeout)
+    else:
+        response = http_cache.get(session, provider, url, params, timeout=timeout)
+    metrics.provider_request(provider, response.status_code)
+    if provider_recorder is not None:
+        provider_recorder.record(provider, url, params, response)
+    return response
+
+
+def fetch_concurrently(provider, fetch, jobs):
+    """
+    Exécute fetch(*args) pour chaque (clé, args) de jobs en parallèle,
+    avec au plus INGESTION_CONCURRENCY[provider] requêtes simultanées.
+    Retourne un dictionnaire {clé: résultat}.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return {}
+
+    max_workers = min(settings.INGESTION_CONCURRENCY[provider], len(jobs))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"fetch-{provider}") as pool:
+        futures = {key: pool.submit(fetch, *args) for key, args in jobs}
+        return {key: future.result() for key, future in futures.items()}
+
+
+def ingest_weather_data(start_date=None, end_date=None):
+    """
+    Ingère les mesures horaires réelles depuis OpenMeteo.
+    Sans dates : reprend chaque zone après sa dernière heure ingérée (ou sur les DEFAULT_PAST_DAYS
+    derniers jours). Avec start_date (et end_date, aujourd'hui par défaut) : rattrapage de la période.
+    Toutes les heures reçues sont insérées, une transaction par zone.
+    """
+    # Objets conservés après commit : la connexion d'écriture est rendue pendant les appels réseau
+    db = SessionLocal(expire_on_commit=False)
 
     try:
         zones = db.query(Zone).all()
@@ -24,76 +112,60 @@ def ingest_weather_data():
             print("❌ Source OpenMeteo non trouvée")
             return 0
 
-        created = 0
+        # Récupération des données de toutes les zones en parallèle
+        zones_coords = collect_zone_coordinates(zones)
+        watermarks = crud.get_ingestion_watermarks(db, WEATHER_PROVIDER)
+
+        # Fin de la lecture : libère l'écrivain unique avant les requêtes HTTP
+        db.commit()
+
+        today = datetime.utcnow().date()
+        end_date = end_date or today
+        ranges = {}
+        for zone_id in zones_coords:
+            if start_date:
+                ranges[zone_id] = (start_date, end_date)
+            elif zone_id in watermarks:
+                ranges[zone_id] = (watermarks[zone_id].date(), end_date)
+            else:
+                ranges[zone_id] = (today - timedelta(days=DEFAULT_PAST_DAYS), end_date)
 
-        for zone in zones:
-            print(f"🌤️ Récupération météo pour {zone.name}...")
+        print(f"🌤️ Récupération météo pour {len(zones_coords)} zones...")
+        responses = fetch_concurrently(
+            "openmeteo",
+            fetch_weather_data,
+            ((zone_id, (coords['lat'], coords['lon'], *ranges[zone_id])) for zone_id, coords in zones_coords.items())
+        )
 
-            coords = get_zone_coordinates(zone)
-            if not coords:
-                print(f"⚠️ Coordonnées non trouvées pour {zone.name}")
+        created = 0
+        for zone in zones:
+            if zone.id not in zones_coords:
                 continue
-
-            # Récupération données
-            weather_data = fetch_weather_data(coords['lat'], coords['lon'])
+            coords = zones_coords[zone.id]
+            weather_data = responses[zone.id]
 
             if not weather_data:
                 print(f"⚠️ Aucune donnée météo disponible pour {zone.name}")
                 continue
 
-            # Index de la dernière valeur (timestamp le plus récent)
-            last_index = len(weather_data["time"]) - 1
-
-            # Extraire les valeurs météo RÉELLES (dernier point uniquement)
-            last_temperature = weather_data["temperature_2m"][last_index]
-            last_humidity = weather_data["relative_humidity_2m"][last_index]
-            last_wind = weather_data["wind_speed_10m"][last_index]
-            last_pressure = weather_data["pressure_msl"][last_index]
-
-            # timestamp fourni par Open-Meteo
-            timestamp = datetime.fromisoformat(weather_data["time"][last_index])
-
-            # Vérifier si cette mesure existe déjà
-            exists = db.query(Indicator).filter(
-                Indicator.zone_id == zone.id,
-                Indicator.timestamp == timestamp,
-                Indicator.source_id == meteo_source.id
-            ).first()
-
-            if exists:
-                print(f"ℹ️ Donnée météo déjà présente pour {zone.name} ({timestamp})")
+            # En rattrapage, les heures antérieures au dernier horodatage sont aussi reprises
+            rows, last_timestamp = weather_rows(
+                weather_data, zone.id, meteo_source.id, coords,
+                after=None if start_date else watermarks.get(zone.id)
+            )
+            if not rows:
+                print(f"ℹ️ Aucune nouvelle heure météo pour {zone.name}")
                 continue
 
-            # Créer les indicateurs
-            indicators_to_add = [
-                ("temperature", last_temperature, "°C"),
-                ("humidity", last_humidity, "%"),
-                ("wind_speed", last_wind, "km/h"),
-                ("pressure", last_pressure, "hPa"),
-            ]
-
-            for type_, value_, unit_ in indicators_to_add:
-                indicator = Indicator(
-                    type=type_,
-                    value=value_,
-                    unit=unit_,
-                    timestamp=timestamp,
-                    zone_id=zone.id,
-                    source_id=meteo_source.id,
-                    user_id=1,
-                    additional_data=json.dumps({
-                        "source": "open-meteo",
-                        "coordinates": {"lat": coords['lat'], "lon": coords['lon']}
-                    })
-                )
-
-                db.add(indicator)
-                created += 1
-                print(f"  ✅ {type_}: {value_} {unit_}")
-
-        # Commit final
+            # Le commit de bulk_create_indicators valide aussi le nouvel horodatage de la zone
+            # (inchangé tant qu'aucune heure n'est complète)
+            if last_timestamp is not None:
+                crud.set_ingestion_watermark(db, WEATHER_PROVIDER, zone.id, last_timestamp)
+            zone_created = crud.bulk_create_indicators(db, rows)
+            created += zone_created
+            print(f"  ✅ {zone.name}: {zone_created} mesures créées ({len(rows)} reçues, jusqu'à {last_timestamp})")
+
         if created > 0:
-            db.commit()
             print(f"✅ {created} données météo créées")
         else:
             print("ℹ️ Aucune nouvelle donnée météo créée")
@@ -108,20 +180,86 @@ def ingest_weather_data():
     finally:
         db.close()
 
-def fetch_weather_data(lat, lon):
-    """Récupère les données météorologiques (courantes et historiques) depuis OpenMeteo"""
-    url = "https://api.open-meteo.com/v1/forecast"
 
+def weather_rows(weather_data, zone_id, source_id, coords, after=None):
+    """
+    Convertit les tableaux horaires d'une réponse Open-Meteo en lignes d'indicateurs, colonne par
+    colonne avec NumPy : heures de prévision (postérieures à l'heure locale actuelle), valeurs
+    manquantes (NaN) et heures déjà ingérées (<= after) sont écartées.
+    Retourne (lignes, dernière heure retenue où toutes les variables sont présentes) : une variable
+    encore absente sur les dernières heures est reprise au passage suivant.
+    """
+    hourly = weather_data["hourly"]
+    times = np.array(hourly["time"], dtype="datetime64[m]")
+    # Les heures sont exprimées dans le fuseau de la zone (timezone=auto)
+    local_now = datetime.utcnow() + timedelta(seconds=weather_data.get("utc_offset_seconds", 0))
+    keep = times <= np.datetime64(local_now, "m")
+    if after is not None:
+        keep &= times > np.datetime64(after, "m")
+
+    additional_data = json.dumps({"source": "open-meteo", "coordinates": {"lat": coords['lat'], "lon": coords['lon']}})
+    rows = []
+    complete = keep.copy()
+    for variable, type_, unit_ in WEATHER_VARIABLES:
+        # None (valeur absente) devient NaN
+        values = np.array(hourly.get(variable) or [], dtype=np.float64)
+        if len(values) != len(times):
+            complete[:] = False
+            continue
+        present = ~np.isnan(values)
+        complete &= present
+        mask = keep & present
+        timestamps = times[mask].astype("datetime64[us]").tolist()
+        rows.extend(
+            indicator_row(type_, value_, unit_, timestamp, zone_id, source_id, additional_data)
+            for timestamp, value_ in zip(timestamps, values[mask].tolist())
+        )
+    last_timestamp = times[complete].max().astype("datetime64[us]").item() if complete.any() else None
+    return rows, last_timestamp
+
+
+def fetch_weather_data(lat, lon, start_date, end_date):
+    """
+    Récupère les mesures horaires OpenMeteo du start_date au end_date inclus : API d'archive pour
+    les jours hors de la fenêtre de l'API de prévision (FORECAST_MAX_PAST_DAYS), API de prévision
+    ensuite. Retourne {"hourly": ..., "utc_offset_seconds": ...} ou None.
+    """
+    forecast_start = datetime.utcnow().date() - timedelta(days=FORECAST_MAX_PAST_DAYS)
+    plan = []
+    if start_date < forecast_start:
+        plan.append((OPENMETEO_ARCHIVE_URL, start_date, min(end_date, forecast_start - timedelta(days=1))))
+    if end_date >= forecast_start:
+        plan.append((OPENMETEO_FORECAST_URL, max(start_date, forecast_start), end_date))
+
+    responses = [data for data in (request_weather_data(url, lat, lon, *dates) for url, *dates in plan) if data]
+    if not responses:
+        return None
+    # Concaténation des réponses ; une variable absente d'une réponse compte comme manquante (None)
+    hourly = {"time": [t for data in responses for t in data["hourly"]["time"]]}
+    for variable, _, _ in WEATHER_VARIABLES:
+        hourly[variable] = [
+            value for data in responses
+            for value in data["hourly"].get(variable) or [None] * len(data["hourly"]["time"])
+        ]
+    return {
+        "hourly": hourly,
+        "utc_offset_seconds": responses[-1].get("utc_offset_seconds", 0),
+    }
+
+
+def request_weather_data(url, lat, lon, start_date, end_date):
+    """Une requête OpenMeteo (prévision ou archive) sur une plage de jours"""
     params = {
         "latitude": lat,
         "longitude": lon,
-        "hourly": "temperature_2m,relative_humidity_2m,wind_speed_10m,pressure_msl",
-        "past_days": 7,
+        "hourly": ",".join(variable for variable, _, _ in WEATHER_VARIABLES),
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
         "timezone": "auto"
     }
 
     try:
-        response = requests.get(url, params=params, timeout=15)
+        response = cached_get("openmeteo", url, params, timeout=30)
 
         if response.status_code == 200:
             data = response.json()
@@ -129,7 +267,7 @@ def fetch_weather_data(lat, lon):
 
             # Vérifier qu’on a des listes valides
             if hourly and "time" in hourly:
-                return hourly
+                return data
             else:
                 print("⚠️ Aucune donnée météo valide")
                 return None
@@ -143,7 +281,8 @@ def fetch_weather_data(lat, lon):
 
 def ingest_air_quality_data():
     """Ingère les données de qualité d'air réelles depuis WAQI"""
-    db = SessionLocal()
+    # Objets conservés après commit : la connexion d'écriture est rendue pendant les appels réseau
+    db = SessionLocal(expire_on_commit=False)
 
     try:
         zones = db.query(Zone).all()
@@ -159,99 +298,57 @@ def ingest_air_quality_data():
             db.commit()
             db.refresh(waqi_source)
 
-        created = 0
+        # Récupération des données de toutes les zones en parallèle
+        # (le débit vers WAQI est borné par INGESTION_CONCURRENCY["waqi"])
+        zones_coords = collect_zone_coordinates(zones)
 
-        for zone in zones:
-            print(f"🌫️ Récupération qualité air pour {zone.name}...")
+        # Fin de la lecture : libère l'écrivain unique avant les requêtes HTTP
+        db.commit()
 
-            coords = get_zone_coordinates(zone)
-            if not coords:
-                print(f"⚠️ Coordonnées non trouvées pour {zone.name}")
-                continue
+        print(f"🌫️ Récupération qualité air pour {len(zones_coords)} zones...")
+        responses = fetch_concurrently(
+            "waqi",
+            fetch_waqi_data,
+            ((zone_id, (coords['lat'], coords['lon'])) for zone_id, coords in zones_coords.items())
+        )
 
-            air_quality_data = fetch_waqi_data(coords['lat'], coords['lon'])
+        # La station renvoyée est la plus proche du point demandé : sa mesure va à la zone qui
+        # la contient, à défaut à la zone interrogée
+        station_zones = locate_stations(db, responses)
 
-            if not air_quality_data:
-                print(f"⚠️ Aucune donnée qualité air disponible pour {zone.name}")
+        rows = []
+        for zone in zones:
+            if zone.id not in zones_coords:
                 continue
+            coords = zones_coords[zone.id]
+            air_quality_data = responses[zone.id]
 
-            current_time = datetime.utcnow()
-
-            # Vérifier si on a déjà des données récentes (1 heure)
-            recent_data = db.query(Indicator).filter(
-                Indicator.zone_id == zone.id,
-                Indicator.type.like("air_quality_%"),
-                Indicator.timestamp >= current_time - timedelta(hours=1)
-            ).first()
-
-            if recent_data:
-                print(f"ℹ️ Données qualité air déjà à jour pour {zone.name}")
+            if not air_quality_data:
+                print(f"⚠️ Aucune donnée qualité air disponible pour {zone.name}")
                 continue
 
-            # PM2.5
-            if 'pm25' in air_quality_data:
-                indicator = Indicator(
-                    type="air_quality_pm25",
-                    value=air_quality_data['pm25'],
-                    unit="µg/m³",
-                    timestamp=current_time,
-                    zone_id=zone.id,
-                    source_id=waqi_source.id,
-                    user_id=1,
-                    additional_data=json.dumps({
-                        "source": "waqi",
-                        "station": air_quality_data.get('station_name', ''),
-                        "coordinates": {"lat": coords['lat'], "lon": coords['lon']}
-                    })
-                )
-                db.add(indicator)
-                created += 1
-                print(f"  ✅ PM2.5: {air_quality_data['pm25']} µg/m³")
-
-            # PM10
-            if 'pm10' in air_quality_data:
-                indicator = Indicator(
-                    type="air_quality_pm10",
-                    value=air_quality_data['pm10'],
-                    unit="µg/m³",
-                    timestamp=current_time,
-                    zone_id=zone.id,
-                    source_id=waqi_source.id,
-                    user_id=1,
-                    additional_data=json.dumps({
-                        "source": "waqi",
-                        "station": air_quality_data.get('station_name', ''),
-                        "coordinates": {"lat": coords['lat'], "lon": coords['lon']}
-                    })
-                )
-                db.add(indicator)
-                created += 1
-                print(f"  ✅ PM10: {air_quality_data['pm10']} µg/m³")
-
-            # NO2
-            if 'no2' in air_quality_data:
-                indicator = Indicator(
-                    type="air_quality_no2",
-                    value=air_quality_data['no2'],
-                    unit="µg/m³",
-                    timestamp=current_time,
-                    zone_id=zone.id,
-                    source_id=waqi_source.id,
-                    user_id=1,
-                    additional_data=json.dumps({
-                        "source": "waqi",
-                        "station": air_quality_data.get('station_name', ''),
-                        "coordinates": {"lat": coords['lat'], "lon": coords['lon']}
-                    })
-                )
-                db.add(indicator)
-                created += 1
-                print(f"  ✅ NO2: {air_quality_data['no2']} µg/m³")
-
-            time.sleep(1)
-
+            # Heure de mesure de la station : une même mesure n'est insérée qu'une fois
+            timestamp = air_quality_data.get('time') or current_hour()
+            additional_data = {
+                "source": "waqi",
+                "station": air_quality_data.get('station_name', ''),
+                "coordinates": {"lat": coords['lat'], "lon": coords['lon']}
+            }
+
+            for key, type_, label in (
+                    ('pm25', "air_quality_pm25", "PM2.5"),
+                    ('pm10', "air_quality_pm10", "PM10"),
+                    ('no2', "air_quality_no2", "NO2"),
+            ):
+                if key in air_quality_data:
+                    rows.append(indicator_row(
+                        type_, air_quality_data[key], "µg/m³", timestamp,
+                        station_zones.get(zone.id) or zone.id, waqi_source.id, additional_data
+                    ))
+                    print(f"  ✅ {label}: {air_quality_data[key]} µg/m³")
+
+        created = save_indicators(db, rows)
         if created > 0:
-            db.commit()
             print(f"✅ {created} données qualité air créées")
         else:
             print("ℹ️ Toutes les données qualité air sont déjà à jour")
@@ -268,12 +365,12 @@ def ingest_air_quality_data():
 def fetch_waqi_data(lat, lon):
     """Récupère les données de qualité d'air réelles depuis WAQI"""
     # WAQI offre un token démo limité mais fonctionnel
-    url = f"https://api.waqi.info/feed/geo:{lat};{lon}/"
+    url = WAQI_FEED_URL.format(lat=lat, lon=lon)
 
     params = {"token": "demo"}  # Token public démo
 
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = cached_get("waqi", url, params, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -295,6 +392,8 @@ def fetch_waqi_data(lat, lon):
 
                 if air_quality:
                     air_quality['station_name'] = station_data.get('city', {}).get('name', 'WAQI Station')
+                    air_quality['time'] = parse_station_time(station_data.get('time', {}).get('iso'))
+                    air_quality['geo'] = station_data.get('city', {}).get('geo')
                     print(f"  📡 Données qualité air réelles récupérées")
                     return air_quality
                 else:
@@ -314,7 +413,8 @@ def fetch_waqi_data(lat, lon):
 
 def ingest_energy_data():
     """Tente de récupérer des données énergétiques réelles"""
-    db = SessionLocal()
+    # Objets conservés après commit : la connexion d'écriture est rendue pendant les appels réseau
+    db = SessionLocal(expire_on_commit=False)
 
     try:
         zones = db.query(Zone).all()
@@ -332,74 +432,46 @@ def ingest_energy_data():
             db.commit()
             db.refresh(ademe_source)
 
-        created = 0
+        # Fin de la lecture : libère l'écrivain unique avant les requêtes HTTP
+        db.commit()
 
-        for zone in zones:
-            print(f"⚡ Recherche données énergie pour {zone.name}...")
+        # Tenter de récupérer des données réelles d'énergie pour toutes les zones en parallèle
+        print(f"⚡ Recherche données énergie pour {len(zones)} zones...")
+        responses = fetch_concurrently(
+            "datagouv",
+            fetch_energy_data,
+            ((zone.id, (zone.name,)) for zone in zones)
+        )
+
+        # Valeurs journalières : horodatées au début du jour (une seule par jour et par zone)
+        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
 
-            # Tenter de récupérer des données réelles d'énergie
-            energy_data = fetch_energy_data(zone.name)
+        rows = []
+        for zone in zones:
+            energy_data = responses[zone.id]
 
             if not energy_data:
                 print(f"⚠️ Aucune donnée énergie disponible pour {zone.name}")
                 continue
 
-            current_time = datetime.utcnow()
-
-            # Vérifier si on a déjà des données aujourd'hui
-            today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-            existing_data = db.query(Indicator).filter(
-                Indicator.zone_id == zone.id,
-                Indicator.type.in_(["energy_consumption", "co2"]),
-                Indicator.timestamp >= today_start
-            ).first()
-
-            if existing_data:
-                print(f"ℹ️ Données énergie déjà présentes aujourd'hui pour {zone.name}")
-                continue
-
             # Données de consommation énergétique
             if 'energy' in energy_data:
-                indicator = Indicator(
-                    type="energy_consumption",
-                    value=energy_data['energy'],
-                    unit="MWh/jour",
-                    timestamp=current_time,
-                    zone_id=zone.id,
-                    source_id=ademe_source.id,
-                    user_id=1,
-                    additional_data=json.dumps({
-                        "source": "opendata",
-                        "sector": "municipal",
-                        "city": zone.name
-                    })
-                )
-                db.add(indicator)
-                created += 1
+                rows.append(indicator_row(
+                    "energy_consumption", energy_data['energy'], "MWh/jour", today_start, zone.id, ademe_source.id,
+                    {"source": "opendata", "sector": "municipal", "city": zone.name}
+                ))
                 print(f"  ✅ Énergie: {energy_data['energy']} MWh/jour")
 
             # Données CO2
             if 'co2' in energy_data:
-                indicator = Indicator(
-                    type="co2",
-                    value=energy_data['co2'],
-                    unit="tCO2/jour",
-                    timestamp=current_time,
-                    zone_id=zone.id,
-                    source_id=ademe_source.id,
-                    user_id=1,
-                    additional_data=json.dumps({
-                        "source": "opendata",
-                        "method": "estimation",
-                        "city": zone.name
-                    })
-                )
-                db.add(indicator)
-                created += 1
+                rows.append(indicator_row(
+                    "co2", energy_data['co2'], "tCO2/jour", today_start, zone.id, ademe_source.id,
+                    {"source": "opendata", "method": "estimation", "city": zone.name}
+                ))
                 print(f"  ✅ CO2: {energy_data['co2']} tCO2/jour")
 
+        created = save_indicators(db, rows)
         if created > 0:
-            db.commit()
             print(f"✅ {created} données énergétiques créées")
         else:
             print("ℹ️ Toutes les données énergétiques sont déjà à jour")
@@ -417,7 +489,7 @@ def ingest_energy_data():
 def fetch_energy_data(city_name):
     """Tente de récupérer des données énergétiques réelles depuis data.gouv.fr"""
     # Recherche de jeux de données énergétiques sur data.gouv.fr
-    url = "https://www.data.gouv.fr/api/1/datasets/"
+    url = DATAGOUV_DATASETS_URL
 
     params = {
         "q": f"consommation énergie {city_name}",
@@ -426,7 +498,7 @@ def fetch_energy_data(city_name):
     }
 
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = cached_get("datagouv", url, params, timeout=10)
 
         if response.status_code == 200:
             data = response.json()
@@ -448,21 +520,90 @@ def fetch_energy_data(city_name):
         return None
 
 
+def ingest_all_sources():
+    """Lance l'ingestion des trois fournisseurs en parallèle et retourne le nombre de créations par fournisseur"""
+    with ThreadPoolExecutor(max_workers=3, thread_name_prefix="ingest") as pool:
+        weather = pool.submit(ingest_weather_data)
+        air_quality = pool.submit(ingest_air_quality_data)
+        energy = pool.submit(ingest_energy_data)
+
+        return {
+            "weather_data": weather.result(),
+            "air_quality_data": air_quality.result(),
+            "energy_data": energy.result(),
+        }
+
+
 # Fonctions utilitaires
-def get_zone_coordinates(zone):
-    """Extrait les coordonnées d'une zone depuis la géométrie"""
-    if zone.geometry:
-        try:
-            if isinstance(zone.geometry, str):
-                geom = json.loads(zone.geometry)
-            else:
-                geom = zone.geometry
+def indicator_row(type_, value, unit, timestamp, zone_id, source_id, additional_data):
+    """Dictionnaire de colonnes d'un indicateur ingéré (inséré par lot avec crud.bulk_create_indicators)"""
+    return {
+        "type": type_,
+        "value": value,
+        "unit": unit,
+        "timestamp": timestamp,
+        "zone_id": zone_id,
+        "source_id": source_id,
+        "user_id": 1,
+        # Blob déjà sérialisé accepté (partagé par toutes les lignes d'une zone)
+        "additional_data": additional_data if isinstance(additional_data, str) else json.dumps(additional_data),
+    }
+
+
+def save_indicators(db, rows):
+    """
+    Insère les indicateurs du lot dont la clé naturelle (zone, source, type, timestamp)
+    est nouvelle et retourne le nombre de créations. Nombre de requêtes constant par lot,
+    et sans doublon même si plusieurs ingestions tournent en parallèle.
+    """
+    return crud.bulk_create_indicators(db, rows) if rows else 0
+
 
-            coords = geom.get('coordinates', [])
-            if len(coords) >= 2:
-                return {'lon': coords[0], 'lat': coords[1]}
-        except Exception as e:
-            print(f"⚠️ Erreur parsing géométrie: {e}")
+def locate_stations(db, responses):
+    """{zone interrogée: zone contenant la station WAQI} pour les réponses avec coordonnées (geo = [lat, lon])"""
+    stations = {
+        zone_id: data['geo'] for zone_id, data in responses.items()
+        if data and isinstance(data.get('geo'), list) and len(data['geo']) >= 2
+    }
+    if not stations:
+        return {}
+    located = zone_index.resolve(
+        db, (float(geo[0]) for geo in stations.values()), (float(geo[1]) for geo in stations.values())
+    )
+    return {zone_id: station_zone for zone_id, station_zone in zip(stations, located) if station_zone is not None}
+
+
+def current_hour():
+    return datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+
+
+def parse_station_time(iso):
+    """Heure de mesure d'une station WAQI (ISO 8601 avec fuseau) en UTC naïf, None si absente"""
+    try:
+        timestamp = datetime.fromisoformat(iso)
+    except (TypeError, ValueError):
+        return None
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def collect_zone_coordinates(zones):
+    """Retourne {zone_id: coordonnées} pour les zones localisables"""
+    zones_coords = {}
+    for zone in zones:
+        coords = get_zone_coordinates(zone)
+        if not coords:
+            print(f"⚠️ Coordonnées non trouvées pour {zone.name}")
+            continue
+        zones_coords[zone.id] = coords
+    return zones_coords
+
+
+def get_zone_coordinates(zone):
+    """Coordonnées d'une zone (colonnes lat/lon extraites de la géométrie à l'écriture)"""
+    if zone.lat is not None and zone.lon is not None:
+        return {'lat': zone.lat, 'lon': zone.lon}
 
     return get_city_coordinates(zone.name)
 
@@ -484,18 +625,35 @@ def get_city_coordinates(city_name):
     return None
 
 
-if __name__ == "__main__":
-    print("🌍 Début de l'ingestion de données RÉELLES...")
-    print("📡 Connexion aux APIs externes...")
+def parse_day(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
 
-    print("\n🌤️ Récupération données météo (OpenMeteo)...")
-    weather_count = ingest_weather_data()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestion des données environnementales réelles")
+    parser.add_argument(
+        "--weather-backfill-start", type=parse_day, metavar="AAAA-MM-JJ",
+        help="rattrape les mesures météo horaires à partir de ce jour (OpenMeteo uniquement)"
+    )
+    parser.add_argument(
+        "--weather-backfill-end", type=parse_day, metavar="AAAA-MM-JJ",
+        help="dernier jour du rattrapage (par défaut aujourd'hui)"
+    )
+    args = parser.parse_args()
+
+    if args.weather_backfill_start:
+        print(f"🌤️ Rattrapage météo horaire depuis le {args.weather_backfill_start}...")
+        weather_count = ingest_weather_data(args.weather_backfill_start, args.weather_backfill_end)
+        print(f"✅ {weather_count} mesures météo créées")
+        sys.exit(0)
 
-    print("\n🌫️ Récupération qualité air (WAQI)...")
-    air_quality_count = ingest_air_quality_data()
+    print("🌍 Début de l'ingestion de données RÉELLES...")
+    print("📡 Connexion aux APIs externes (OpenMeteo, WAQI, data.gouv.fr en parallèle)...")
 
-    print("\n⚡ Recherche données énergie (data.gouv.fr)...")
-    energy_count = ingest_energy_data()
+    counts = ingest_all_sources()
+    weather_count = counts["weather_data"]
+    air_quality_count = counts["air_quality_data"]
+    energy_count = counts["energy_data"]
 
     print("\n" + "=" * 50)
     print("🎉 INGESTION TERMINÉE!")
@@ -503,6 +661,9 @@ if __name__ == "__main__":
     print(f"🌤️  Données météo: {weather_count}")
     print(f"🌫️  Données qualité air: {air_quality_count}")
     print(f"⚡ Données énergie: {energy_count}")
+    for provider, counters in http_cache.stats().items():
+        print(f"🗃️  Cache HTTP {provider}: {counters.get('downloaded', 0)} téléchargées, "
+              f"{counters.get('revalidated', 0)} revalidées (304), {counters.get('fresh', 0)} servies du cache")
     print(f"📊 TOTAL: {weather_count + air_quality_count + energy_count} nouvelles données RÉELLES")
 
     total_data = weather_count + air_quality_count + energy_count
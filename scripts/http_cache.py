@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from app.core.config import settings
+
+# Fréquence maximale de la purge des entrées trop anciennes (secondes)
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+class CachedResponse:
+    """Réponse servie depuis le cache disque (même interface que requests.Response pour les fetchers)"""
+
+    def __init__(self, status_code, content, source):
+        self.status_code = status_code
+        self.content = content
+        # "fresh" (encore valide), "revalidated" (304 du serveur) ou "downloaded"
+        self.source = source
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class HTTPCache:
+    """
+    Cache disque des réponses GET des fournisseurs externes.
+    Une entrée = corps de la réponse (<clé>.body) et métadonnées (<clé>.json : ETag,
+    Last-Modified, date de stockage). Tant qu'une entrée a moins de TTL secondes (par
+    fournisseur), elle est servie sans requête ; ensuite la requête est conditionnelle
+    (If-None-Match / If-Modified-Since) et un 304 prolonge l'entrée sans téléchargement.
+    """
+
+    def __init__(self, directory, ttl_seconds, max_age_seconds):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: defaultdict(int))
+        self._last_prune = 0.0
+
+    def _key(self, url, params):
+        raw = json.dumps([url, sorted((params or {}).items())], default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _paths(self, key):
+        return os.path.join(self.directory, f"{key}.json"), os.path.join(self.directory, f"{key}.body")
+
+    def _load(self, key):
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def _write(self, path, data):
+        # Écriture atomique : un lecteur concurrent voit l'ancien ou le nouveau fichier, jamais un fichier partiel
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def _store(self, key, meta, body=None):
+        os.makedirs(self.directory, exist_ok=True)
+        meta_path, body_path = self._paths(key)
+        if body is not None:
+            self._write(body_path, body)
+        else:
+            # Entrée revalidée : le corps conservé est aussi rajeuni pour la purge
+            os.utime(body_path)
+        self._write(meta_path, json.dumps(meta).encode("utf-8"))
+
+    def _count(self, provider, source):
+        with self._lock:
+            self._counters[provider][source] += 1
+
+    def get(self, session, provider, url, params=None, timeout=10):
+        """GET via le cache : réponse fraîche, revalidée (304) ou téléchargée (seules les 200 sont mémorisées)"""
+        self._maybe_prune()
+        key = self._key(url, params)
+        meta, body = self._load(key)
+        now = time.time()
+
+        if meta is not None and now - meta["stored_at"] < self.ttl_seconds.get(provider, 0):
+            self._count(provider, "fresh")
+            return CachedResponse(200, body, "fresh")
+
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        response = session.get(url, params=params, headers=headers, timeout=timeout)
+
+        if response.status_code == 304 and meta is not None:
+            meta["stored_at"] = now
+            self._store(key, meta)
+            self._count(provider, "revalidated")
+            return CachedResponse(200, body, "revalidated")
+
+        self._count(provider, "downloaded")
+        if response.status_code == 200:
+            self._store(key, {
+                "url": url,
+                "stored_at": now,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }, response.content)
+        return response
+
+    def _maybe_prune(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_prune < PRUNE_INTERVAL_SECONDS:
+                return
+            self._last_prune = now
+        self.prune(now - self.max_age_seconds)
+
+    def prune(self, older_than):
+        """Supprime les entrées stockées (ou revalidées) avant la date older_than (epoch)"""
+        if not os.path.isdir(self.directory):
+            return 0
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < older_than:
+                    os.remove(path)
+                    removed += name.endswith(".json")
+            except OSError:
+                continue
+        return removed
+
+    def stats(self):
+        """Compteurs par fournisseur : réponses fraîches, revalidées et téléchargées"""
+        with self._lock:
+            return {provider: dict(counters) for provider, counters in self._counters.items()}
+
+
+http_cache = HTTPCache(
+    settings.HTTP_CACHE_DIR,
+    settings.HTTP_CACHE_TTL_SECONDS,
+    settings.HTTP_CACHE_MAX_AGE_DAYS * 86400
+)
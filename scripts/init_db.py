@@ -4,7 +4,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from sqlalchemy.orm import Session
-from app.database import SessionLocal, engine, Base
+from app.database import SessionLocal, run_migrations
 from app.models import User, Zone, Source, Indicator
 from app.auth import get_password_hash
 from datetime import datetime
@@ -16,10 +16,10 @@ def init_database():
     Script d'initialisation de la base de données EcoTrack
     Crée les tables et insère des données de base
     """
-    print("🔄 Création des tables...")
+    print("🔄 Application des migrations...")
 
-    # Créer TOUTES les tables
-    Base.metadata.create_all(bind=engine)
+    # Créer / mettre à jour TOUTES les tables (migrations Alembic)
+    run_migrations()
     print("✅ Tables créées avec succès")
 
     db = SessionLocal()
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+from urllib.parse import urlsplit
+
+# Coordonnées dans le chemin (WAQI : /feed/geo:<lat>;<lon>/), remplacées pour regrouper les requêtes d'une route
+_PATH_COORDINATES = re.compile(r"geo:[^/]*")
+
+
+def route(path):
+    """Route d'un chemin de requête, sans les coordonnées : /feed/geo:48.8;2.3/ -> /feed/geo:*/"""
+    return _PATH_COORDINATES.sub("geo:*", path)
+
+
+def fixture_key(path, params):
+    """
+    Clé d'une requête indépendante de l'hôte (le rejeu se fait sur un autre serveur) : chemin et
+    paramètres sous forme de texte, tels qu'ils arrivent dans la chaîne de requête
+    """
+    normalized = sorted((str(name), str(value)) for name, value in (params or {}).items())
+    return hashlib.sha256(json.dumps([path, normalized]).encode("utf-8")).hexdigest()
+
+
+class FixtureRecorder:
+    """
+    Enregistre les réponses des fournisseurs (statut, type de contenu, corps) dans
+    <dossier>/<fournisseur>/<clé>.json, rejouées ensuite par benchmarks/provider_stub.py
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def record(self, provider, url, params, response):
+        path = urlsplit(url).path
+        headers = getattr(response, "headers", None) or {}
+        fixture = {
+            "provider": provider,
+            "path": path,
+            "route": route(path),
+            "params": {str(name): str(value) for name, value in (params or {}).items()},
+            "status": response.status_code,
+            "content_type": headers.get("Content-Type", "application/json"),
+            "body": response.content.decode("utf-8", errors="replace"),
+        }
+        directory = os.path.join(self.directory, provider)
+        os.makedirs(directory, exist_ok=True)
+        # Écriture atomique : une ingestion parallèle peut enregistrer la même requête
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(fixture, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(directory, f"{fixture_key(path, params)}.json"))
+
+
+def load_fixtures(directory):
+    """Fixtures d'un dossier : ({clé: fixture}, {route: [fixtures]})"""
+    by_key = {}
+    by_route = {}
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(root, name), encoding="utf-8") as f:
+                fixture = json.load(f)
+            by_key[fixture_key(fixture["path"], fixture["params"])] = fixture
+            by_route.setdefault(fixture["route"], []).append(fixture)
+    return by_key, by_route
@@ -0,0 +1,38 @@
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal, run_migrations
+from app.models import IndicatorRollupHourly, IndicatorRollupDaily
+from app import rollups
+
+
+def rebuild_rollups():
+    """Recalcule les agrégats horaires et journaliers depuis la table indicators (backfill)"""
+    print("🔄 Reconstruction des agrégats statistiques...")
+    run_migrations()
+    db = SessionLocal()
+
+    try:
+        started = time.perf_counter()
+        rollups.rebuild(db)
+
+        hourly = db.query(IndicatorRollupHourly).count()
+        daily = db.query(IndicatorRollupDaily).count()
+        print(f"✅ {hourly} agrégats horaires et {daily} agrégats journaliers "
+              f"recalculés en {time.perf_counter() - started:.2f}s")
+        return True
+
+    except Exception as e:
+        print(f"❌ Erreur lors de la reconstruction: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    if not rebuild_rollups():
+        sys.exit(1)
@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Base et archive jetables : l'environnement doit être fixé avant le premier import de app
+# (la configuration et les moteurs sont créés à l'import)
+_tmp_dir = tempfile.mkdtemp(prefix="ecotrack-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'tests.db')}"
+os.environ["ARCHIVE_DIR"] = os.path.join(_tmp_dir, "archive")
+os.environ["INGESTION_SCHEDULER_ENABLED"] = "false"
+os.environ["HTTP_CACHE_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.auth import get_password_hash
+from app.database import SessionLocal, run_migrations
+from app.models import User, Zone, Source
+
+ADMIN_EMAIL = "admin@ecotrack.com"
+ADMIN_PASSWORD = "admin123"
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Base de test issue des migrations, avec un administrateur, deux zones et trois sources"""
+    run_migrations()
+
+    db = SessionLocal()
+    try:
+        db.add(User(id=1, email=ADMIN_EMAIL, hashed_password=get_password_hash(ADMIN_PASSWORD),
+                    full_name="Administrateur EcoTrack", role="admin", is_active=True))
+        db.add_all([
+            Zone(id=1, name="Paris Centre", postal_code="75001",
+                 geometry='{"type": "Point", "coordinates": [2.3522, 48.8566]}'),
+            Zone(id=2, name="Lyon Centre", postal_code="69001",
+                 geometry='{"type": "Point", "coordinates": [4.8357, 45.764]}'),
+        ])
+        db.add_all([
+            Source(id=1, name="OpenMeteo"),
+            Source(id=2, name="WAQI"),
+            Source(id=3, name="ADEME"),
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def db(database):
+    """Session sur la base de test, fermée après le test"""
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,129 @@
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, text
+
+from app import crud
+from app.database import SessionLocal, engine
+import scripts.data_ingestion as data_ingestion
+
+# Un parcours complet de indicators, sans index, est interdit
+FULL_SCAN = re.compile(r"^SCAN indicators\b(?!.*\bINDEX\b)")
+# Les tris et regroupements doivent lire un index déjà ordonné, sans B-tree temporaire
+TEMP_BTREE = "USE TEMP B-TREE"
+
+
+@pytest.fixture(scope="module")
+def indicators(database):
+    """Insère quelques lignes pour que les requêtes aient des données à parcourir"""
+    db = SessionLocal()
+    try:
+        start = datetime(2024, 1, 1)
+        rows = [
+            {
+                "type": indicator_type, "value": float(hour % 50), "unit": "u",
+                "timestamp": start + timedelta(hours=hour), "zone_id": zone_id,
+                "source_id": 1, "user_id": 1,
+            }
+            for indicator_type in ("temperature", "air_quality_pm25", "air_quality_pm10")
+            for zone_id in (1, 2)
+            for hour in range(200)
+        ]
+        crud.bulk_create_indicators(db, rows)
+        db.execute(text("ANALYZE"))
+        db.commit()
+    finally:
+        db.close()
+
+
+def exercise_endpoints(db):
+    """Appelle les fonctions crud utilisées par les routes, avec les combinaisons de filtres"""
+    start, end = datetime(2024, 1, 2), datetime(2024, 1, 5)
+    crud.get_indicators(db)
+    crud.get_indicators(db, type="temperature")
+    crud.get_indicators(db, zone_id=1)
+    crud.get_indicators(db, type="temperature", zone_id=1)
+    crud.get_indicators(db, type="temperature", zone_id=1, start_date=start, end_date=end)
+    crud.get_indicators(db, type="temperature", start_date=start, end_date=end)
+    crud.get_indicators(db, zone_id=1, start_date=start, end_date=end)
+    cursor = (datetime(2024, 1, 4, 12), 500)
+    crud.get_indicators(db, cursor=cursor)
+    crud.get_indicators(db, type="temperature", cursor=cursor)
+    crud.get_indicators(db, zone_id=1, cursor=cursor)
+    crud.get_indicators(db, type="temperature", zone_id=1, cursor=cursor)
+    crud.get_indicator_series(db, "temperature")
+    crud.get_indicator_series(db, "temperature", zone_ids=[1, 2], start_date=start, end_date=end)
+    crud.get_indicators_by_type(db, "temperature")
+    crud.get_indicators_by_zone(db, 1)
+    crud.get_air_quality_by_zone(db, start, end)
+    crud.get_air_quality_by_zone(db, start, end, zone_id=1)
+    crud.get_air_quality_stats(db)
+    for filters in ({}, {"type": "temperature"}, {"zone_id": 1}, {"type": "temperature", "zone_id": 1, "start_date": start}):
+        for _ in crud.iter_indicator_rows(db, batch_size=500, **filters):
+            pass
+
+
+def exercise_ingestion(monkeypatch):
+    """Exécute les fonctions d'ingestion avec des réponses simulées (requêtes de dédoublonnage)"""
+    times = [(datetime(2024, 2, 1) + timedelta(hours=hour)).isoformat(timespec="minutes") for hour in range(3)]
+    monkeypatch.setattr(data_ingestion, "fetch_weather_data", lambda lat, lon, start_date, end_date: {
+        "hourly": {
+            "time": times,
+            "temperature_2m": [10.0] * 3,
+            "relative_humidity_2m": [50.0] * 3,
+            "wind_speed_10m": [5.0] * 3,
+            "pressure_msl": [1013.0] * 3,
+        },
+        "utc_offset_seconds": 3600,
+    })
+    monkeypatch.setattr(data_ingestion, "fetch_waqi_data",
+                        lambda lat, lon: {"pm25": 10, "pm10": 20, "no2": 5, "station_name": "Test"})
+    monkeypatch.setattr(data_ingestion, "fetch_energy_data", lambda city_name: {"energy": 100, "co2": 20})
+    data_ingestion.ingest_weather_data()
+    data_ingestion.ingest_air_quality_data()
+    data_ingestion.ingest_energy_data()
+
+
+def explain(statements):
+    """Plan (EXPLAIN QUERY PLAN) de chaque requête distincte, dans l'ordre d'exécution"""
+    plans = {}
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            if statement not in plans:
+                plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+                plans[statement] = [row[-1] for row in plan]
+    return plans
+
+
+def test_indicator_queries_use_an_index(db, indicators, monkeypatch):
+    """Aucune requête sur indicators ne parcourt toute la table ni ne trie dans un B-tree temporaire"""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith("SELECT") and "indicators" in statement:
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        exercise_endpoints(db)
+        # Rend la connexion d'écriture unique avant que l'ingestion ouvre ses propres sessions
+        db.commit()
+        exercise_ingestion(monkeypatch)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    plans = explain(captured)
+    failures = []
+    for statement, details in plans.items():
+        where = " ".join(statement.split()).partition(" WHERE ")[2] or "(sans filtre)"
+        bad = [detail for detail in details if FULL_SCAN.match(detail) or TEMP_BTREE in detail]
+        print(f"  {'❌' if bad else '✅'} WHERE {where}")
+        for detail in details:
+            print(f"       {detail}")
+        if bad:
+            failures.append(f"WHERE {where}: {'; '.join(bad)}")
+
+    print(f"\n📋 {len(plans)} requêtes vérifiées, {len(failures)} plan(s) sans index adapté")
+    assert plans, "aucune requête sur indicators capturée"
+    assert not failures, "\n".join(failures)
@@ -0,0 +1,92 @@
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import models
+from app.auth import create_access_token
+from app.core.config import settings
+from app.csv_import import iter_text_lines
+from app.main import app
+from conftest import ADMIN_EMAIL
+
+HEADER = "type,value,unit,timestamp,zone_id,lat,lon,source_id\n"
+START = datetime(2025, 3, 1)
+
+
+@pytest.fixture(scope="module")
+def client(database):
+    """Client de l'API authentifié en administrateur"""
+    with TestClient(app) as test_client:
+        token = create_access_token(data={"sub": ADMIN_EMAIL})["access_token"]
+        test_client.headers["Authorization"] = f"Bearer {token}"
+        yield test_client
+
+
+def csv_file():
+    """
+    34 lignes de données (lignes 2 à 35) : 30 lignes par zone_id, une par (lat, lon) dans Paris,
+    un doublon de la ligne 2, une valeur invalide (ligne 20) et un point hors de toute zone (ligne 35)
+    """
+    lines = [HEADER]
+    for hour in range(30):
+        if hour == 18:
+            lines.append(f"temperature,abc,°C,{(START + timedelta(hours=hour)).isoformat()},1,,,1\n")
+        lines.append(f"temperature,{hour},°C,{(START + timedelta(hours=hour)).isoformat()},1,,,1\n")
+    lines.append(f"temperature,30,°C,{(START + timedelta(hours=30)).isoformat()},,48.8566,2.3522,1\n")
+    lines.append(lines[1])
+    lines.append(f"temperature,31,°C,{(START + timedelta(hours=31)).isoformat()},,0.0,-30.0,1\n")
+    return "".join(lines).encode("utf-8")
+
+
+def upload(client, content, filename="indicateurs.csv"):
+    return client.post("/upload/csv/", files={"file": (filename, content, "text/csv")})
+
+
+def test_iter_text_lines_decodes_across_chunks():
+    """Lignes reconstituées quel que soit le découpage des blocs, y compris au milieu d'un caractère UTF-8"""
+    content = "\ufeffa,b\nété,°C\r\nfin".encode("utf-8")
+    assert list(iter_text_lines(io.BytesIO(content), chunk_size=3)) == ["a,b\n", "été,°C\r\n", "fin"]
+
+
+def test_upload_csv_reports_created_duplicates_and_rejected_lines(client, db, monkeypatch):
+    monkeypatch.setattr(settings, "CSV_BATCH_SIZE", 10)
+
+    response = upload(client, csv_file())
+
+    assert response.status_code == 200
+    report = response.json()
+    assert report["created"] == 31
+    assert report["duplicates"] == 1
+    assert report["rejected"] == 2
+    assert [error["line"] for error in report["errors"]] == [20, 35]
+    assert "could not convert" in report["errors"][0]["error"]
+    assert "aucune zone" in report["errors"][1]["error"]
+    assert not report["errors_truncated"]
+    # 33 lignes valides insérées par lots de 10
+    assert report["stats"]["rows_read"] == 34
+    assert report["stats"]["batches"] == 4
+
+    located = db.query(models.Indicator).filter(
+        models.Indicator.timestamp == START + timedelta(hours=30)).one()
+    assert located.zone_id == 1
+
+
+def test_upload_csv_twice_counts_existing_rows_as_duplicates(client, monkeypatch):
+    monkeypatch.setattr(settings, "CSV_BATCH_SIZE", 10)
+
+    report = upload(client, csv_file()).json()
+
+    assert report["created"] == 0
+    assert report["duplicates"] == 32
+    assert report["rejected"] == 2
+
+
+def test_upload_csv_rejects_invalid_files(client):
+    missing_unit = upload(client, b"type,value,zone_id,source_id\ntemperature,1,1,1\n")
+    assert missing_unit.status_code == 400
+    assert "unit" in missing_unit.json()["detail"]
+
+    not_csv = upload(client, csv_file(), filename="indicateurs.txt")
+    assert not_csv.status_code == 400